@@ -1,8 +1,13 @@
 """
 NVIDIA API service for AI chat
+
+All requests share one httpx client, opened in the app lifespan (main.py)
+and closed on shutdown, so chat, summary, tag and title calls reuse pooled
+connections (HTTP/2 by default, which multiplexes concurrent requests over
+one connection) instead of paying a TCP and TLS handshake each.
 """
 import httpx
-from typing import List, Dict, Optional, AsyncGenerator
+from typing import Any, List, Dict, Optional, AsyncGenerator
 from app.config import get_settings
 import logging
 
@@ -17,6 +22,60 @@ class NVIDIAAPIService:
         self.api_key = settings.nvidia_api_key
         self.base_url = settings.nvidia_api_base_url
         self.default_model = settings.default_model
+        self.limits = httpx.Limits(
+            max_connections=settings.nvidia_max_connections,
+            max_keepalive_connections=settings.nvidia_max_keepalive_connections,
+            keepalive_expiry=settings.nvidia_keepalive_expiry_seconds
+        )
+        self._client: Optional[httpx.AsyncClient] = None
+        self.requests = 0
+        self.connections_opened = 0
+
+    async def start(self):
+        """Open the shared client (also done on first use if the app did not)"""
+        if self._client is None:
+            # Disable proxy and trust_env to avoid SOCKS proxy errors
+            self._client = httpx.AsyncClient(
+                timeout=httpx.Timeout(120.0, connect=60.0),
+                proxy=None,
+                trust_env=False,
+                http2=settings.nvidia_http2,
+                limits=self.limits
+            )
+
+    async def close(self):
+        """Close the shared client and its pooled connections"""
+        if self._client is not None:
+            client, self._client = self._client, None
+            await client.aclose()
+
+    async def _get_client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            await self.start()
+        return self._client
+
+    async def _trace(self, event: str, info: Dict[str, Any]):
+        """httpcore trace hook: counts new connections, which pooling should keep rare"""
+        if event == "connection.connect_tcp.complete":
+            self.connections_opened += 1
+
+    def pool_stats(self) -> Dict[str, Any]:
+        """Connection pool of the shared client plus request and connection counters"""
+        # httpx does not expose its pool; read the httpcore one behind the default transport
+        pool = getattr(getattr(self._client, "_transport", None), "_pool", None)
+        connections = list(getattr(pool, "connections", []))
+        return {
+            "open": self._client is not None,
+            "http2": settings.nvidia_http2,
+            "max_connections": self.limits.max_connections,
+            "max_keepalive_connections": self.limits.max_keepalive_connections,
+            "keepalive_expiry_seconds": self.limits.keepalive_expiry,
+            "connections": len(connections),
+            "idle_connections": sum(1 for c in connections if c.is_idle()),
+            "http2_connections": sum(1 for c in connections if "HTTP/2" in c.info()),
+            "requests": self.requests,
+            "connections_opened": self.connections_opened
+        }
 
     async def chat(
         self,
@@ -56,67 +115,66 @@ class NVIDIAAPIService:
         }
 
         try:
-            # Disable proxy and trust_env to avoid SOCKS proxy errors
-            async with httpx.AsyncClient(
-                timeout=httpx.Timeout(120.0, connect=60.0),
-                proxy=None,
-                trust_env=False,
-                limits=httpx.Limits(max_keepalive_connections=5)
-            ) as client:
-                if stream:
-                    try:
-                        async with client.stream(
-                            "POST",
-                            self.base_url,
-                            headers=headers,
-                            json=payload
-                        ) as response:
-                            if response.status_code != 200:
-                                error_text = await response.aread()
-                                logger.error(f"NVIDIA API error: {error_text}")
-                                yield f"Error: API returned status {response.status_code}"
-                                return
-
-                            async for line in response.aiter_lines():
-                                if line.startswith("data: "):
-                                    data = line[6:]  # Remove "data: " prefix
-                                    if data == "[DONE]":
-                                        break
-                                    try:
-                                        import json
-                                        chunk = json.loads(data)
-                                        if "choices" in chunk and len(chunk["choices"]) > 0:
-                                            delta = chunk["choices"][0].get("delta", {})
-                                            content = delta.get("content", "")
-                                            if content:
-                                                yield content
-                                    except json.JSONDecodeError:
-                                        continue
-                    except httpx.RemoteProtocolError as e:
-                        logger.error(f"Remote protocol error: {str(e)}")
-                        yield f"Error: Connection interrupted - {str(e)}"
-                    except Exception as stream_error:
-                        logger.error(f"Stream error: {str(stream_error)}")
-                        yield f"Error: {str(stream_error)}"
-                else:
-                    response = await client.post(
+            client = await self._get_client()
+            self.requests += 1
+            if stream:
+                try:
+                    async with client.stream(
+                        "POST",
                         self.base_url,
                         headers=headers,
-                        json=payload
-                    )
-
-                    if response.status_code != 200:
-                        error_text = response.text
-                        logger.error(f"NVIDIA API error: {error_text}")
-                        yield f"Error: API returned status {response.status_code}"
-                        return
-
-                    data = response.json()
-                    if "choices" in data and len(data["choices"]) > 0:
-                        content = data["choices"][0]["message"]["content"]
-                        yield content
-                    else:
-                        yield "Error: No response content"
+                        json=payload,
+                        extensions={"trace": self._trace}
+                    ) as response:
+                        if response.status_code != 200:
+                            error_text = await response.aread()
+                            logger.error(f"NVIDIA API error: {error_text}")
+                            yield f"Error: API returned status {response.status_code}"
+                            return
+
+                        async for line in response.aiter_lines():
+                            if line.startswith("data: "):
+                                data = line[6:]  # Remove "data: " prefix
+                                if data == "[DONE]":
+                                    # Read on to the end of the body (nothing follows) so the
+                                    # connection goes back to the pool instead of being closed
+                                    continue
+                                try:
+                                    import json
+                                    chunk = json.loads(data)
+                                    if "choices" in chunk and len(chunk["choices"]) > 0:
+                                        delta = chunk["choices"][0].get("delta", {})
+                                        content = delta.get("content", "")
+                                        if content:
+                                            yield content
+                                except json.JSONDecodeError:
+                                    continue
+                except httpx.RemoteProtocolError as e:
+                    logger.error(f"Remote protocol error: {str(e)}")
+                    yield f"Error: Connection interrupted - {str(e)}"
+                except Exception as stream_error:
+                    logger.error(f"Stream error: {str(stream_error)}")
+                    yield f"Error: {str(stream_error)}"
+            else:
+                response = await client.post(
+                    self.base_url,
+                    headers=headers,
+                    json=payload,
+                    extensions={"trace": self._trace}
+                )
+
+                if response.status_code != 200:
+                    error_text = response.text
+                    logger.error(f"NVIDIA API error: {error_text}")
+                    yield f"Error: API returned status {response.status_code}"
+                    return
+
+                data = response.json()
+                if "choices" in data and len(data["choices"]) > 0:
+                    content = data["choices"][0]["message"]["content"]
+                    yield content
+                else:
+                    yield "Error: No response content"
 
         except httpx.TimeoutException:
             logger.error("NVIDIA API timeout")
@@ -0,0 +1,102 @@
+"""
+Administration API routes (restricted to ADMIN_USER_IDS)
+"""
+import os
+from fastapi import APIRouter, HTTPException, status, Depends, Query
+from app.schemas import APIResponse
+from app.backup import backup_manager
+from app.database import db
+from app.dependencies import get_admin_user
+from app.maintenance import maintain_all_databases, recent_runs
+from app.search_cache import search_cache
+from app.vectors import vector_index
+from app.typeahead import typeahead_index
+
+router = APIRouter(prefix="/admin", tags=["Admin"])
+
+
+@router.post("/backups", response_model=APIResponse, status_code=status.HTTP_202_ACCEPTED)
+async def start_backup(admin: dict = Depends(get_admin_user)):
+    """
+    Start an online backup of all databases in the background
+
+    Poll GET /admin/backups for its progress.
+    """
+    try:
+        backup_manager.start()
+    except RuntimeError:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="A backup is already running"
+        )
+
+    return APIResponse(
+        code=202,
+        message="备份已开始",
+        data=backup_manager.progress
+    )
+
+
+@router.get("/backups", response_model=APIResponse)
+async def get_backups(admin: dict = Depends(get_admin_user)):
+    """
+    Get the progress of the current (or last) backup and the stored snapshots
+    """
+    return APIResponse(
+        code=200,
+        message="获取成功",
+        data={
+            "progress": backup_manager.progress,
+            "snapshots": backup_manager.list_snapshots()
+        }
+    )
+
+
+@router.post("/maintenance", response_model=APIResponse)
+async def run_maintenance(admin: dict = Depends(get_admin_user)):
+    """
+    Run database maintenance (optimize, incremental vacuum, WAL checkpoint) now
+    """
+    results = await maintain_all_databases()
+
+    return APIResponse(
+        code=200,
+        message="维护完成",
+        data=results
+    )
+
+
+@router.get("/maintenance", response_model=APIResponse)
+async def get_maintenance_runs(
+    limit: int = Query(20, ge=1, le=200),
+    admin: dict = Depends(get_admin_user)
+):
+    """
+    Get the most recent maintenance runs of every database
+    """
+    runs = {}
+    for store in db.all_databases():
+        async with store.connection() as conn:
+            runs[os.path.basename(store.db_path)] = await conn.run(recent_runs, limit)
+
+    return APIResponse(
+        code=200,
+        message="获取成功",
+        data=runs
+    )
+
+
+@router.get("/caches", response_model=APIResponse)
+async def get_cache_stats(admin: dict = Depends(get_admin_user)):
+    """
+    Get hit ratio and eviction counters of the search result cache and the size of the in-memory indexes
+    """
+    return APIResponse(
+        code=200,
+        message="获取成功",
+        data={
+            "search": search_cache.stats(),
+            "vectors": vector_index.stats(),
+            "typeahead": typeahead_index.stats()
+        }
+    )
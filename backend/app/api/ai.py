@@ -63,17 +63,17 @@ async def set_default_model(
             data=None
         )
 
-    with db.get_connection() as conn:
+    async with db.connection() as conn:
         # Check if settings exist
-        cursor = conn.execute(
+        cursor = await conn.execute(
             "SELECT setting_id FROM user_settings WHERE user_id = ?",
             (current_user["user_id"],)
         )
-        settings_row = cursor.fetchone()
+        settings_row = await cursor.fetchone()
 
         if settings_row:
             # Update
-            conn.execute("""
+            await conn.execute("""
                 UPDATE user_settings
                 SET default_model_id = ?
                 WHERE user_id = ?
@@ -81,7 +81,7 @@ async def set_default_model(
         else:
             # Create
             setting_id = db.generate_uuid()
-            conn.execute("""
+            await conn.execute("""
                 INSERT INTO user_settings (setting_id, user_id, default_model_id, reminder_enabled)
                 VALUES (?, ?, ?, 1)
             """, (setting_id, current_user["user_id"], model_data.model_id))
@@ -20,23 +20,23 @@ async def register(user_data: UserRegister):
     Register a new user
     """
     # Check if username exists
-    with db.get_connection() as conn:
-        cursor = conn.execute(
+    async with db.connection() as conn:
+        cursor = await conn.execute(
             "SELECT user_id FROM users WHERE username = ?",
             (user_data.username,)
         )
-        if cursor.fetchone():
+        if await cursor.fetchone():
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Username already exists"
             )
 
         # Check if email exists
-        cursor = conn.execute(
+        cursor = await conn.execute(
             "SELECT user_id FROM users WHERE email = ?",
             (user_data.email,)
         )
-        if cursor.fetchone():
+        if await cursor.fetchone():
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Email already exists"
@@ -47,14 +47,14 @@ async def register(user_data: UserRegister):
         password_hash = get_password_hash(user_data.password)
         now = datetime.utcnow()
 
-        conn.execute("""
+        await conn.execute("""
             INSERT INTO users (user_id, username, email, password_hash, created_at, updated_at)
             VALUES (?, ?, ?, ?, ?, ?)
         """, (user_id, user_data.username, user_data.email, password_hash, now, now))
 
         # Create default settings
         setting_id = db.generate_uuid()
-        conn.execute("""
+        await conn.execute("""
             INSERT INTO user_settings (setting_id, user_id, default_email, reminder_enabled)
             VALUES (?, ?, ?, 1)
         """, (setting_id, user_id, user_data.email))
@@ -79,12 +79,12 @@ async def login(user_data: UserLogin):
     """
     Login user
     """
-    with db.get_connection() as conn:
-        cursor = conn.execute(
+    async with db.connection() as conn:
+        cursor = await conn.execute(
             "SELECT user_id, username, email, password_hash FROM users WHERE username = ?",
             (user_data.username,)
         )
-        user = cursor.fetchone()
+        user = await cursor.fetchone()
 
         if not user or not verify_password(user_data.password, user["password_hash"]):
             raise HTTPException(
@@ -93,7 +93,7 @@ async def login(user_data: UserLogin):
             )
 
         # Update last login
-        conn.execute(
+        await conn.execute(
             "UPDATE users SET updated_at = ? WHERE user_id = ?",
             (datetime.utcnow(), user["user_id"])
         )
@@ -0,0 +1,41 @@
+"""
+Autocomplete API route
+"""
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+
+from app.dependencies import get_current_user
+from app.schemas import APIResponse
+from app.typeahead import KINDS, typeahead_index
+
+router = APIRouter(prefix="/autocomplete", tags=["Autocomplete"])
+
+
+@router.get("", response_model=APIResponse)
+async def autocomplete(
+    q: str = Query(..., min_length=1, max_length=200),
+    types: Optional[str] = Query(None, description="Comma-separated subset of documents,conversations,tags"),
+    limit: int = Query(5, ge=1, le=20),
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Complete what the user is typing to document titles, conversation titles and tags
+
+    Matching ignores case and repeated whitespace and works from the start
+    of the title or of any of its first words; tags match from their start.
+    Answered from the in-memory prefix index (app/typeahead.py).
+    """
+    kinds = [kind.strip() for kind in types.split(",")] if types else list(KINDS)
+    unknown = [kind for kind in kinds if kind not in KINDS]
+    if unknown:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown autocomplete types: {', '.join(unknown)}"
+        )
+
+    return APIResponse(
+        code=200,
+        message="success",
+        data=await typeahead_index.complete(current_user["user_id"], q, kinds, limit)
+    )
@@ -8,70 +8,112 @@ from app.schemas import (
 )
 from app.database import db
 from app.dependencies import get_current_user
+from app.archive import read_messages
+from app.pagination import decode_cursor, next_cursor
+from app.typeahead import typeahead_index
+from app.fts import (
+    split_terms, match_expression, like_pattern, excerpt, render_highlight
+)
 from typing import Optional
 from datetime import datetime
+import json
 
 router = APIRouter(prefix="/conversations", tags=["Conversations"])
 
+# Messages of the user's conversations matching the indexed terms (parameters:
+# MATCH expression, user_id); CROSS JOIN keeps the index lookup first
+MATCHED_MESSAGES_SOURCE = """
+    FROM messages_fts
+    CROSS JOIN messages m ON m.rowid = messages_fts.rowid
+    CROSS JOIN conversations c ON c.conversation_id = m.conversation_id
+    WHERE messages_fts MATCH ? AND c.user_id = ? AND c.deleted_at IS NULL
+"""
+
+# Fallback when no term has indexable characters (parameter: user_id)
+MESSAGES_SOURCE = """
+    FROM conversations c
+    JOIN messages m ON m.conversation_id = c.conversation_id
+    WHERE c.user_id = ? AND c.deleted_at IS NULL
+"""
+
+SHORT_TERM_FILTER = """
+    AND COALESCE((SELECT content FROM content_blobs WHERE hash = m.content_hash), m.content) LIKE ?
+"""
+
+MESSAGE_CONTENTS = """
+    SELECT
+        m.rowid AS message_rowid,
+        COALESCE((SELECT content FROM content_blobs WHERE hash = m.content_hash), m.content) AS content
+    FROM json_each(?) ids
+    CROSS JOIN messages m ON m.rowid = ids.value
+"""
+
 
 @router.get("", response_model=APIResponse)
 async def get_conversations(
     page: int = Query(1, ge=1),
     page_size: int = Query(20, ge=1, le=100),
     keyword: Optional[str] = None,
+    after: Optional[str] = Query(None, description="Cursor from a previous page's next_cursor"),
+    include_total: bool = True,
     current_user: dict = Depends(get_current_user)
 ):
     """
     Get list of conversations
+
+    Pass `after` (the previous response's next_cursor) for keyset
+    pagination; `page` is then ignored. Set include_total=false to skip
+    the COUNT(*) query.
     """
-    with db.get_connection() as conn:
+    async with db.for_user(current_user["user_id"]).connection() as conn:
         # Build query
-        base_query = "FROM conversations WHERE user_id = ?"
+        base_query = "FROM conversations WHERE user_id = ? AND deleted_at IS NULL"
         params = [current_user["user_id"]]
 
         if keyword:
-            base_query += " AND title LIKE ?"
-            params.append(f"%{keyword}%")
+            indexed, short = split_terms(keyword)
+            if indexed:
+                base_query += " AND rowid IN (SELECT rowid FROM conversations_fts WHERE conversations_fts MATCH ?)"
+                params.append(match_expression(indexed))
+            for term in short:
+                base_query += " AND title LIKE ?"
+                params.append(like_pattern(term))
 
         # Get total count
-        count_query = f"SELECT COUNT(*) as total {base_query}"
-        cursor = conn.execute(count_query, params)
-        total = cursor.fetchone()["total"]
+        total = None
+        if include_total:
+            count_query = f"SELECT COUNT(*) as total {base_query}"
+            cursor = await conn.execute(count_query, params)
+            total = (await cursor.fetchone())["total"]
 
-        # Get conversations with message count
+        # Get conversations; message_count and the last-message preview are
+        # maintained on the row by triggers on messages
         offset = (page - 1) * page_size
+        if after:
+            updated_at, rowid = decode_cursor(after, "conversations", 2)
+            base_query += " AND (updated_at, rowid) < (?, ?)"
+            params.extend([updated_at, rowid])
+            offset = 0
+
         query = f"""
-            SELECT
-                c.*,
-                (SELECT COUNT(*) FROM messages WHERE conversation_id = c.conversation_id) as message_count
-            FROM conversations c
-            WHERE c.user_id = ?
-            ORDER BY c.updated_at DESC
+            SELECT rowid AS row_key, * {base_query}
+            ORDER BY updated_at DESC, rowid DESC
             LIMIT ? OFFSET ?
         """
-
-        if keyword:
-            query = f"""
-                SELECT
-                    c.*,
-                    (SELECT COUNT(*) FROM messages WHERE conversation_id = c.conversation_id) as message_count
-                FROM conversations c
-                WHERE c.user_id = ? AND c.title LIKE ?
-                ORDER BY c.updated_at DESC
-                LIMIT ? OFFSET ?
-            """
-            cursor = conn.execute(query, [current_user["user_id"], f"%{keyword}%", page_size, offset])
-        else:
-            cursor = conn.execute(query, [current_user["user_id"], page_size, offset])
+        cursor = await conn.execute(query, params + [page_size + 1, offset])
+        rows = await cursor.fetchall()
+        cursor_after = next_cursor(rows, page_size, "conversations", "updated_at", "row_key")
 
         conversations = []
-        for row in cursor.fetchall():
+        for row in rows:
             conversations.append({
                 "conversation_id": row["conversation_id"],
                 "title": row["title"],
                 "created_at": row["created_at"],
                 "updated_at": row["updated_at"],
-                "message_count": row["message_count"]
+                "message_count": row["message_count"],
+                "last_message_at": row["last_message_at"],
+                "last_message_preview": row["last_message_preview"]
             })
 
     return APIResponse(
@@ -81,11 +123,118 @@ async def get_conversations(
             "total": total,
             "page": page,
             "page_size": page_size,
+            "next_cursor": cursor_after,
             "items": conversations
         }
     )
 
 
+@router.get("/search", response_model=APIResponse)
+async def search_conversations(
+    q: str = Query(..., min_length=1),
+    page: int = Query(1, ge=1),
+    page_size: int = Query(20, ge=1, le=100),
+    messages_per_conversation: int = Query(3, ge=1, le=20),
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Search conversations by message content
+
+    Conversations are ranked by their best-matching message (bm25) and
+    list the IDs and snippets of their top matching messages, matches
+    wrapped in <mark>. Messages of archived conversations are not indexed
+    until the conversation is opened again.
+    """
+    indexed, short = split_terms(q)
+    matched = bool(indexed)
+
+    async with db.for_user(current_user["user_id"]).connection() as conn:
+        # Build query
+        base_query = MATCHED_MESSAGES_SOURCE if matched else MESSAGES_SOURCE
+        params = [match_expression(indexed), current_user["user_id"]] if matched else [current_user["user_id"]]
+        for term in short:
+            base_query += SHORT_TERM_FILTER
+            params.append(like_pattern(term))
+
+        # Get total count
+        count_query = f"SELECT COUNT(DISTINCT m.conversation_id) AS total {base_query}"
+        cursor = await conn.execute(count_query, params)
+        total = (await cursor.fetchone())["total"]
+
+        # Get the page of conversations, best match first (newest hit first without a score)
+        offset = (page - 1) * page_size
+        query = f"""
+            SELECT
+                c.conversation_id, c.title, c.updated_at, c.message_count,
+                COUNT(*) AS hit_count,
+                {"MIN(messages_fts.rank)" if matched else "0"} AS rank,
+                MAX(m.created_at) AS last_hit_at
+            {base_query}
+            GROUP BY c.conversation_id
+            ORDER BY {"rank" if matched else "last_hit_at DESC"}
+            LIMIT ? OFFSET ?
+        """
+        cursor = await conn.execute(query, params + [page_size, offset])
+        conversations = [dict(row) for row in await cursor.fetchall()]
+
+        # Top messages of those conversations
+        query = f"""
+            SELECT conversation_id, message_id, role, created_at, message_rowid
+            FROM (
+                SELECT
+                    m.conversation_id, m.message_id, m.role, m.created_at, m.rowid AS message_rowid,
+                    ROW_NUMBER() OVER (
+                        PARTITION BY m.conversation_id
+                        ORDER BY {"messages_fts.rank" if matched else "m.created_at DESC"}
+                    ) AS position
+                {base_query}
+                AND m.conversation_id IN (SELECT value FROM json_each(?))
+            )
+            WHERE position <= ?
+            ORDER BY position
+        """
+        conversation_ids = json.dumps([c["conversation_id"] for c in conversations])
+        cursor = await conn.execute(query, params + [conversation_ids, messages_per_conversation])
+        hits = await cursor.fetchall()
+
+        # Snippets only for the messages returned
+        cursor = await conn.execute(MESSAGE_CONTENTS, (json.dumps([hit["message_rowid"] for hit in hits]),))
+        snippets = {row["message_rowid"]: excerpt(row["content"], indexed + short) for row in await cursor.fetchall()}
+
+    messages = {}
+    for hit in hits:
+        messages.setdefault(hit["conversation_id"], []).append({
+            "message_id": hit["message_id"],
+            "role": hit["role"],
+            "created_at": hit["created_at"],
+            "snippet": render_highlight(snippets.get(hit["message_rowid"]))
+        })
+
+    items = []
+    for conversation in conversations:
+        items.append({
+            "conversation_id": conversation["conversation_id"],
+            "title": conversation["title"],
+            "updated_at": conversation["updated_at"],
+            "message_count": conversation["message_count"],
+            "hit_count": conversation["hit_count"],
+            # rank (bm25) is lower for better matches; report higher-is-better
+            "score": -conversation["rank"] if matched else None,
+            "messages": messages.get(conversation["conversation_id"], [])
+        })
+
+    return APIResponse(
+        code=200,
+        message="success",
+        data={
+            "total": total,
+            "page": page,
+            "page_size": page_size,
+            "items": items
+        }
+    )
+
+
 @router.post("", response_model=APIResponse, status_code=status.HTTP_201_CREATED)
 async def create_conversation(
     conv_data: ConversationCreate,
@@ -100,11 +249,13 @@ async def create_conversation(
     # Use provided title or default to "新对话"
     title = conv_data.title if conv_data.title else "新对话"
 
-    with db.get_connection() as conn:
-        conn.execute("""
+    await db.for_user(current_user["user_id"]).writer.execute([
+        ("""
             INSERT INTO conversations (conversation_id, user_id, title, created_at, updated_at)
             VALUES (?, ?, ?, ?, ?)
         """, (conversation_id, current_user["user_id"], title, now, now))
+    ])
+    typeahead_index.put_conversation(current_user["user_id"], conversation_id, title)
 
     return APIResponse(
         code=201,
@@ -125,29 +276,22 @@ async def get_conversation(
     """
     Get conversation details with messages
     """
-    with db.get_connection() as conn:
+    async with db.for_user(current_user["user_id"]).connection() as conn:
         # Get conversation
-        cursor = conn.execute("""
+        cursor = await conn.execute("""
             SELECT * FROM conversations
-            WHERE conversation_id = ? AND user_id = ?
+            WHERE conversation_id = ? AND user_id = ? AND deleted_at IS NULL
         """, (conversation_id, current_user["user_id"]))
 
-        conversation = cursor.fetchone()
+        conversation = await cursor.fetchone()
         if not conversation:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Conversation not found"
             )
 
-        # Get messages
-        cursor = conn.execute("""
-            SELECT message_id, role, content, created_at
-            FROM messages
-            WHERE conversation_id = ?
-            ORDER BY created_at ASC
-        """, (conversation_id,))
-
-        messages = [dict(msg) for msg in cursor.fetchall()]
+        # Get messages (from the archive if the conversation has gone cold)
+        messages = await conn.run(read_messages, conversation_id)
 
     return APIResponse(
         code=200,
@@ -171,14 +315,14 @@ async def update_conversation(
     """
     Update conversation title
     """
-    with db.get_connection() as conn:
+    async with db.for_user(current_user["user_id"]).connection() as conn:
         # Check ownership
-        cursor = conn.execute("""
+        cursor = await conn.execute("""
             SELECT user_id FROM conversations
-            WHERE conversation_id = ?
+            WHERE conversation_id = ? AND deleted_at IS NULL
         """, (conversation_id,))
 
-        conversation = cursor.fetchone()
+        conversation = await cursor.fetchone()
         if not conversation or conversation["user_id"] != current_user["user_id"]:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -186,11 +330,12 @@ async def update_conversation(
             )
 
         # Update
-        conn.execute("""
+        await conn.execute("""
             UPDATE conversations
             SET title = ?, updated_at = ?
             WHERE conversation_id = ?
         """, (conv_data.title, datetime.utcnow(), conversation_id))
+    typeahead_index.put_conversation(current_user["user_id"], conversation_id, conv_data.title)
 
     return APIResponse(
         code=200,
@@ -209,32 +354,30 @@ async def delete_conversation(
 ):
     """
     Delete a conversation
+
+    The conversation is only marked as deleted here; its messages are
+    removed in small batches by the background purger (app/purge.py).
     """
-    with db.get_connection() as conn:
+    async with db.for_user(current_user["user_id"]).connection() as conn:
         # Check ownership
-        cursor = conn.execute("""
+        cursor = await conn.execute("""
             SELECT user_id FROM conversations
-            WHERE conversation_id = ?
+            WHERE conversation_id = ? AND deleted_at IS NULL
         """, (conversation_id,))
 
-        conversation = cursor.fetchone()
+        conversation = await cursor.fetchone()
         if not conversation or conversation["user_id"] != current_user["user_id"]:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Conversation not found"
             )
 
-        # Delete messages first (foreign key constraint)
-        conn.execute("""
-            DELETE FROM messages
-            WHERE conversation_id = ?
-        """, (conversation_id,))
-
-        # Delete conversation
-        conn.execute("""
-            DELETE FROM conversations
+        await conn.execute("""
+            UPDATE conversations
+            SET deleted_at = ?
             WHERE conversation_id = ?
-        """, (conversation_id,))
+        """, (datetime.utcnow(), conversation_id))
+    typeahead_index.discard_conversation(current_user["user_id"], conversation_id)
 
     return APIResponse(
         code=200,
@@ -7,11 +7,98 @@ from app.schemas import (
 )
 from app.database import db
 from app.dependencies import get_current_user
-from typing import Optional
+from app.content_store import put_content
+from app.pagination import decode_cursor, next_cursor
+from app.fts import (
+    split_terms, match_expression, like_pattern, excerpt, mark, render_highlight
+)
+from app.vectors import vector_index, refresh_vector
+from app.search_cache import search_cache, normalize_query
+from app.typeahead import typeahead_index
+from app.near_duplicates import refresh_signature, find_duplicates, duplicate_report
+from typing import List, Optional, Tuple
 from datetime import datetime
+import json
 
 router = APIRouter(prefix="/documents", tags=["Documents"])
 
+DOCUMENTS_SOURCE = "FROM documents d WHERE d.user_id = ? AND d.deleted_at IS NULL"
+
+# Documents matching the indexed keyword terms (parameters: MATCH expression, user_id).
+# CROSS JOIN keeps the index lookup first; otherwise the planner may walk all
+# of the user's documents and probe documents_fts once per row.
+MATCHED_DOCUMENTS_SOURCE = """
+    FROM documents_fts
+    CROSS JOIN documents d ON d.rowid = documents_fts.rowid
+    WHERE documents_fts MATCH ? AND d.user_id = ? AND d.deleted_at IS NULL
+"""
+
+# Terms without indexable characters are matched by substring instead
+SHORT_TERM_FILTER = """
+    AND (d.title LIKE ? OR d.summary LIKE ?
+         OR COALESCE((SELECT content FROM content_blobs WHERE hash = d.content_hash), d.content) LIKE ?)
+"""
+
+# Extra columns for keyword queries; the excerpt is cut from the body in Python
+# since the index only holds fts_tokens() output
+KEYWORD_COLUMNS = """
+    COALESCE((SELECT content FROM content_blobs WHERE hash = d.content_hash), d.content) AS content,
+"""
+MATCH_COLUMNS = """
+    documents_fts.rank AS rank,
+"""
+
+# Upper bound for a prefix range scan: sorts after every string starting with the prefix
+PREFIX_END = "\U0010ffff"
+
+# Documents picked by the vector index (parameters: JSON array of ids, user_id).
+# CROSS JOIN looks the ids up by primary key instead of walking the user's documents.
+RANKED_DOCUMENTS = """
+    SELECT
+        d.document_id, d.title, d.summary, d.created_at, d.updated_at,
+        (SELECT GROUP_CONCAT(tag_name) FROM document_tags
+         WHERE document_id = d.document_id) as tags
+    FROM json_each(?) AS ranked
+    CROSS JOIN documents d ON d.document_id = ranked.value
+    WHERE d.user_id = ? AND d.deleted_at IS NULL
+"""
+
+
+def _match_fields(row, terms: List[str], matched: bool) -> dict:
+    """snippet / title_highlight / score of a row selected with KEYWORD_COLUMNS (and MATCH_COLUMNS)"""
+    return {
+        "snippet": render_highlight(excerpt(row["content"], terms)),
+        "title_highlight": render_highlight(mark(row["title"], terms)),
+        # rank (bm25, weights set in migration 11) is lower for better matches; report higher-is-better
+        "score": -row["rank"] if matched else None
+    }
+
+
+async def _ranked_documents(user_id: str, ranked: List[Tuple[str, float]]) -> List[dict]:
+    """Rows for (document_id, similarity) pairs from the vector index, in that order"""
+    if not ranked:
+        return []
+    async with db.for_user(user_id).connection() as conn:
+        ids = json.dumps([document_id for document_id, _ in ranked])
+        rows = await conn.fetchall(RANKED_DOCUMENTS, (ids, user_id))
+    by_id = {row["document_id"]: row for row in rows}
+
+    documents = []
+    for document_id, similarity in ranked:
+        row = by_id.get(document_id)
+        if row is None:
+            continue
+        documents.append({
+            "document_id": row["document_id"],
+            "title": row["title"],
+            "summary": row["summary"],
+            "tags": row["tags"].split(",") if row["tags"] else [],
+            "created_at": row["created_at"],
+            "updated_at": row["updated_at"],
+            "score": round(similarity, 4)
+        })
+    return documents
+
 
 @router.get("", response_model=APIResponse)
 async def get_documents(
@@ -19,110 +106,349 @@ async def get_documents(
     page_size: int = Query(20, ge=1, le=100),
     tag: Optional[str] = None,
     keyword: Optional[str] = None,
-    sort_by: str = Query("updated_at", regex="^(created_at|updated_at)$"),
+    sort_by: str = Query("updated_at", regex="^(created_at|updated_at|relevance)$"),
+    after: Optional[str] = Query(None, description="Cursor from a previous page's next_cursor"),
+    include_total: bool = True,
     current_user: dict = Depends(get_current_user)
 ):
     """
     Get list of documents
+
+    Pass `after` (the previous response's next_cursor) for keyset
+    pagination; `page` is then ignored. A cursor is only valid for the
+    sort_by it was issued with.
+
+    `keyword` is matched through the full-text index; items then carry a
+    snippet and a highlighted title, and sort_by=relevance orders them by
+    bm25 score (page-based pagination only).
     """
-    with db.get_connection() as conn:
+    if sort_by == "relevance" and after:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Cursor pagination is not available when sorting by relevance"
+        )
+
+    # Filtered lists are cached until the user's documents change
+    cache_key = None
+    if tag or keyword:
+        cache_key = search_cache.key(
+            current_user["user_id"], "documents", page, page_size, tag, normalize_query(keyword),
+            sort_by, after, include_total
+        )
+        cached = search_cache.get(cache_key)
+        if cached is not None:
+            return APIResponse(code=200, message="success", data=cached)
+
+    async with db.for_user(current_user["user_id"]).connection() as conn:
         # Build query
-        base_query = "FROM documents d WHERE user_id = ?"
-        params = [current_user["user_id"]]
+        indexed, short = split_terms(keyword or "")
+        matched = bool(indexed)
+        base_query = MATCHED_DOCUMENTS_SOURCE if matched else DOCUMENTS_SOURCE
+        params = [match_expression(indexed), current_user["user_id"]] if matched else [current_user["user_id"]]
+        for term in short:
+            base_query += SHORT_TERM_FILTER
+            params.extend([like_pattern(term)] * 3)
 
         if tag:
             base_query += """
                 AND EXISTS (
-                    SELECT 1 FROM document_tags
-                    WHERE document_id = d.document_id AND tag_name = ?
+                    SELECT 1 FROM document_tags dt
+                    WHERE dt.document_id = d.document_id AND dt.tag_name = ?
                 )
             """
             params.append(tag)
 
-        if keyword:
-            base_query += " AND (title LIKE ? OR content LIKE ? OR summary LIKE ?)"
-            params.extend([f"%{keyword}%", f"%{keyword}%", f"%{keyword}%"])
-
         # Get total count
-        count_query = f"SELECT COUNT(*) as total {base_query}"
-        cursor = conn.execute(count_query, params)
-        total = cursor.fetchone()["total"]
+        total = None
+        if include_total:
+            count_query = f"SELECT COUNT(*) as total {base_query}"
+            cursor = await conn.execute(count_query, params)
+            total = (await cursor.fetchone())["total"]
 
         # Get documents with tags
         offset = (page - 1) * page_size
-        order = "DESC" if sort_by == "updated_at" else "DESC"
+        if sort_by == "relevance":
+            # Without an indexed term there is no score to order by
+            order_by = "documents_fts.rank" if matched else "d.updated_at DESC, d.rowid DESC"
+        else:
+            order_by = f"d.{sort_by} DESC, d.rowid DESC"
+            cursor_kind = f"documents:{sort_by}"
+            if after:
+                sort_value, rowid = decode_cursor(after, cursor_kind, 2)
+                base_query += f" AND (d.{sort_by}, d.rowid) < (?, ?)"
+                params.extend([sort_value, rowid])
+                offset = 0
+
         query = f"""
             SELECT
+                d.rowid AS row_key,
                 d.document_id, d.title, d.summary, d.created_at, d.updated_at,
-                GROUP_CONCAT(dt.tag_name) as tags
-            FROM documents d
-            LEFT JOIN document_tags dt ON d.document_id = dt.document_id
-            WHERE d.user_id = ?
-            GROUP BY d.document_id
-            ORDER BY d.{sort_by} {order}
+                {KEYWORD_COLUMNS if keyword else ""}
+                {MATCH_COLUMNS if matched else ""}
+                (SELECT GROUP_CONCAT(tag_name) FROM document_tags
+                 WHERE document_id = d.document_id) as tags
+            {base_query}
+            ORDER BY {order_by}
             LIMIT ? OFFSET ?
         """
+        cursor = await conn.execute(query, params + [page_size + 1, offset])
+        rows = await cursor.fetchall()
+        if sort_by == "relevance":
+            cursor_after = None
+            rows = rows[:page_size]
+        else:
+            cursor_after = next_cursor(rows, page_size, cursor_kind, sort_by, "row_key")
 
-        # Re-apply filters in main query
-        filter_params = []
-        if tag:
-            query = f"""
-                SELECT
-                    d.document_id, d.title, d.summary, d.created_at, d.updated_at,
-                    GROUP_CONCAT(dt.tag_name) as tags
-                FROM documents d
-                LEFT JOIN document_tags dt ON d.document_id = dt.document_id
-                WHERE d.user_id = ?
+        documents = []
+        for row in rows:
+            document = {
+                "document_id": row["document_id"],
+                "title": row["title"],
+                "summary": row["summary"],
+                "tags": row["tags"].split(",") if row["tags"] else [],
+                "created_at": row["created_at"],
+                "updated_at": row["updated_at"]
+            }
+            if keyword:
+                document.update(_match_fields(row, indexed + short, matched))
+            documents.append(document)
+
+    data = {
+        "total": total,
+        "next_cursor": cursor_after,
+        "items": documents
+    }
+    if cache_key:
+        search_cache.put(cache_key, data)
+
+    return APIResponse(
+        code=200,
+        message="success",
+        data=data
+    )
+
+
+@router.get("/search", response_model=APIResponse)
+async def search_documents(
+    q: str = Query(..., min_length=1),
+    tags: Optional[str] = None,
+    page: int = Query(1, ge=1),
+    page_size: int = Query(20, ge=1, le=100),
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Search documents by keyword and tags
+
+    Results are ranked by bm25 (title matches weigh most) and carry a
+    snippet and a highlighted title, with matches wrapped in <mark>. Terms
+    are matched as Chinese bigrams or word prefixes (see app/fts.py); a
+    query made only of punctuation or symbols is answered by substring
+    match, newest first.
+    """
+    cache_key = search_cache.key(
+        current_user["user_id"], "search", normalize_query(q),
+        tuple(sorted(tag.strip() for tag in tags.split(","))) if tags else None, page, page_size
+    )
+    cached = search_cache.get(cache_key)
+    if cached is not None:
+        return APIResponse(code=200, message="success", data=cached)
+
+    async with db.for_user(current_user["user_id"]).connection() as conn:
+        # Build query
+        indexed, short = split_terms(q)
+        matched = bool(indexed)
+        base_query = MATCHED_DOCUMENTS_SOURCE if matched else DOCUMENTS_SOURCE
+        params = [match_expression(indexed), current_user["user_id"]] if matched else [current_user["user_id"]]
+        for term in short:
+            base_query += SHORT_TERM_FILTER
+            params.extend([like_pattern(term)] * 3)
+
+        if tags:
+            tag_list = tags.split(",")
+            for tag in tag_list:
+                base_query += """
                     AND EXISTS (
-                        SELECT 1 FROM document_tags dt2
-                        WHERE dt2.document_id = d.document_id AND dt2.tag_name = ?
+                        SELECT 1 FROM document_tags
+                        WHERE document_id = d.document_id AND tag_name = ?
                     )
-                GROUP BY d.document_id
-                ORDER BY d.{sort_by} {order}
-                LIMIT ? OFFSET ?
-            """
-            cursor = conn.execute(query, [current_user["user_id"], tag, page_size, offset])
-        elif keyword:
-            query = f"""
-                SELECT
-                    d.document_id, d.title, d.summary, d.created_at, d.updated_at,
-                    GROUP_CONCAT(dt.tag_name) as tags
-                FROM documents d
-                LEFT JOIN document_tags dt ON d.document_id = dt.document_id
-                WHERE d.user_id = ? AND (d.title LIKE ? OR d.content LIKE ? OR d.summary LIKE ?)
-                GROUP BY d.document_id
-                ORDER BY d.{sort_by} {order}
-                LIMIT ? OFFSET ?
-            """
-            cursor = conn.execute(query, [
-                current_user["user_id"],
-                f"%{keyword}%", f"%{keyword}%", f"%{keyword}%",
-                page_size, offset
-            ])
-        else:
-            cursor = conn.execute(query, [current_user["user_id"], page_size, offset])
+                """
+                params.append(tag.strip())
+
+        # Get total count
+        count_query = f"SELECT COUNT(*) as total {base_query}"
+        cursor = await conn.execute(count_query, params)
+        total = (await cursor.fetchone())["total"]
+
+        # Get documents
+        offset = (page - 1) * page_size
+        query = f"""
+            SELECT
+                d.document_id, d.title, d.summary, d.created_at, d.updated_at,
+                {KEYWORD_COLUMNS}
+                {MATCH_COLUMNS if matched else ""}
+                (SELECT GROUP_CONCAT(tag_name) FROM document_tags
+                 WHERE document_id = d.document_id) as tags
+            {base_query}
+            ORDER BY {"documents_fts.rank" if matched else "d.updated_at DESC"}
+            LIMIT ? OFFSET ?
+        """
+        cursor = await conn.execute(query, params + [page_size, offset])
 
         documents = []
-        for row in cursor.fetchall():
-            documents.append({
+        for row in await cursor.fetchall():
+            document = {
                 "document_id": row["document_id"],
                 "title": row["title"],
                 "summary": row["summary"],
                 "tags": row["tags"].split(",") if row["tags"] else [],
                 "created_at": row["created_at"],
                 "updated_at": row["updated_at"]
-            })
+            }
+            document.update(_match_fields(row, indexed + short, matched))
+            documents.append(document)
+
+    data = {
+        "total": total,
+        "items": documents
+    }
+    search_cache.put(cache_key, data)
+
+    return APIResponse(
+        code=200,
+        message="success",
+        data=data
+    )
+
+
+@router.get("/tags", response_model=APIResponse)
+async def get_tag_facets(
+    prefix: Optional[str] = None,
+    sort_by: str = Query("count", regex="^(count|name)$"),
+    limit: int = Query(100, ge=1, le=1000),
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    List the user's tags with the number of documents carrying each
+
+    Counts come from tag_counts, which triggers keep up to date (migration
+    13), so this never reads the documents. `prefix` matches the start of
+    the tag name (case-sensitive).
+    """
+    filters = ""
+    params = [current_user["user_id"]]
+    if prefix:
+        filters += " AND tag_name >= ? AND tag_name < ?"
+        params.extend([prefix, prefix + PREFIX_END])
+    order_by = "document_count DESC, tag_name" if sort_by == "count" else "tag_name"
+
+    async with db.for_user(current_user["user_id"]).connection() as conn:
+        rows = await conn.fetchall(f"""
+            SELECT tag_name, document_count FROM tag_counts
+            WHERE user_id = ?{filters}
+            ORDER BY {order_by}
+            LIMIT ?
+        """, params + [limit])
+
+    return APIResponse(
+        code=200,
+        message="success",
+        data={
+            "items": [{"name": row["tag_name"], "count": row["document_count"]} for row in rows]
+        }
+    )
+
+
+@router.get("/semantic-search", response_model=APIResponse)
+async def semantic_search_documents(
+    q: str = Query(..., min_length=1),
+    limit: int = Query(10, ge=1, le=50),
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Find the documents closest to a free-text query
+
+    Ranked by cosine similarity of hashed TF-IDF vectors (app/vectors.py),
+    so documents sharing many of the query's words score high even without
+    containing all of them.
+    """
+    cache_key = search_cache.key(current_user["user_id"], "semantic", normalize_query(q), limit)
+    cached = search_cache.get(cache_key)
+    if cached is not None:
+        return APIResponse(code=200, message="success", data=cached)
+
+    ranked = await vector_index.search(current_user["user_id"], q, limit)
+    data = {
+        "items": await _ranked_documents(current_user["user_id"], ranked)
+    }
+    search_cache.put(cache_key, data)
+
+    return APIResponse(
+        code=200,
+        message="success",
+        data=data
+    )
+
+
+@router.get("/duplicates", response_model=APIResponse)
+async def get_duplicate_documents(
+    threshold: Optional[float] = Query(None, ge=0.1, le=1.0),
+    limit: int = Query(50, ge=1, le=200),
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    List groups of near-duplicate documents, as candidates for merging
+
+    Documents are compared by MinHash signatures of their content and only
+    within shared LSH buckets (app/near_duplicates.py). Each group lists its
+    newest document first with every document's estimated similarity to it.
+    `threshold` overrides DUPLICATE_THRESHOLD.
+    """
+    args = (current_user["user_id"],) if threshold is None else (current_user["user_id"], threshold)
+    signed, groups = await db.for_user(current_user["user_id"]).run(duplicate_report, *args)
 
     return APIResponse(
         code=200,
         message="success",
         data={
-            "total": total,
-            "items": documents
+            "total": len(groups),
+            "signed": signed,
+            "items": [{"documents": group} for group in groups[:limit]]
         }
     )
 
 
+@router.get("/{document_id}/related", response_model=APIResponse)
+async def get_related_documents(
+    document_id: str,
+    limit: int = Query(10, ge=1, le=50),
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Get the documents most similar to a document, by vector cosine similarity
+    """
+    cache_key = search_cache.key(current_user["user_id"], "related", document_id, limit)
+    cached = search_cache.get(cache_key)
+    if cached is not None:
+        return APIResponse(code=200, message="success", data=cached)
+
+    ranked = await vector_index.related(current_user["user_id"], document_id, limit)
+    if ranked is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Document not found"
+        )
+    data = {
+        "items": await _ranked_documents(current_user["user_id"], ranked)
+    }
+    search_cache.put(cache_key, data)
+
+    return APIResponse(
+        code=200,
+        message="success",
+        data=data
+    )
+
+
 @router.get("/{document_id}", response_model=APIResponse)
 async def get_document(
     document_id: str,
@@ -131,13 +457,16 @@ async def get_document(
     """
     Get document details
     """
-    with db.get_connection() as conn:
-        cursor = conn.execute("""
-            SELECT * FROM documents
-            WHERE document_id = ? AND user_id = ?
+    async with db.for_user(current_user["user_id"]).connection() as conn:
+        cursor = await conn.execute("""
+            SELECT
+                d.*,
+                COALESCE((SELECT content FROM content_blobs WHERE hash = d.content_hash), d.content) AS resolved_content
+            FROM documents d
+            WHERE d.document_id = ? AND d.user_id = ? AND d.deleted_at IS NULL
         """, (document_id, current_user["user_id"]))
 
-        document = cursor.fetchone()
+        document = await cursor.fetchone()
         if not document:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -145,12 +474,12 @@ async def get_document(
             )
 
         # Get tags
-        cursor = conn.execute("""
+        cursor = await conn.execute("""
             SELECT tag_name FROM document_tags
             WHERE document_id = ?
         """, (document_id,))
 
-        tags = [row["tag_name"] for row in cursor.fetchall()]
+        tags = [row["tag_name"] for row in await cursor.fetchall()]
 
     return APIResponse(
         code=200,
@@ -158,7 +487,7 @@ async def get_document(
         data={
             "document_id": document["document_id"],
             "title": document["title"],
-            "content": document["content"],
+            "content": document["resolved_content"],
             "summary": document["summary"],
             "tags": tags,
             "source_conversation_id": document["source_conversation_id"],
@@ -179,29 +508,38 @@ async def create_document(
     document_id = db.generate_uuid()
     now = datetime.utcnow()
 
-    with db.get_connection() as conn:
-        conn.execute("""
+    async with db.for_user(current_user["user_id"]).connection() as conn:
+        stored, content_hash = await conn.run(put_content, doc_data.content)
+        await conn.execute("""
             INSERT INTO documents
-            (document_id, user_id, title, content, summary, created_at, updated_at)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
+            (document_id, user_id, title, content, content_hash, summary, created_at, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
         """, (document_id, current_user["user_id"], doc_data.title,
-              doc_data.content, doc_data.summary, now, now))
+              stored, content_hash, doc_data.summary, now, now))
 
         # Add tags
         for tag in doc_data.tags:
             tag_id = db.generate_uuid()
-            conn.execute("""
+            await conn.execute("""
                 INSERT INTO document_tags (tag_id, document_id, tag_name)
                 VALUES (?, ?, ?)
             """, (tag_id, document_id, tag))
 
+        vector = await conn.run(refresh_vector, current_user["user_id"], document_id)
+        signature = await conn.run(refresh_signature, current_user["user_id"], document_id)
+        duplicates = await conn.run(find_duplicates, current_user["user_id"], document_id, signature)
+    vector_index.put(current_user["user_id"], document_id, vector)
+    search_cache.invalidate(current_user["user_id"])
+    typeahead_index.put_document(current_user["user_id"], document_id, doc_data.title, doc_data.tags)
+
     return APIResponse(
         code=201,
         message="创建成功",
         data={
             "document_id": document_id,
             "title": doc_data.title,
-            "created_at": now
+            "created_at": now,
+            "duplicates": duplicates
         }
     )
 
@@ -215,14 +553,14 @@ async def update_document(
     """
     Update a document
     """
-    with db.get_connection() as conn:
+    async with db.for_user(current_user["user_id"]).connection() as conn:
         # Check ownership
-        cursor = conn.execute("""
+        cursor = await conn.execute("""
             SELECT user_id FROM documents
-            WHERE document_id = ?
+            WHERE document_id = ? AND deleted_at IS NULL
         """, (document_id,))
 
-        document = cursor.fetchone()
+        document = await cursor.fetchone()
         if not document or document["user_id"] != current_user["user_id"]:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -236,8 +574,11 @@ async def update_document(
             updates.append("title = ?")
             params.append(doc_data.title)
         if doc_data.content:
+            stored, content_hash = await conn.run(put_content, doc_data.content)
             updates.append("content = ?")
-            params.append(doc_data.content)
+            params.append(stored)
+            updates.append("content_hash = ?")
+            params.append(content_hash)
         if doc_data.summary is not None:
             updates.append("summary = ?")
             params.append(doc_data.summary)
@@ -248,12 +589,14 @@ async def update_document(
             params.append(document_id)
 
             query = f"UPDATE documents SET {', '.join(updates)} WHERE document_id = ?"
-            conn.execute(query, params)
+            await conn.execute(query, params)
+            vector = await conn.run(refresh_vector, current_user["user_id"], document_id)
+            await conn.run(refresh_signature, current_user["user_id"], document_id)
 
         # Update tags if provided
         if doc_data.tags is not None:
             # Delete existing tags
-            conn.execute("""
+            await conn.execute("""
                 DELETE FROM document_tags
                 WHERE document_id = ?
             """, (document_id,))
@@ -261,11 +604,16 @@ async def update_document(
             # Add new tags
             for tag in doc_data.tags:
                 tag_id = db.generate_uuid()
-                conn.execute("""
+                await conn.execute("""
                     INSERT INTO document_tags (tag_id, document_id, tag_name)
                     VALUES (?, ?, ?)
                 """, (tag_id, document_id, tag))
 
+    if updates:
+        vector_index.put(current_user["user_id"], document_id, vector)
+    search_cache.invalidate(current_user["user_id"])
+    typeahead_index.put_document(current_user["user_id"], document_id, doc_data.title or None, doc_data.tags)
+
     return APIResponse(
         code=200,
         message="更新成功",
@@ -284,107 +632,35 @@ async def delete_document(
 ):
     """
     Delete a document
+
+    The document is only marked as deleted here; its tags are removed by
+    the background purger (app/purge.py).
     """
-    with db.get_connection() as conn:
+    async with db.for_user(current_user["user_id"]).connection() as conn:
         # Check ownership
-        cursor = conn.execute("""
+        cursor = await conn.execute("""
             SELECT user_id FROM documents
-            WHERE document_id = ?
+            WHERE document_id = ? AND deleted_at IS NULL
         """, (document_id,))
 
-        document = cursor.fetchone()
+        document = await cursor.fetchone()
         if not document or document["user_id"] != current_user["user_id"]:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Document not found"
             )
 
-        # Delete tags first
-        conn.execute("""
-            DELETE FROM document_tags
+        await conn.execute("""
+            UPDATE documents
+            SET deleted_at = ?
             WHERE document_id = ?
-        """, (document_id,))
+        """, (datetime.utcnow(), document_id))
 
-        # Delete document
-        conn.execute("""
-            DELETE FROM documents
-            WHERE document_id = ?
-        """, (document_id,))
+    vector_index.discard(current_user["user_id"], document_id)
+    search_cache.invalidate(current_user["user_id"])
+    typeahead_index.discard_document(current_user["user_id"], document_id)
 
     return APIResponse(
         code=200,
         message="删除成功"
     )
-
-
-@router.get("/search", response_model=APIResponse)
-async def search_documents(
-    q: str = Query(..., min_length=1),
-    tags: Optional[str] = None,
-    page: int = Query(1, ge=1),
-    page_size: int = Query(20, ge=1, le=100),
-    current_user: dict = Depends(get_current_user)
-):
-    """
-    Search documents by keyword and tags
-    """
-    with db.get_connection() as conn:
-        # Build query
-        base_query = "FROM documents d WHERE user_id = ? AND (title LIKE ? OR content LIKE ? OR summary LIKE ?)"
-        params = [current_user["user_id"], f"%{q}%", f"%{q}%", f"%{q}%"]
-
-        if tags:
-            tag_list = tags.split(",")
-            for tag in tag_list:
-                base_query += """
-                    AND EXISTS (
-                        SELECT 1 FROM document_tags
-                        WHERE document_id = d.document_id AND tag_name = ?
-                    )
-                """
-                params.append(tag.strip())
-
-        # Get total count
-        count_query = f"SELECT COUNT(*) as total {base_query}"
-        cursor = conn.execute(count_query, params)
-        total = cursor.fetchone()["total"]
-
-        # Get documents
-        offset = (page - 1) * page_size
-        query = f"""
-            SELECT
-                d.document_id, d.title, d.summary, d.created_at, d.updated_at,
-                GROUP_CONCAT(dt.tag_name) as tags
-            FROM documents d
-            LEFT JOIN document_tags dt ON d.document_id = dt.document_id
-            WHERE d.user_id = ? AND (d.title LIKE ? OR d.content LIKE ? OR d.summary LIKE ?)
-            GROUP BY d.document_id
-            ORDER BY d.updated_at DESC
-            LIMIT ? OFFSET ?
-        """
-
-        cursor = conn.execute(query, [
-            current_user["user_id"],
-            f"%{q}%", f"%{q}%", f"%{q}%",
-            page_size, offset
-        ])
-
-        documents = []
-        for row in cursor.fetchall():
-            documents.append({
-                "document_id": row["document_id"],
-                "title": row["title"],
-                "summary": row["summary"],
-                "tags": row["tags"].split(",") if row["tags"] else [],
-                "created_at": row["created_at"],
-                "updated_at": row["updated_at"]
-            })
-
-    return APIResponse(
-        code=200,
-        message="success",
-        data={
-            "total": total,
-            "items": documents
-        }
-    )
@@ -5,6 +5,7 @@ from fastapi import APIRouter, HTTPException, status, Depends, Query
 from app.schemas import EmailNotificationResponse, APIResponse
 from app.database import db
 from app.dependencies import get_current_user
+from app.pagination import decode_cursor, next_cursor
 from typing import Optional
 
 router = APIRouter(prefix="/emails/notifications", tags=["Email Notifications"])
@@ -15,17 +16,22 @@ async def get_email_notifications(
     task_id: Optional[str] = None,
     page: int = Query(1, ge=1),
     page_size: int = Query(20, ge=1, le=100),
+    after: Optional[str] = Query(None, description="Cursor from a previous page's next_cursor"),
+    include_total: bool = True,
     current_user: dict = Depends(get_current_user)
 ):
     """
     Get email notification history
+
+    Pass `after` (the previous response's next_cursor) for keyset
+    pagination; `page` is then ignored.
     """
-    with db.get_connection() as conn:
+    async with db.for_user(current_user["user_id"]).connection() as conn:
         # Build query
         base_query = """
             FROM email_notifications en
             JOIN tasks t ON en.task_id = t.task_id
-            WHERE t.user_id = ?
+            WHERE t.user_id = ? AND t.deleted_at IS NULL
         """
         params = [current_user["user_id"]]
 
@@ -34,26 +40,38 @@ async def get_email_notifications(
             params.append(task_id)
 
         # Get total count
-        count_query = f"SELECT COUNT(*) as total {base_query}"
-        cursor = conn.execute(count_query, params)
-        total = cursor.fetchone()["total"]
+        total = None
+        if include_total:
+            count_query = f"SELECT COUNT(*) as total {base_query}"
+            cursor = await conn.execute(count_query, params)
+            total = (await cursor.fetchone())["total"]
 
         # Get notifications
         offset = (page - 1) * page_size
+        if after:
+            created_at, rowid = decode_cursor(after, "email_notifications", 2)
+            base_query += " AND (en.created_at, en.rowid) < (?, ?)"
+            params.extend([created_at, rowid])
+            offset = 0
+
         query = f"""
             SELECT
+                en.rowid AS row_key, en.created_at,
                 en.notification_id, en.task_id, en.recipient_email, en.status,
                 en.sent_at, en.error_message,
                 t.title as task_title
             {base_query}
-            ORDER BY en.created_at DESC
+            ORDER BY en.created_at DESC, en.rowid DESC
             LIMIT ? OFFSET ?
         """
-        params.extend([page_size, offset])
+        params.extend([page_size + 1, offset])
+
+        cursor = await conn.execute(query, params)
+        rows = await cursor.fetchall()
+        cursor_after = next_cursor(rows, page_size, "email_notifications", "created_at", "row_key")
 
-        cursor = conn.execute(query, params)
         notifications = []
-        for row in cursor.fetchall():
+        for row in rows:
             notifications.append({
                 "notification_id": row["notification_id"],
                 "task_id": row["task_id"],
@@ -69,6 +87,7 @@ async def get_email_notifications(
         message="success",
         data={
             "total": total,
+            "next_cursor": cursor_after,
             "items": notifications
         }
     )
@@ -132,18 +132,18 @@ async def github_callback(code: str):
         # Check if user exists by GitHub ID
         username = None  # Initialize username variable
 
-        with db.get_connection() as conn:
-            cursor = conn.execute(
+        async with db.connection() as conn:
+            cursor = await conn.execute(
                 "SELECT user_id, username, email FROM users WHERE github_id = ?",
                 (str(github_user.get("id")),)
             )
-            existing_user = cursor.fetchone()
+            existing_user = await cursor.fetchone()
 
             if existing_user:
                 # User exists, update info and login
                 user_id = existing_user["user_id"]
                 username = existing_user["username"]
-                conn.execute(
+                await conn.execute(
                     "UPDATE users SET updated_at = ? WHERE user_id = ?",
                     (datetime.utcnow(), user_id)
                 )
@@ -154,30 +154,30 @@ async def github_callback(code: str):
                 now = datetime.utcnow()
 
                 # Check if username already exists
-                cursor = conn.execute(
+                cursor = await conn.execute(
                     "SELECT user_id FROM users WHERE username = ?",
                     (username,)
                 )
-                if cursor.fetchone():
+                if await cursor.fetchone():
                     username = f"{username}_{github_user.get('id')}"
 
                 # Check if email already exists
-                cursor = conn.execute(
+                cursor = await conn.execute(
                     "SELECT user_id, username FROM users WHERE email = ?",
                     (primary_email,)
                 )
-                existing_email_user = cursor.fetchone()
+                existing_email_user = await cursor.fetchone()
                 if existing_email_user:
                     # Email exists, link GitHub account
                     user_id = existing_email_user["user_id"]
                     username = existing_email_user["username"]
-                    conn.execute(
+                    await conn.execute(
                         "UPDATE users SET github_id = ?, avatar_url = ?, updated_at = ? WHERE user_id = ?",
                         (str(github_user.get("id")), github_user.get("avatar_url"), datetime.utcnow(), user_id)
                     )
                 else:
                     # Create new user
-                    conn.execute("""
+                    await conn.execute("""
                         INSERT INTO users (user_id, username, email, github_id, avatar_url, created_at, updated_at)
                         VALUES (?, ?, ?, ?, ?, ?, ?)
                     """, (
@@ -192,7 +192,7 @@ async def github_callback(code: str):
 
                     # Create default settings
                     setting_id = db.generate_uuid()
-                    conn.execute("""
+                    await conn.execute("""
                         INSERT INTO user_settings (setting_id, user_id, default_email, reminder_enabled)
                         VALUES (?, ?, ?, 1)
                     """, (setting_id, user_id, primary_email))
@@ -211,12 +211,12 @@ async def get_github_user(current_user: dict = Depends(get_current_user)):
     """
     Get current user info
     """
-    with db.get_connection() as conn:
-        cursor = conn.execute(
+    async with db.connection() as conn:
+        cursor = await conn.execute(
             "SELECT user_id, username, email, github_id, avatar_url FROM users WHERE user_id = ?",
             (current_user["user_id"],)
         )
-        user = cursor.fetchone()
+        user = await cursor.fetchone()
 
     if not user:
         raise HTTPException(
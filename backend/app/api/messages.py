@@ -7,33 +7,116 @@ from app.schemas import MessageCreate, MessageResponse, MessageSendResponse, API
 from app.database import db
 from app.ai_service import nvidia_service
 from app.dependencies import get_current_user, get_user_settings
-from typing import Optional
+from app.archive import load_archived_messages, rehydrate_conversation
+from app.content_store import prepare_content
+from app.pagination import decode_cursor, next_cursor
+from app.typeahead import typeahead_index
+from typing import Optional, List, Dict
 from datetime import datetime
 import json
+import logging
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/conversations/{conversation_id}/messages", tags=["Messages"])
 
 
 async def verify_conversation_ownership(conversation_id: str, user_id: str) -> bool:
     """Verify user owns the conversation"""
-    with db.get_connection() as conn:
-        cursor = conn.execute("""
+    async with db.for_user(user_id).connection() as conn:
+        cursor = await conn.execute("""
             SELECT user_id FROM conversations
-            WHERE conversation_id = ?
+            WHERE conversation_id = ? AND deleted_at IS NULL
         """, (conversation_id,))
-        conversation = cursor.fetchone()
+        conversation = await cursor.fetchone()
         return conversation and conversation["user_id"] == user_id
 
 
+async def load_history(user_id: str, conversation_id: str) -> List[Dict[str, str]]:
+    """
+    Load the conversation history in chat-completion format
+
+    Only called before a new message is saved, so an archived conversation
+    is moved back into the hot table first.
+    """
+    async with db.for_user(user_id).connection() as conn:
+        await conn.run(rehydrate_conversation, conversation_id)
+        cursor = await conn.execute("""
+            SELECT
+                m.role,
+                COALESCE((SELECT content FROM content_blobs WHERE hash = m.content_hash), m.content) AS content
+            FROM messages m
+            WHERE m.conversation_id = ?
+            ORDER BY m.created_at ASC
+        """, (conversation_id,))
+
+        return [
+            {"role": msg["role"], "content": msg["content"]}
+            for msg in await cursor.fetchall()
+        ]
+
+
+async def save_message(
+    user_id: str,
+    conversation_id: str,
+    role: str,
+    content: str,
+    created_at: datetime,
+    wait: bool = True
+) -> str:
+    """
+    Queue a message insert and the conversation updated_at bump as one write
+
+    The write goes through the group-commit writer; with wait=True this
+    returns only after it has been committed.
+    """
+    message_id = db.generate_uuid()
+    stored, content_hash, statements = prepare_content(content)
+    await db.for_user(user_id).writer.execute(statements + [
+        ("""
+            INSERT INTO messages (message_id, conversation_id, role, content, content_hash, created_at)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, (message_id, conversation_id, role, stored, content_hash, created_at)),
+        ("""
+            UPDATE conversations
+            SET updated_at = ?
+            WHERE conversation_id = ?
+        """, (created_at, conversation_id))
+    ], wait=wait)
+    return message_id
+
+
+async def save_generated_title(user_id: str, conversation_id: str, first_message: str):
+    """Generate a title from the first message and queue the update"""
+    try:
+        generated_title = await nvidia_service.generate_conversation_title(first_message)
+        await db.for_user(user_id).writer.execute([
+            ("""
+                UPDATE conversations
+                SET title = ?
+                WHERE conversation_id = ?
+            """, (generated_title, conversation_id))
+        ], wait=False)
+        typeahead_index.put_conversation(user_id, conversation_id, generated_title)
+    except Exception as title_error:
+        # Log error but don't fail the message sending
+        logger.warning(f"Failed to generate title: {str(title_error)}")
+
+
 @router.get("", response_model=APIResponse)
 async def get_messages(
     conversation_id: str,
     page: int = Query(1, ge=1),
     page_size: int = Query(50, ge=1, le=100),
+    after: Optional[str] = Query(None, description="Cursor from a previous page's next_cursor"),
+    include_total: bool = True,
     current_user: dict = Depends(get_current_user)
 ):
     """
     Get messages in a conversation
+
+    Pass `after` (the previous response's next_cursor) for keyset
+    pagination; `page` is then ignored.
     """
     if not await verify_conversation_ownership(conversation_id, current_user["user_id"]):
         raise HTTPException(
@@ -41,31 +124,68 @@ async def get_messages(
             detail="Conversation not found"
         )
 
-    with db.get_connection() as conn:
-        # Get total count
-        cursor = conn.execute("""
-            SELECT COUNT(*) as total FROM messages
-            WHERE conversation_id = ?
-        """, (conversation_id,))
-        total = cursor.fetchone()["total"]
+    async with db.for_user(current_user["user_id"]).connection() as conn:
+        # Total comes from the trigger-maintained counter on the conversation
+        total = None
+        if include_total:
+            cursor = await conn.execute("""
+                SELECT message_count FROM conversations
+                WHERE conversation_id = ?
+            """, (conversation_id,))
+            total = (await cursor.fetchone())["message_count"]
+
+        # Archived messages keep their rowid, so cursors carry over between the tiers; archives
+        # written before that use positions instead, under a cursor kind the hot table rejects
+        archived = await conn.run(load_archived_messages, conversation_id)
+        cursor_kind = "messages"
+        if archived is not None and any(message["row_key"] is None for message in archived):
+            archived = [{**message, "row_key": position} for position, message in enumerate(archived)]
+            cursor_kind = "messages:archived"
 
         # Get messages
+        base_query = "FROM messages WHERE conversation_id = ?"
+        params = [conversation_id]
         offset = (page - 1) * page_size
-        cursor = conn.execute("""
-            SELECT message_id, role, content, created_at
-            FROM messages
-            WHERE conversation_id = ?
-            ORDER BY created_at ASC
-            LIMIT ? OFFSET ?
-        """, (conversation_id, page_size, offset))
+        if after:
+            created_at, rowid = decode_cursor(after, cursor_kind, 2)
+            base_query += " AND (created_at, rowid) > (?, ?)"
+            params.extend([created_at, rowid])
+            offset = 0
+
+        if archived is not None:
+            rows = archived
+            if after:
+                rows = [row for row in rows if (row["created_at"], row["row_key"]) > (created_at, rowid)]
+            rows = rows[offset:offset + page_size + 1]
+        else:
+            cursor = await conn.execute(f"""
+                SELECT
+                    rowid AS row_key, message_id, role,
+                    COALESCE((SELECT content FROM content_blobs WHERE hash = messages.content_hash), content) AS content,
+                    created_at
+                {base_query}
+                ORDER BY created_at ASC, rowid ASC
+                LIMIT ? OFFSET ?
+            """, params + [page_size + 1, offset])
+            rows = await cursor.fetchall()
+        cursor_after = next_cursor(rows, page_size, cursor_kind, "created_at", "row_key")
 
-        messages = [dict(msg) for msg in cursor.fetchall()]
+        messages = [
+            {
+                "message_id": row["message_id"],
+                "role": row["role"],
+                "content": row["content"],
+                "created_at": row["created_at"]
+            }
+            for row in rows
+        ]
 
     return APIResponse(
         code=200,
         message="success",
         data={
             "total": total,
+            "next_cursor": cursor_after,
             "items": messages
         }
     )
@@ -88,42 +208,13 @@ async def send_message_stream(
 
     now = datetime.utcnow()
 
-    # Check if this is the first message (to auto-generate title later)
-    is_first_message = False
-    with db.get_connection() as conn:
-        cursor = conn.execute("""
-            SELECT COUNT(*) as count FROM messages
-            WHERE conversation_id = ?
-        """, (conversation_id,))
-        message_count = cursor.fetchone()["count"]
-        is_first_message = (message_count == 0)
+    # Load history; an empty history means we auto-generate a title later
+    messages = await load_history(current_user["user_id"], conversation_id)
+    is_first_message = not messages
+    messages.append({"role": "user", "content": message_data.content})
 
     # Save user message
-    user_message_id = db.generate_uuid()
-    with db.get_connection() as conn:
-        conn.execute("""
-            INSERT INTO messages (message_id, conversation_id, role, content, created_at)
-            VALUES (?, ?, 'user', ?, ?)
-        """, (user_message_id, conversation_id, message_data.content, now))
-
-        # Update conversation updated_at
-        conn.execute("""
-            UPDATE conversations
-            SET updated_at = ?
-            WHERE conversation_id = ?
-        """, (now, conversation_id))
-
-        # Get conversation history
-        cursor = conn.execute("""
-            SELECT role, content FROM messages
-            WHERE conversation_id = ?
-            ORDER BY created_at ASC
-        """, (conversation_id,))
-
-        messages = [
-            {"role": msg["role"], "content": msg["content"]}
-            for msg in cursor.fetchall()
-        ]
+    user_message_id = await save_message(current_user["user_id"], conversation_id, "user", message_data.content, now)
 
     async def stream_generator():
         """Generate SSE stream"""
@@ -144,36 +235,14 @@ async def send_message_stream(
                 # Send each chunk as SSE event
                 yield f"event: chunk\ndata: {json.dumps({'content': chunk})}\n\n"
 
-            # Save assistant message
-            assistant_message_id = db.generate_uuid()
-            with db.get_connection() as conn:
-                conn.execute("""
-                    INSERT INTO messages (message_id, conversation_id, role, content, created_at)
-                    VALUES (?, ?, 'assistant', ?, ?)
-                """, (assistant_message_id, conversation_id, ai_response, datetime.utcnow()))
-
-                # Update conversation updated_at
-                conn.execute("""
-                    UPDATE conversations
-                    SET updated_at = ?
-                    WHERE conversation_id = ?
-                """, (datetime.utcnow(), conversation_id))
+            # Save assistant message (committed before the client is told we're done)
+            assistant_message_id = await save_message(
+                current_user["user_id"], conversation_id, "assistant", ai_response, datetime.utcnow()
+            )
 
             # Auto-generate title if this is the first message
             if is_first_message:
-                try:
-                    generated_title = await nvidia_service.generate_conversation_title(message_data.content)
-                    # Update conversation title
-                    with db.get_connection() as conn:
-                        conn.execute("""
-                            UPDATE conversations
-                            SET title = ?
-                            WHERE conversation_id = ?
-                        """, (generated_title, conversation_id))
-                except Exception as title_error:
-                    # Log error but don't fail the message sending
-                    import logging
-                    logging.getLogger(__name__).warning(f"Failed to generate title: {str(title_error)}")
+                await save_generated_title(current_user["user_id"], conversation_id, message_data.content)
 
             # Send completion event
             yield f"event: complete\ndata: {json.dumps({'message_id': assistant_message_id, 'created_at': datetime.utcnow().isoformat()})}\n\n"
@@ -210,42 +279,13 @@ async def send_message(
 
     now = datetime.utcnow()
 
-    # Check if this is the first message (to auto-generate title later)
-    is_first_message = False
-    with db.get_connection() as conn:
-        cursor = conn.execute("""
-            SELECT COUNT(*) as count FROM messages
-            WHERE conversation_id = ?
-        """, (conversation_id,))
-        message_count = cursor.fetchone()["count"]
-        is_first_message = (message_count == 0)
+    # Load history; an empty history means we auto-generate a title later
+    messages = await load_history(current_user["user_id"], conversation_id)
+    is_first_message = not messages
+    messages.append({"role": "user", "content": message_data.content})
 
     # Save user message
-    user_message_id = db.generate_uuid()
-    with db.get_connection() as conn:
-        conn.execute("""
-            INSERT INTO messages (message_id, conversation_id, role, content, created_at)
-            VALUES (?, ?, 'user', ?, ?)
-        """, (user_message_id, conversation_id, message_data.content, now))
-
-        # Update conversation updated_at
-        conn.execute("""
-            UPDATE conversations
-            SET updated_at = ?
-            WHERE conversation_id = ?
-        """, (now, conversation_id))
-
-        # Get conversation history
-        cursor = conn.execute("""
-            SELECT role, content FROM messages
-            WHERE conversation_id = ?
-            ORDER BY created_at ASC
-        """, (conversation_id,))
-
-        messages = [
-            {"role": msg["role"], "content": msg["content"]}
-            for msg in cursor.fetchall()
-        ]
+    user_message_id = await save_message(current_user["user_id"], conversation_id, "user", message_data.content, now)
 
     # Get user's preferred model
     user_settings = await get_user_settings(current_user["user_id"])
@@ -262,35 +302,13 @@ async def send_message(
             ai_response += chunk
 
     # Save assistant message
-    assistant_message_id = db.generate_uuid()
-    with db.get_connection() as conn:
-        conn.execute("""
-            INSERT INTO messages (message_id, conversation_id, role, content, created_at)
-            VALUES (?, ?, 'assistant', ?, ?)
-        """, (assistant_message_id, conversation_id, ai_response, datetime.utcnow()))
-
-        # Update conversation updated_at
-        conn.execute("""
-            UPDATE conversations
-            SET updated_at = ?
-            WHERE conversation_id = ?
-        """, (datetime.utcnow(), conversation_id))
+    assistant_message_id = await save_message(
+        current_user["user_id"], conversation_id, "assistant", ai_response, datetime.utcnow()
+    )
 
     # Auto-generate title if this is the first message
     if is_first_message:
-        try:
-            generated_title = await nvidia_service.generate_conversation_title(message_data.content)
-            # Update conversation title
-            with db.get_connection() as conn:
-                conn.execute("""
-                    UPDATE conversations
-                    SET title = ?
-                    WHERE conversation_id = ?
-                """, (generated_title, conversation_id))
-        except Exception as title_error:
-            # Log error but don't fail the message sending
-            import logging
-            logging.getLogger(__name__).warning(f"Failed to generate title: {str(title_error)}")
+        await save_generated_title(current_user["user_id"], conversation_id, message_data.content)
 
     return APIResponse(
         code=200,
@@ -327,9 +345,11 @@ async def delete_message(
             detail="Conversation not found"
         )
 
-    with db.get_connection() as conn:
+    async with db.for_user(current_user["user_id"]).connection() as conn:
+        await conn.run(rehydrate_conversation, conversation_id)
+
         # Delete message
-        conn.execute("""
+        await conn.execute("""
             DELETE FROM messages
             WHERE message_id = ? AND conversation_id = ?
         """, (message_id, conversation_id))
@@ -7,7 +7,13 @@ from app.schemas import (
 )
 from app.database import db
 from app.ai_service import nvidia_service
-from app.dependencies import get_current_user
+from app.dependencies import get_current_user, get_user_settings
+from app.archive import read_messages
+from app.content_store import put_content
+from app.vectors import vector_index, refresh_vector
+from app.search_cache import search_cache
+from app.typeahead import typeahead_index
+from app.near_duplicates import refresh_signature, find_duplicates
 from datetime import datetime
 import asyncio
 
@@ -16,12 +22,12 @@ router = APIRouter(prefix="/organize", tags=["Organize"])
 
 async def verify_conversation_ownership(conversation_id: str, user_id: str) -> bool:
     """Verify user owns the conversation"""
-    with db.get_connection() as conn:
-        cursor = conn.execute("""
+    async with db.for_user(user_id).connection() as conn:
+        cursor = await conn.execute("""
             SELECT user_id FROM conversations
-            WHERE conversation_id = ?
+            WHERE conversation_id = ? AND deleted_at IS NULL
         """, (conversation_id,))
-        conversation = cursor.fetchone()
+        conversation = await cursor.fetchone()
         return conversation and conversation["user_id"] == user_id
 
 
@@ -42,16 +48,10 @@ async def organize_to_document(
         )
 
     # Get conversation messages
-    with db.get_connection() as conn:
-        cursor = conn.execute("""
-            SELECT role, content FROM messages
-            WHERE conversation_id = ?
-            ORDER BY created_at ASC
-        """, (organize_data.conversation_id,))
-
+    async with db.for_user(current_user["user_id"]).connection() as conn:
         messages = [
             {"role": msg["role"], "content": msg["content"]}
-            for msg in cursor.fetchall()
+            for msg in await conn.run(read_messages, organize_data.conversation_id)
         ]
 
         if not messages:
@@ -86,16 +86,18 @@ async def organize_to_document(
     document_id = db.generate_uuid()
     now = datetime.utcnow()
 
-    with db.get_connection() as conn:
-        conn.execute("""
+    async with db.for_user(current_user["user_id"]).connection() as conn:
+        stored, content_hash = await conn.run(put_content, content)
+        await conn.execute("""
             INSERT INTO documents
-            (document_id, user_id, title, content, summary, source_conversation_id, created_at, updated_at)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            (document_id, user_id, title, content, content_hash, summary, source_conversation_id, created_at, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
         """, (
             document_id,
             current_user["user_id"],
             organize_data.title,
-            content,
+            stored,
+            content_hash,
             summary,
             organize_data.conversation_id,
             now,
@@ -105,43 +107,46 @@ async def organize_to_document(
         # Add tags
         for tag in tags:
             tag_id = db.generate_uuid()
-            conn.execute("""
+            await conn.execute("""
                 INSERT INTO document_tags (tag_id, document_id, tag_name)
                 VALUES (?, ?, ?)
             """, (tag_id, document_id, tag))
 
+        vector = await conn.run(refresh_vector, current_user["user_id"], document_id)
+        signature = await conn.run(refresh_signature, current_user["user_id"], document_id)
+        duplicates = await conn.run(find_duplicates, current_user["user_id"], document_id, signature)
+    vector_index.put(current_user["user_id"], document_id, vector)
+    search_cache.invalidate(current_user["user_id"])
+    typeahead_index.put_document(current_user["user_id"], document_id, organize_data.title, tags)
+
     # Create task if requested
     task_id = None
     if organize_data.create_task and organize_data.task_config:
         task_id = db.generate_uuid()
 
-        # Use reminder email from config or user default
+        # Use reminder email from config or user default (user_settings lives in the catalog)
         reminder_email = organize_data.task_config.reminder_email
         if not reminder_email:
-            cursor = conn.execute("""
-                SELECT default_email FROM user_settings
-                WHERE user_id = ?
-            """, (current_user["user_id"],))
-            settings_row = cursor.fetchone()
-            reminder_email = settings_row["default_email"] if settings_row else None
-
-        conn.execute("""
-            INSERT INTO tasks
-            (task_id, user_id, title, description, due_date, reminder_enabled,
-             reminder_email, source_document_id, created_at, updated_at)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """, (
-            task_id,
-            current_user["user_id"],
-            organize_data.title,
-            summary,
-            organize_data.task_config.due_date,
-            organize_data.task_config.reminder_enabled,
-            reminder_email,
-            document_id,
-            now,
-            now
-        ))
+            reminder_email = (await get_user_settings(current_user["user_id"]))["default_email"]
+
+        async with db.for_user(current_user["user_id"]).connection() as conn:
+            await conn.execute("""
+                INSERT INTO tasks
+                (task_id, user_id, title, description, due_date, reminder_enabled,
+                 reminder_email, source_document_id, created_at, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, (
+                task_id,
+                current_user["user_id"],
+                organize_data.title,
+                summary,
+                organize_data.task_config.due_date,
+                organize_data.task_config.reminder_enabled,
+                reminder_email,
+                document_id,
+                now,
+                now
+            ))
 
     return APIResponse(
         code=200,
@@ -150,7 +155,8 @@ async def organize_to_document(
             "document_id": document_id,
             "document_url": f"/documents/{document_id}",
             "task_id": task_id,
-            "task_url": f"/tasks/{task_id}" if task_id else None
+            "task_url": f"/tasks/{task_id}" if task_id else None,
+            "duplicates": duplicates
         }
     )
 
@@ -171,16 +177,10 @@ async def get_organize_suggestions(
         )
 
     # Get conversation messages
-    with db.get_connection() as conn:
-        cursor = conn.execute("""
-            SELECT role, content FROM messages
-            WHERE conversation_id = ?
-            ORDER BY created_at ASC
-        """, (conversation_id,))
-
+    async with db.for_user(current_user["user_id"]).connection() as conn:
         messages = [
             {"role": msg["role"], "content": msg["content"]}
-            for msg in cursor.fetchall()
+            for msg in await conn.run(read_messages, conversation_id)
         ]
 
         if not messages:
@@ -0,0 +1,213 @@
+"""
+Unified search API route
+
+GET /search runs one full-text query against conversation titles, messages,
+documents and tasks at the same time, each source on its own pooled
+connection, and streams NDJSON lines of the form {"type": ..., "data": {...}}
+(as the workspace export does):
+
+    {"type": "results", "data": {"source": "documents", "took_ms": ..., "items": [...]}}
+        one per source, in the order the sources finish
+    {"type": "error", "data": {"source": ..., "message": ...}}
+        instead of results when a source fails
+    {"type": "done", "data": {"took_ms": ..., "merged": [...]}}
+        last; the best `limit` items of all sources by score
+
+bm25 scores are unbounded and on different scales: they grow with the
+number of query terms and with how rare each term is in the index the
+source searches. Every item's score is therefore its bm25 score divided by
+the highest score a row of that index could reach for the same query
+(app.fts.bm25_ceiling: the idf of each term times k1 + 1, which bm25
+approaches as a term's weighted hit count grows). That puts all sources on
+one 0..1 scale of how fully a row matches (higher is better): a single
+weak hit, such as one occurrence in a long task description, stays low
+even when it is its source's best, while repeated or title hits come
+close to 1. The scale does not depend on the other sources, so the client
+can insert items into one list as their source arrives. Ties are broken by
+source order.
+"""
+import asyncio
+import json
+import logging
+import time
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.responses import StreamingResponse
+
+from app.database import db
+from app.dependencies import get_current_user
+from app.fts import bm25_ceiling, split_terms, match_expression, excerpt, mark, render_highlight
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/search", tags=["Search"])
+
+# Each query takes (MATCH expression, user_id, limit); CROSS JOIN keeps the
+# index lookup first and lets the index deliver rows in rank order
+SEARCH_CONVERSATIONS = """
+    SELECT c.conversation_id, c.title, c.updated_at, conversations_fts.rank AS rank
+    FROM conversations_fts
+    CROSS JOIN conversations c ON c.rowid = conversations_fts.rowid
+    WHERE conversations_fts MATCH ? AND c.user_id = ? AND c.deleted_at IS NULL
+    ORDER BY conversations_fts.rank
+    LIMIT ?
+"""
+SEARCH_MESSAGES = """
+    SELECT
+        m.message_id, m.conversation_id, c.title, m.role, m.created_at,
+        COALESCE((SELECT content FROM content_blobs WHERE hash = m.content_hash), m.content) AS content,
+        messages_fts.rank AS rank
+    FROM messages_fts
+    CROSS JOIN messages m ON m.rowid = messages_fts.rowid
+    CROSS JOIN conversations c ON c.conversation_id = m.conversation_id
+    WHERE messages_fts MATCH ? AND c.user_id = ? AND c.deleted_at IS NULL
+    ORDER BY messages_fts.rank
+    LIMIT ?
+"""
+SEARCH_DOCUMENTS = """
+    SELECT
+        d.document_id, d.title, d.updated_at,
+        COALESCE((SELECT content FROM content_blobs WHERE hash = d.content_hash), d.content) AS content,
+        documents_fts.rank AS rank
+    FROM documents_fts
+    CROSS JOIN documents d ON d.rowid = documents_fts.rowid
+    WHERE documents_fts MATCH ? AND d.user_id = ? AND d.deleted_at IS NULL
+    ORDER BY documents_fts.rank
+    LIMIT ?
+"""
+SEARCH_TASKS = """
+    SELECT t.task_id, t.title, t.description, t.status, t.due_date, tasks_fts.rank AS rank
+    FROM tasks_fts
+    CROSS JOIN tasks t ON t.rowid = tasks_fts.rowid
+    WHERE tasks_fts MATCH ? AND t.user_id = ? AND t.deleted_at IS NULL
+    ORDER BY tasks_fts.rank
+    LIMIT ?
+"""
+
+SOURCES = {
+    "conversations": SEARCH_CONVERSATIONS,
+    "messages": SEARCH_MESSAGES,
+    "documents": SEARCH_DOCUMENTS,
+    "tasks": SEARCH_TASKS,
+}
+
+
+def _score(rank: float, ceiling: float) -> float:
+    """bm25 rank (lower is better) as a 0..1 share of the highest reachable score (higher is better)"""
+    return min(max(-rank, 0.0) / ceiling, 1.0) if ceiling > 0 else 0.0
+
+
+def _item(source: str, row, terms: List[str]) -> Dict[str, Any]:
+    if source == "conversations":
+        return {
+            "id": row["conversation_id"],
+            "title_highlight": render_highlight(mark(row["title"], terms)),
+            "updated_at": row["updated_at"],
+        }
+    if source == "messages":
+        return {
+            "id": row["message_id"],
+            "conversation_id": row["conversation_id"],
+            "title": row["title"],
+            "role": row["role"],
+            "snippet": render_highlight(excerpt(row["content"], terms)),
+            "created_at": row["created_at"],
+        }
+    if source == "documents":
+        return {
+            "id": row["document_id"],
+            "title_highlight": render_highlight(mark(row["title"], terms)),
+            "snippet": render_highlight(excerpt(row["content"], terms)),
+            "updated_at": row["updated_at"],
+        }
+    return {
+        "id": row["task_id"],
+        "title_highlight": render_highlight(mark(row["title"], terms)),
+        "snippet": render_highlight(excerpt(row["description"], terms)),
+        "status": row["status"],
+        "due_date": row["due_date"],
+    }
+
+
+async def _search_source(
+    source: str, user_id: str, match: str, terms: List[str], limit: int
+) -> List[Dict[str, Any]]:
+    async with db.for_user(user_id).connection() as conn:
+        rows = await conn.fetchall(SOURCES[source], (match, user_id, limit))
+        ceiling = await conn.run(bm25_ceiling, f"{source}_fts", terms) if rows else 0.0
+    return [
+        {"source": source, **_item(source, row, terms), "score": _score(row["rank"], ceiling)}
+        for row in rows
+    ]
+
+
+def _line(kind: str, data: Dict[str, Any]) -> bytes:
+    return (json.dumps({"type": kind, "data": data}, ensure_ascii=False, default=str) + "\n").encode("utf-8")
+
+
+async def _search_lines(
+    user_id: str, match: Optional[str], terms: List[str], sources: List[str], limit: int
+) -> AsyncIterator[bytes]:
+    started = time.perf_counter()
+    found: List[Dict[str, Any]] = []
+
+    async def timed(source: str):
+        source_started = time.perf_counter()
+        try:
+            items = await _search_source(source, user_id, match, terms, limit)
+        except Exception as e:
+            logger.error(f"Search of {source} failed: {e}")
+            return source, None, time.perf_counter() - source_started
+        return source, items, time.perf_counter() - source_started
+
+    pending = [asyncio.ensure_future(timed(source)) for source in sources] if match else []
+    try:
+        for next_done in asyncio.as_completed(pending):
+            source, items, took = await next_done
+            if items is None:
+                yield _line("error", {"source": source, "message": "Search failed"})
+                continue
+            found.extend(items)
+            yield _line("results", {"source": source, "took_ms": round(took * 1000, 1), "items": items})
+    finally:
+        # The client may disconnect before every source is done
+        for future in pending:
+            future.cancel()
+
+    order = list(SOURCES)
+    found.sort(key=lambda item: (-item["score"], order.index(item["source"])))
+    yield _line("done", {
+        "took_ms": round((time.perf_counter() - started) * 1000, 1),
+        "merged": [{"source": item["source"], "id": item["id"], "score": item["score"]} for item in found[:limit]],
+    })
+
+
+@router.get("")
+async def search(
+    q: str = Query(..., min_length=1),
+    types: Optional[str] = Query(None, description="Comma-separated subset of conversations,messages,documents,tasks"),
+    limit: int = Query(10, ge=1, le=50),
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Search conversations, messages, documents and tasks at once
+
+    Streams NDJSON (see the module docstring): each source's results as
+    soon as it finishes, then the merged ranking. Terms are matched like in
+    the other full-text searches (Chinese bigrams, word prefixes); terms
+    without any letter or digit are ignored here.
+    """
+    sources = [source.strip() for source in types.split(",")] if types else list(SOURCES)
+    unknown = [source for source in sources if source not in SOURCES]
+    if unknown:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown search types: {', '.join(unknown)}"
+        )
+
+    indexed, _ = split_terms(q)
+    return StreamingResponse(
+        _search_lines(current_user["user_id"], match_expression(indexed), indexed, sources, limit),
+        media_type="application/x-ndjson"
+    )
@@ -7,7 +7,8 @@ from app.schemas import (
 )
 from app.database import db
 from app.email_service import email_service
-from app.dependencies import get_current_user
+from app.dependencies import get_current_user, get_user_settings
+from app.pagination import decode_cursor, next_cursor
 from typing import Optional
 from datetime import datetime
 
@@ -19,14 +20,19 @@ async def get_tasks(
     status_filter: Optional[str] = Query(None, regex="^(pending|completed|overdue)$"),
     page: int = Query(1, ge=1),
     page_size: int = Query(20, ge=1, le=100),
+    after: Optional[str] = Query(None, description="Cursor from a previous page's next_cursor"),
+    include_total: bool = True,
     current_user: dict = Depends(get_current_user)
 ):
     """
     Get list of tasks
+
+    Pass `after` (the previous response's next_cursor) for keyset
+    pagination; `page` is then ignored.
     """
-    with db.get_connection() as conn:
+    async with db.for_user(current_user["user_id"]).connection() as conn:
         # Build query
-        base_query = "FROM tasks WHERE user_id = ?"
+        base_query = "FROM tasks WHERE user_id = ? AND deleted_at IS NULL"
         params = [current_user["user_id"]]
 
         if status_filter:
@@ -34,27 +40,31 @@ async def get_tasks(
             params.append(status_filter)
 
         # Get total count
-        count_query = f"SELECT COUNT(*) as total {base_query}"
-        cursor = conn.execute(count_query, params)
-        total = cursor.fetchone()["total"]
+        total = None
+        if include_total:
+            count_query = f"SELECT COUNT(*) as total {base_query}"
+            cursor = await conn.execute(count_query, params)
+            total = (await cursor.fetchone())["total"]
 
         # Get tasks
         offset = (page - 1) * page_size
+        if after:
+            due_date, rowid = decode_cursor(after, "tasks", 2)
+            base_query += " AND (due_date, rowid) > (?, ?)"
+            params.extend([due_date, rowid])
+            offset = 0
+
         query = f"""
-            SELECT * FROM tasks
-            WHERE user_id = {'' if status_filter else '?'}
-            {f"AND status = ?" if status_filter else ""}
-            ORDER BY due_date ASC
+            SELECT rowid AS row_key, * {base_query}
+            ORDER BY due_date ASC, rowid ASC
             LIMIT ? OFFSET ?
         """
-
-        if status_filter:
-            cursor = conn.execute(query, [current_user["user_id"], status_filter, page_size, offset])
-        else:
-            cursor = conn.execute(query, [current_user["user_id"], page_size, offset])
+        cursor = await conn.execute(query, params + [page_size + 1, offset])
+        rows = await cursor.fetchall()
+        cursor_after = next_cursor(rows, page_size, "tasks", "due_date", "row_key")
 
         tasks = []
-        for row in cursor.fetchall():
+        for row in rows:
             tasks.append({
                 "task_id": row["task_id"],
                 "title": row["title"],
@@ -72,6 +82,7 @@ async def get_tasks(
         message="success",
         data={
             "total": total,
+            "next_cursor": cursor_after,
             "items": tasks
         }
     )
@@ -85,13 +96,13 @@ async def get_task(
     """
     Get task details
     """
-    with db.get_connection() as conn:
-        cursor = conn.execute("""
+    async with db.for_user(current_user["user_id"]).connection() as conn:
+        cursor = await conn.execute("""
             SELECT * FROM tasks
-            WHERE task_id = ? AND user_id = ?
+            WHERE task_id = ? AND user_id = ? AND deleted_at IS NULL
         """, (task_id, current_user["user_id"]))
 
-        task = cursor.fetchone()
+        task = await cursor.fetchone()
         if not task:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -128,19 +139,13 @@ async def create_task(
     task_id = db.generate_uuid()
     now = datetime.utcnow()
 
-    # Use provided email or user default
+    # Use provided email or user default (user_settings lives in the catalog, not the user's shard)
     reminder_email = task_data.reminder_email
     if not reminder_email:
-        with db.get_connection() as conn:
-            cursor = conn.execute("""
-                SELECT default_email FROM user_settings
-                WHERE user_id = ?
-            """, (current_user["user_id"],))
-            settings_row = cursor.fetchone()
-            reminder_email = settings_row["default_email"] if settings_row else None
-
-    with db.get_connection() as conn:
-        conn.execute("""
+        reminder_email = (await get_user_settings(current_user["user_id"]))["default_email"]
+
+    async with db.for_user(current_user["user_id"]).connection() as conn:
+        await conn.execute("""
             INSERT INTO tasks
             (task_id, user_id, title, description, due_date, reminder_enabled,
              reminder_email, source_document_id, created_at, updated_at)
@@ -178,14 +183,14 @@ async def update_task(
     """
     Update a task
     """
-    with db.get_connection() as conn:
+    async with db.for_user(current_user["user_id"]).connection() as conn:
         # Check ownership
-        cursor = conn.execute("""
+        cursor = await conn.execute("""
             SELECT user_id FROM tasks
-            WHERE task_id = ?
+            WHERE task_id = ? AND deleted_at IS NULL
         """, (task_id,))
 
-        task = cursor.fetchone()
+        task = await cursor.fetchone()
         if not task or task["user_id"] != current_user["user_id"]:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -220,7 +225,7 @@ async def update_task(
             params.append(task_id)
 
             query = f"UPDATE tasks SET {', '.join(updates)} WHERE task_id = ?"
-            conn.execute(query, params)
+            await conn.execute(query, params)
 
     return APIResponse(
         code=200,
@@ -240,14 +245,14 @@ async def complete_task(
     """
     Mark a task as completed
     """
-    with db.get_connection() as conn:
+    async with db.for_user(current_user["user_id"]).connection() as conn:
         # Check ownership
-        cursor = conn.execute("""
+        cursor = await conn.execute("""
             SELECT user_id, status FROM tasks
-            WHERE task_id = ?
+            WHERE task_id = ? AND deleted_at IS NULL
         """, (task_id,))
 
-        task = cursor.fetchone()
+        task = await cursor.fetchone()
         if not task or task["user_id"] != current_user["user_id"]:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -255,7 +260,7 @@ async def complete_task(
             )
 
         now = datetime.utcnow()
-        conn.execute("""
+        await conn.execute("""
             UPDATE tasks
             SET status = 'completed', updated_at = ?
             WHERE task_id = ?
@@ -279,32 +284,29 @@ async def delete_task(
 ):
     """
     Delete a task
+
+    The task is only marked as deleted here; its notifications are removed
+    by the background purger (app/purge.py).
     """
-    with db.get_connection() as conn:
+    async with db.for_user(current_user["user_id"]).connection() as conn:
         # Check ownership
-        cursor = conn.execute("""
+        cursor = await conn.execute("""
             SELECT user_id FROM tasks
-            WHERE task_id = ?
+            WHERE task_id = ? AND deleted_at IS NULL
         """, (task_id,))
 
-        task = cursor.fetchone()
+        task = await cursor.fetchone()
         if not task or task["user_id"] != current_user["user_id"]:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Task not found"
             )
 
-        # Delete notifications first
-        conn.execute("""
-            DELETE FROM email_notifications
+        await conn.execute("""
+            UPDATE tasks
+            SET deleted_at = ?
             WHERE task_id = ?
-        """, (task_id,))
-
-        # Delete task
-        conn.execute("""
-            DELETE FROM tasks
-            WHERE task_id = ?
-        """, (task_id,))
+        """, (datetime.utcnow(), task_id))
 
     return APIResponse(
         code=200,
@@ -320,81 +322,80 @@ async def send_task_reminder(
     """
     Manually send a task reminder email
     """
-    with db.get_connection() as conn:
-        cursor = conn.execute("""
-            SELECT t.*, u.email as user_email
-            FROM tasks t
-            JOIN users u ON t.user_id = u.user_id
-            WHERE t.task_id = ? AND t.user_id = ?
+    async with db.for_user(current_user["user_id"]).connection() as conn:
+        cursor = await conn.execute("""
+            SELECT * FROM tasks
+            WHERE task_id = ? AND user_id = ? AND deleted_at IS NULL
         """, (task_id, current_user["user_id"]))
 
-        task = cursor.fetchone()
+        task = await cursor.fetchone()
         if not task:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Task not found"
             )
 
-        # Use reminder email if set, otherwise use user email
-        recipient = task["reminder_email"] or task["user_email"]
+    # Use reminder email if set, otherwise use user email
+    recipient = task["reminder_email"] or current_user["email"]
 
-        if not recipient:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="No email address configured for this task"
-            )
-
-        # Format due date
-        due_date = task["due_date"]
-        if isinstance(due_date, str):
-            due_date_str = due_date
-        else:
-            due_date_str = due_date.strftime("%Y-%m-%d %H:%M")
-
-        # Send email
-        success = await email_service.send_task_reminder(
-            to_email=recipient,
-            task_title=task["title"],
-            task_description=task["description"],
-            due_date=due_date_str
+    if not recipient:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="No email address configured for this task"
         )
 
-        now = datetime.utcnow()
+    # Format due date
+    due_date = task["due_date"]
+    if isinstance(due_date, str):
+        due_date_str = due_date
+    else:
+        due_date_str = due_date.strftime("%Y-%m-%d %H:%M")
+
+    # Send email without holding a database connection
+    success = await email_service.send_task_reminder(
+        to_email=recipient,
+        task_title=task["title"],
+        task_description=task["description"],
+        due_date=due_date_str
+    )
+
+    now = datetime.utcnow()
+    notification_id = db.generate_uuid()
+    async with db.for_user(current_user["user_id"]).connection() as conn:
         if success:
             # Record notification
-            notification_id = db.generate_uuid()
-            conn.execute("""
+            await conn.execute("""
                 INSERT INTO email_notifications
                 (notification_id, task_id, recipient_email, status, sent_at)
                 VALUES (?, ?, ?, 'sent', ?)
             """, (notification_id, task_id, recipient, now))
 
             # Mark email as sent
-            conn.execute("""
+            await conn.execute("""
                 UPDATE tasks
                 SET email_sent = 1
                 WHERE task_id = ?
             """, (task_id,))
-
-            return APIResponse(
-                code=200,
-                message="提醒邮件已发送",
-                data={
-                    "task_id": task_id,
-                    "email_sent": True,
-                    "sent_at": now
-                }
-            )
         else:
             # Record failed notification
-            notification_id = db.generate_uuid()
-            conn.execute("""
+            await conn.execute("""
                 INSERT INTO email_notifications
                 (notification_id, task_id, recipient_email, status, error_message)
                 VALUES (?, ?, ?, 'failed', 'Failed to send email')
             """, (notification_id, task_id, recipient))
 
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail="Failed to send reminder email"
-            )
+    if not success:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to send reminder email"
+        )
+
+    return APIResponse(
+        code=200,
+        message="提醒邮件已发送",
+        data={
+            "task_id": task_id,
+            "email_sent": True,
+            "sent_at": now
+        }
+    )
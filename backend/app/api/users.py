@@ -40,18 +40,18 @@ async def update_user_me(
     """
     Update current user information
     """
-    with db.get_connection() as conn:
+    async with db.connection() as conn:
         # Build update query
         updates = []
         params = []
 
         if user_data.username:
             # Check if username already exists
-            cursor = conn.execute(
+            cursor = await conn.execute(
                 "SELECT user_id FROM users WHERE username = ? AND user_id != ?",
                 (user_data.username, current_user["user_id"])
             )
-            if cursor.fetchone():
+            if await cursor.fetchone():
                 raise HTTPException(
                     status_code=status.HTTP_400_BAD_REQUEST,
                     detail="Username already exists"
@@ -61,11 +61,11 @@ async def update_user_me(
 
         if user_data.email:
             # Check if email already exists
-            cursor = conn.execute(
+            cursor = await conn.execute(
                 "SELECT user_id FROM users WHERE email = ? AND user_id != ?",
                 (user_data.email, current_user["user_id"])
             )
-            if cursor.fetchone():
+            if await cursor.fetchone():
                 raise HTTPException(
                     status_code=status.HTTP_400_BAD_REQUEST,
                     detail="Email already exists"
@@ -79,14 +79,14 @@ async def update_user_me(
             params.append(current_user["user_id"])
 
             query = f"UPDATE users SET {', '.join(updates)} WHERE user_id = ?"
-            conn.execute(query, params)
+            await conn.execute(query, params)
 
             # Fetch updated user
-            cursor = conn.execute(
+            cursor = await conn.execute(
                 "SELECT user_id, username, email FROM users WHERE user_id = ?",
                 (current_user["user_id"],)
             )
-            updated_user = cursor.fetchone()
+            updated_user = await cursor.fetchone()
 
             return APIResponse(
                 code=200,
@@ -118,12 +118,12 @@ async def change_password(
     Change user password
     """
     # Get current password hash
-    with db.get_connection() as conn:
-        cursor = conn.execute(
+    async with db.connection() as conn:
+        cursor = await conn.execute(
             "SELECT password_hash FROM users WHERE user_id = ?",
             (current_user["user_id"],)
         )
-        user = cursor.fetchone()
+        user = await cursor.fetchone()
 
         if not user or not verify_password(password_data.old_password, user["password_hash"]):
             raise HTTPException(
@@ -133,7 +133,7 @@ async def change_password(
 
         # Update password
         new_password_hash = get_password_hash(password_data.new_password)
-        conn.execute("""
+        await conn.execute("""
             UPDATE users
             SET password_hash = ?, updated_at = ?
             WHERE user_id = ?
@@ -153,17 +153,17 @@ async def update_email_settings(
     """
     Update email notification settings
     """
-    with db.get_connection() as conn:
+    async with db.connection() as conn:
         # Check if settings exist
-        cursor = conn.execute(
+        cursor = await conn.execute(
             "SELECT setting_id FROM user_settings WHERE user_id = ?",
             (current_user["user_id"],)
         )
-        settings_row = cursor.fetchone()
+        settings_row = await cursor.fetchone()
 
         if settings_row:
             # Update
-            conn.execute("""
+            await conn.execute("""
                 UPDATE user_settings
                 SET default_email = ?, reminder_enabled = ?
                 WHERE user_id = ?
@@ -171,7 +171,7 @@ async def update_email_settings(
         else:
             # Create
             setting_id = db.generate_uuid()
-            conn.execute("""
+            await conn.execute("""
                 INSERT INTO user_settings (setting_id, user_id, default_email, reminder_enabled)
                 VALUES (?, ?, ?, ?)
             """, (setting_id, current_user["user_id"], settings_data.default_email, settings_data.reminder_enabled))
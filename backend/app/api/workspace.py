@@ -0,0 +1,402 @@
+"""
+Workspace export / import API routes
+
+Both directions use NDJSON: one JSON object per line of the form
+{"type": "conversation" | "message" | "document" | "task", "data": {...}},
+preceded on export by a {"type": "header", ...} line. Documents carry their
+tags inline. Records keep their original IDs; a conversation must come
+before its messages and a document before anything referencing it, which
+is the order the export produces.
+
+Export pages through each table, and through each conversation's messages,
+with keyset queries and holds a database connection only while a batch is
+read, so memory stays constant however large the workspace or any one
+conversation is. Only an archived conversation is read at once, since its
+messages are stored as one compressed blob. Import reads the request body incrementally and
+writes batches of IMPORT_BATCH_SIZE records with executemany, one
+transaction per batch. Rows whose ID already exists (and tags a document
+already carries) are skipped, so an interrupted import can simply be
+retried. IDs taken by another account's rows cannot be imported; they are
+reported as conflicts.
+"""
+import json
+import sqlite3
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, List, Tuple
+
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from fastapi.responses import StreamingResponse
+
+from app.archive import load_archived_messages
+from app.content_store import put_content
+from app.database import db
+from app.dependencies import get_current_user
+from app.schemas import APIResponse
+from app.search_cache import search_cache
+from app.vectors import vector_index
+from app.typeahead import typeahead_index
+
+router = APIRouter(tags=["Workspace"])
+
+EXPORT_FORMAT_VERSION = 1
+EXPORT_BATCH_SIZE = 500
+IMPORT_BATCH_SIZE = 1000
+
+EXPORT_CONVERSATIONS = """
+    SELECT rowid AS row_key, conversation_id, title, created_at, updated_at
+    FROM conversations
+    WHERE user_id = ? AND deleted_at IS NULL AND (updated_at, rowid) > (?, ?)
+    ORDER BY updated_at ASC, rowid ASC
+    LIMIT ?
+"""
+EXPORT_MESSAGES = """
+    SELECT
+        m.rowid AS row_key, m.message_id, m.role,
+        COALESCE((SELECT content FROM content_blobs WHERE hash = m.content_hash), m.content) AS content,
+        m.created_at
+    FROM messages m
+    WHERE m.conversation_id = ? AND (m.created_at, m.rowid) > (?, ?)
+    ORDER BY m.created_at ASC, m.rowid ASC
+    LIMIT ?
+"""
+EXPORT_DOCUMENTS = """
+    SELECT
+        d.rowid AS row_key, d.document_id, d.title,
+        COALESCE((SELECT content FROM content_blobs WHERE hash = d.content_hash), d.content) AS content,
+        d.summary, d.source_conversation_id, d.created_at, d.updated_at
+    FROM documents d
+    WHERE d.user_id = ? AND d.deleted_at IS NULL AND (d.updated_at, d.rowid) > (?, ?)
+    ORDER BY d.updated_at ASC, d.rowid ASC
+    LIMIT ?
+"""
+EXPORT_TAGS = """
+    SELECT t.document_id, t.tag_name
+    FROM json_each(?) ids
+    CROSS JOIN document_tags t ON t.document_id = ids.value
+"""
+EXPORT_TASKS = """
+    SELECT
+        rowid AS row_key, task_id, title, description, due_date, status, reminder_enabled,
+        reminder_email, source_document_id, email_sent, created_at, updated_at
+    FROM tasks
+    WHERE user_id = ? AND deleted_at IS NULL AND (due_date, rowid) > (?, ?)
+    ORDER BY due_date ASC, rowid ASC
+    LIMIT ?
+"""
+
+IMPORT_CONVERSATION = """
+    INSERT OR IGNORE INTO conversations (conversation_id, user_id, title, created_at, updated_at)
+    VALUES (?, ?, ?, ?, ?)
+"""
+# Children are only attached to parents the importing user owns
+IMPORT_MESSAGE = """
+    INSERT OR IGNORE INTO messages (message_id, conversation_id, role, content, content_hash, created_at)
+    SELECT ?, ?, ?, ?, ?, ?
+    WHERE EXISTS (
+        SELECT 1 FROM conversations
+        WHERE conversation_id = ? AND user_id = ? AND archived_at IS NULL AND deleted_at IS NULL
+    )
+"""
+IMPORT_DOCUMENT = """
+    INSERT OR IGNORE INTO documents
+    (document_id, user_id, title, content, content_hash, summary, source_conversation_id, created_at, updated_at)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+# Tag IDs are generated, so the tag itself is checked to keep re-imports idempotent
+IMPORT_TAG = """
+    INSERT OR IGNORE INTO document_tags (tag_id, document_id, tag_name)
+    SELECT ?, ?, ?
+    WHERE EXISTS (
+        SELECT 1 FROM documents
+        WHERE document_id = ? AND user_id = ? AND deleted_at IS NULL
+    )
+    AND NOT EXISTS (
+        SELECT 1 FROM document_tags
+        WHERE document_id = ? AND tag_name = ?
+    )
+"""
+IMPORT_TASK = """
+    INSERT OR IGNORE INTO tasks
+    (task_id, user_id, title, description, due_date, status, reminder_enabled,
+     reminder_email, source_document_id, email_sent, created_at, updated_at)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+# Records of a batch whose ID belongs to another user (parameters: JSON array of IDs, user_id)
+FOREIGN_CONVERSATIONS = """
+    SELECT COUNT(*) FROM json_each(?) ids
+    CROSS JOIN conversations c ON c.conversation_id = ids.value
+    WHERE c.user_id != ?
+"""
+FOREIGN_DOCUMENTS = """
+    SELECT COUNT(*) FROM json_each(?) ids
+    CROSS JOIN documents d ON d.document_id = ids.value
+    WHERE d.user_id != ?
+"""
+FOREIGN_TASKS = """
+    SELECT COUNT(*) FROM json_each(?) ids
+    CROSS JOIN tasks t ON t.task_id = ids.value
+    WHERE t.user_id != ?
+"""
+
+# Required fields per record type, in the order batches are written
+RECORD_FIELDS = {
+    "conversation": ("conversation_id", "title"),
+    "message": ("message_id", "conversation_id", "role", "content"),
+    "document": ("document_id", "title", "content"),
+    "task": ("task_id", "title", "due_date"),
+}
+# Key of each record type in the inserted counts
+RECORD_TABLES = {
+    "conversation": "conversations",
+    "message": "messages",
+    "document": "documents",
+    "task": "tasks",
+}
+
+
+def _line(kind: str, data: Dict[str, Any]) -> bytes:
+    return (json.dumps({"type": kind, "data": data}, ensure_ascii=False, default=str) + "\n").encode("utf-8")
+
+
+async def _keyset_batches(
+    store, query: str, sort_column: str, owner_id: str
+) -> AsyncIterator[List[Dict[str, Any]]]:
+    """Yield the rows of an export query (for one user or conversation) batch by batch, resuming after the last sort key"""
+    # Every timestamp sorts after the empty string
+    sort_value, row_key = "", -1
+    while True:
+        async with store.connection() as conn:
+            rows = await conn.fetchall(query, (owner_id, sort_value, row_key, EXPORT_BATCH_SIZE))
+        if not rows:
+            return
+        yield [dict(row) for row in rows]
+        sort_value, row_key = rows[-1][sort_column], rows[-1]["row_key"]
+
+
+async def _conversation_messages(store, conversation_id: str) -> AsyncIterator[Dict[str, Any]]:
+    """A conversation's messages, oldest first: the archive blob at once, hot messages batch by batch"""
+    async with store.connection() as conn:
+        archived = await conn.run(load_archived_messages, conversation_id)
+    if archived is not None:
+        for message in archived:
+            del message["row_key"]
+            yield message
+        return
+    async for batch in _keyset_batches(store, EXPORT_MESSAGES, "created_at", conversation_id):
+        for message in batch:
+            message.pop("row_key")
+            yield message
+
+
+async def _export_lines(user: dict) -> AsyncIterator[bytes]:
+    store = db.for_user(user["user_id"])
+    yield (json.dumps({
+        "type": "header",
+        "version": EXPORT_FORMAT_VERSION,
+        "exported_at": datetime.utcnow().isoformat(),
+        "username": user["username"]
+    }, ensure_ascii=False) + "\n").encode("utf-8")
+
+    async for batch in _keyset_batches(store, EXPORT_CONVERSATIONS, "updated_at", user["user_id"]):
+        for conversation in batch:
+            conversation.pop("row_key")
+            yield _line("conversation", conversation)
+            async for message in _conversation_messages(store, conversation["conversation_id"]):
+                yield _line("message", {"conversation_id": conversation["conversation_id"], **message})
+
+    async for batch in _keyset_batches(store, EXPORT_DOCUMENTS, "updated_at", user["user_id"]):
+        async with store.connection() as conn:
+            tag_rows = await conn.fetchall(EXPORT_TAGS, (json.dumps([d["document_id"] for d in batch]),))
+        tags: Dict[str, List[str]] = {}
+        for row in tag_rows:
+            tags.setdefault(row["document_id"], []).append(row["tag_name"])
+        for document in batch:
+            document.pop("row_key")
+            document["tags"] = tags.get(document["document_id"], [])
+            yield _line("document", document)
+
+    async for batch in _keyset_batches(store, EXPORT_TASKS, "due_date", user["user_id"]):
+        for task in batch:
+            task.pop("row_key")
+            yield _line("task", task)
+
+
+@router.get("/export")
+async def export_workspace(current_user: dict = Depends(get_current_user)):
+    """
+    Export all conversations, messages, documents (with tags) and tasks as NDJSON
+    """
+    filename = f"mindflow-{current_user['username']}-{datetime.utcnow():%Y%m%d}.ndjson"
+    return StreamingResponse(
+        _export_lines(current_user),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+
+def _parse_record(line: bytes, line_number: int):
+    """Return (type, data) for one NDJSON line, or None for blank and header lines"""
+    if not line.strip():
+        return None
+    try:
+        record = json.loads(line)
+        kind = record["type"]
+        if kind == "header":
+            return None
+        data = record["data"]
+        missing = [field for field in RECORD_FIELDS[kind] if data.get(field) in (None, "")]
+    except (ValueError, KeyError, TypeError, AttributeError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid record on line {line_number}"
+        )
+    if missing:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Line {line_number}: missing {', '.join(missing)}"
+        )
+    return kind, data
+
+
+def _count_foreign(conn: sqlite3.Connection, query: str, ids: List[str], user_id: str) -> int:
+    return conn.execute(query, (json.dumps(ids), user_id)).fetchone()[0] if ids else 0
+
+
+def _write_batch(
+    conn: sqlite3.Connection, user_id: str, pending: Dict[str, List[dict]]
+) -> Tuple[Dict[str, int], Dict[str, int]]:
+    """Insert one batch of parsed records; returns inserted row counts and IDs owned by other users"""
+    now = datetime.utcnow()
+    inserted = {}
+
+    inserted["conversations"] = conn.executemany(IMPORT_CONVERSATION, [
+        (c["conversation_id"], user_id, c["title"], c.get("created_at") or now, c.get("updated_at") or now)
+        for c in pending["conversation"]
+    ]).rowcount
+
+    rows = []
+    for m in pending["message"]:
+        stored, content_hash = put_content(conn, m["content"])
+        rows.append((m["message_id"], m["conversation_id"], m["role"], stored, content_hash,
+                     m.get("created_at") or now, m["conversation_id"], user_id))
+    inserted["messages"] = conn.executemany(IMPORT_MESSAGE, rows).rowcount
+
+    rows = []
+    tag_rows = []
+    for d in pending["document"]:
+        stored, content_hash = put_content(conn, d["content"])
+        rows.append((d["document_id"], user_id, d["title"], stored, content_hash, d.get("summary"),
+                     d.get("source_conversation_id"), d.get("created_at") or now, d.get("updated_at") or now))
+        tag_rows.extend(
+            (db.generate_uuid(), d["document_id"], tag, d["document_id"], user_id, d["document_id"], tag)
+            for tag in d.get("tags") or []
+        )
+    inserted["documents"] = conn.executemany(IMPORT_DOCUMENT, rows).rowcount
+    inserted["tags"] = conn.executemany(IMPORT_TAG, tag_rows).rowcount if tag_rows else 0
+
+    inserted["tasks"] = conn.executemany(IMPORT_TASK, [
+        (t["task_id"], user_id, t["title"], t.get("description"), t["due_date"],
+         t.get("status") or "pending", t.get("reminder_enabled", True), t.get("reminder_email"),
+         t.get("source_document_id"), t.get("email_sent", False),
+         t.get("created_at") or now, t.get("updated_at") or now)
+        for t in pending["task"]
+    ]).rowcount
+
+    conflicts = {
+        "conversation": _count_foreign(
+            conn, FOREIGN_CONVERSATIONS, [c["conversation_id"] for c in pending["conversation"]], user_id),
+        "document": _count_foreign(
+            conn, FOREIGN_DOCUMENTS, [d["document_id"] for d in pending["document"]], user_id),
+        "task": _count_foreign(conn, FOREIGN_TASKS, [t["task_id"] for t in pending["task"]], user_id),
+    }
+    return inserted, conflicts
+
+
+@router.post("/import", response_model=APIResponse)
+async def import_workspace(
+    request: Request,
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Import an NDJSON export into the current user's workspace
+
+    The body is streamed and written in chunked transactions; records whose
+    ID already exists are skipped (`skipped`, per record type), and those
+    whose ID belongs to another account are also counted in `conflicts`.
+    An invalid line aborts the import, but batches written before it are
+    kept.
+    """
+    store = db.for_user(current_user["user_id"])
+    received = {kind: 0 for kind in RECORD_FIELDS}
+    inserted: Dict[str, int] = {}
+    conflicts = {kind: 0 for kind in RECORD_FIELDS}
+    pending = {kind: [] for kind in RECORD_FIELDS}
+    pending_count = 0
+    line_number = 0
+
+    async def flush():
+        nonlocal pending, pending_count
+        if not pending_count:
+            return
+        try:
+            async with store.connection() as conn:
+                counts, foreign = await conn.run(_write_batch, current_user["user_id"], pending)
+        except sqlite3.IntegrityError as e:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Invalid data before line {line_number}: {e}"
+            )
+        if counts["documents"] or counts["tags"]:
+            vector_index.drop(current_user["user_id"])
+            search_cache.invalidate(current_user["user_id"])
+        if counts["documents"] or counts["tags"] or counts["conversations"]:
+            typeahead_index.drop(current_user["user_id"])
+        for table, count in counts.items():
+            inserted[table] = inserted.get(table, 0) + count
+        for kind, count in foreign.items():
+            conflicts[kind] += count
+        pending = {kind: [] for kind in RECORD_FIELDS}
+        pending_count = 0
+
+    buffer = b""
+    async for chunk in request.stream():
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            line_number += 1
+            record = _parse_record(line, line_number)
+            if record is None:
+                continue
+            kind, data = record
+            pending[kind].append(data)
+            received[kind] += 1
+            pending_count += 1
+            if pending_count >= IMPORT_BATCH_SIZE:
+                await flush()
+    line_number += 1
+    record = _parse_record(buffer, line_number)
+    if record is not None:
+        pending[record[0]].append(record[1])
+        received[record[0]] += 1
+        pending_count += 1
+    await flush()
+
+    skipped = {kind: received[kind] - inserted.get(RECORD_TABLES[kind], 0) for kind in RECORD_FIELDS}
+    if any(conflicts.values()):
+        message = "部分记录的 ID 已属于其他账号，未能导入"
+    elif any(received.values()) and not any(inserted.values()):
+        message = "没有新记录需要导入"
+    else:
+        message = "导入成功"
+
+    return APIResponse(
+        code=200,
+        message=message,
+        data={
+            "received": received,
+            "inserted": inserted,
+            "skipped": skipped,
+            "conflicts": conflicts
+        }
+    )
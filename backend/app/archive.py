@@ -0,0 +1,205 @@
+"""
+Cold-storage archive tier for inactive conversations
+
+Conversations idle for longer than archive_after_days have all their
+messages moved out of the hot `messages` table into a single
+zlib-compressed JSON blob in `conversation_archives`. The conversation row
+itself stays in place (with its message count and last-message preview),
+so lists are unaffected, and reads go through read_messages /
+load_archived_messages, which fall back to the archive transparently.
+Sending or deleting a message first moves the conversation back into the
+hot table with rehydrate_conversation.
+
+The archive keeps each message's rowid and rehydration restores it, so
+keyset cursors over (created_at, rowid) stay valid in both tiers. Should a
+rowid have been reused by a newer message meanwhile, that one message gets
+a new rowid. Archives written before rowids were kept have no row_key.
+
+The functions taking a raw sqlite3 connection are meant to run on the
+database executor, via AsyncConnection.run or Database.run.
+"""
+import json
+import sqlite3
+import zlib
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from app.content_store import put_content
+
+# Archiving is offline and decompression speed does not depend on the level
+ARCHIVE_COMPRESSION_LEVEL = 9
+
+
+def _begin(conn: sqlite3.Connection):
+    """Take the write lock up front so no message can slip in between read and delete"""
+    if not conn.in_transaction:
+        conn.execute("BEGIN IMMEDIATE")
+
+
+def _encode(rows: List[sqlite3.Row]) -> bytes:
+    return json.dumps(
+        [[row["message_id"], row["role"], row["content"], row["created_at"], row["row_key"]] for row in rows],
+        ensure_ascii=False,
+        separators=(",", ":")
+    ).encode("utf-8")
+
+
+def _decode(payload: bytes) -> List[Dict]:
+    return [
+        {
+            "message_id": entry[0],
+            "role": entry[1],
+            "content": entry[2],
+            "created_at": entry[3],
+            "row_key": entry[4] if len(entry) > 4 else None
+        }
+        for entry in json.loads(zlib.decompress(payload))
+    ]
+
+
+def load_archived_messages(conn: sqlite3.Connection, conversation_id: str) -> Optional[List[Dict]]:
+    """Messages of an archived conversation (with their rowid as row_key), oldest first, or None if it is not archived"""
+    row = conn.execute("""
+        SELECT payload FROM conversation_archives
+        WHERE conversation_id = ?
+    """, (conversation_id,)).fetchone()
+    if row is None:
+        return None
+    return _decode(row["payload"])
+
+
+def read_messages(conn: sqlite3.Connection, conversation_id: str) -> List[Dict]:
+    """All messages of a conversation, oldest first, from the hot table or the archive"""
+    archived = load_archived_messages(conn, conversation_id)
+    if archived is not None:
+        for message in archived:
+            del message["row_key"]
+        return archived
+    rows = conn.execute("""
+        SELECT
+            m.message_id, m.role,
+            COALESCE((SELECT content FROM content_blobs WHERE hash = m.content_hash), m.content) AS content,
+            m.created_at
+        FROM messages m
+        WHERE m.conversation_id = ?
+        ORDER BY m.created_at ASC, m.rowid ASC
+    """, (conversation_id,)).fetchall()
+    return [dict(row) for row in rows]
+
+
+def archive_conversation(conn: sqlite3.Connection, conversation_id: str, idle_before: datetime) -> bool:
+    """
+    Move a conversation's messages into the archive
+
+    Re-checks inside the transaction that the conversation is still idle,
+    so a message sent meanwhile keeps it hot. Returns True if archived.
+    """
+    _begin(conn)
+    conversation = conn.execute("""
+        SELECT message_count, last_message_at, last_message_preview
+        FROM conversations
+        WHERE conversation_id = ? AND archived_at IS NULL AND deleted_at IS NULL AND updated_at < ?
+    """, (conversation_id, idle_before)).fetchone()
+    if conversation is None:
+        return False
+
+    rows = conn.execute("""
+        SELECT
+            m.rowid AS row_key, m.message_id, m.role,
+            COALESCE((SELECT content FROM content_blobs WHERE hash = m.content_hash), m.content) AS content,
+            m.created_at
+        FROM messages m
+        WHERE m.conversation_id = ?
+        ORDER BY m.created_at ASC, m.rowid ASC
+    """, (conversation_id,)).fetchall()
+    if not rows:
+        return False
+
+    raw = _encode(rows)
+    now = datetime.utcnow()
+    conn.execute("""
+        INSERT INTO conversation_archives (conversation_id, message_count, raw_size, payload, archived_at)
+        VALUES (?, ?, ?, ?, ?)
+    """, (conversation_id, len(rows), len(raw), zlib.compress(raw, ARCHIVE_COMPRESSION_LEVEL), now))
+    conn.execute("""
+        DELETE FROM messages
+        WHERE conversation_id = ?
+    """, (conversation_id,))
+    # The delete trigger zeroed the counters; the archive still holds the messages
+    conn.execute("""
+        UPDATE conversations
+        SET archived_at = ?, message_count = ?, last_message_at = ?, last_message_preview = ?
+        WHERE conversation_id = ?
+    """, (now, conversation["message_count"], conversation["last_message_at"],
+          conversation["last_message_preview"], conversation_id))
+    return True
+
+
+def rehydrate_conversation(conn: sqlite3.Connection, conversation_id: str) -> int:
+    """
+    Move an archived conversation back into the hot messages table
+
+    Also bumps updated_at so the archiver does not pick it up again before
+    the caller's own write lands. Returns the number of messages restored
+    (0 if the conversation was not archived).
+    """
+    # Cheap check first: hot conversations must not take the write lock
+    if conn.execute("""
+        SELECT 1 FROM conversation_archives
+        WHERE conversation_id = ?
+    """, (conversation_id,)).fetchone() is None:
+        return 0
+
+    _begin(conn)
+    messages = load_archived_messages(conn, conversation_id)
+    if messages is None:
+        return 0
+
+    # The insert trigger rebuilds the counters from zero
+    conn.execute("""
+        UPDATE conversations
+        SET archived_at = NULL, message_count = 0, last_message_at = NULL,
+            last_message_preview = NULL, updated_at = ?
+        WHERE conversation_id = ?
+    """, (datetime.utcnow(), conversation_id))
+    for m in messages:
+        stored, content_hash = put_content(conn, m["content"])
+        row = (m["message_id"], conversation_id, m["role"], stored, content_hash, m["created_at"])
+        # Keep the original rowid unless a newer message has taken it
+        if m["row_key"] is not None and conn.execute("""
+            INSERT OR IGNORE INTO messages (rowid, message_id, conversation_id, role, content, content_hash, created_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        """, (m["row_key"], *row)).rowcount:
+            continue
+        conn.execute("""
+            INSERT OR IGNORE INTO messages (message_id, conversation_id, role, content, content_hash, created_at)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, row)
+    conn.execute("""
+        DELETE FROM conversation_archives
+        WHERE conversation_id = ?
+    """, (conversation_id,))
+    return len(messages)
+
+
+async def archive_idle_conversations(store, idle_days: int, batch_size: int) -> int:
+    """
+    Archive up to batch_size conversations of one database idle for idle_days
+
+    Each conversation is archived in its own short transaction so the
+    group-commit writer is never blocked for long.
+    """
+    idle_before = datetime.utcnow() - timedelta(days=idle_days)
+    async with store.connection() as conn:
+        candidates = await conn.fetchall("""
+            SELECT conversation_id FROM conversations
+            WHERE archived_at IS NULL AND deleted_at IS NULL AND updated_at < ? AND message_count > 0
+            ORDER BY updated_at ASC
+            LIMIT ?
+        """, (idle_before, batch_size))
+
+    archived = 0
+    for row in candidates:
+        if await store.run(archive_conversation, row["conversation_id"], idle_before):
+            archived += 1
+    return archived
@@ -0,0 +1,183 @@
+"""
+Online hot backups of the SQLite databases
+
+Each run copies the catalog and every shard with the SQLite online backup
+API (sqlite3.Connection.backup) into a new snapshot directory under
+backup_dir, then deletes all but the newest backup_keep snapshots. The copy
+proceeds backup_pages_per_step pages at a time with a short pause between
+steps, so the source is only read-locked for one step at a time and
+writers keep going.
+
+SQLite restarts a backup whenever another connection writes to the source
+between two steps. Under heavy write load the stepped copy could therefore
+never finish, so after BACKUP_MAX_RESTARTS restarts the remaining copy is
+done in a single step; in WAL mode that holds a read snapshot for the
+duration but still does not block writers.
+
+A snapshot directory is written as `<name>.part` and only renamed once every
+file is complete, so a crash never leaves a torn snapshot behind.
+"""
+import asyncio
+import logging
+import os
+import shutil
+import sqlite3
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from app.config import get_settings
+from app.database import db
+
+settings = get_settings()
+
+logger = logging.getLogger(__name__)
+
+BACKUP_MAX_RESTARTS = 3
+PART_SUFFIX = ".part"
+
+
+class _BackupRestarted(Exception):
+    """Raised from the progress callback to stop a stepped backup that keeps restarting"""
+
+
+class BackupManager:
+    """Runs backups one at a time and tracks the progress of the current run"""
+
+    def __init__(self):
+        self.backup_dir = Path(settings.backup_dir)
+        self._task: Optional[asyncio.Task] = None
+        self.progress: Dict[str, Any] = {"state": "idle"}
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self) -> asyncio.Task:
+        """
+        Start a backup in the background
+
+        Raises:
+            RuntimeError: If a backup is already running
+        """
+        if self.running:
+            raise RuntimeError("A backup is already running")
+        self._task = asyncio.create_task(self._run())
+        # Failures are logged and kept in progress; nobody may await a task started from the API
+        self._task.add_done_callback(lambda task: task.cancelled() or task.exception())
+        return self._task
+
+    async def run(self) -> Optional[str]:
+        """Back up now and wait for it; returns the snapshot name, or None if one was already running"""
+        if self.running:
+            return None
+        return await self.start()
+
+    async def _run(self) -> str:
+        stores = db.all_databases()
+        name = datetime.utcnow().strftime("%Y%m%d-%H%M%S")
+        part_dir = self.backup_dir / (name + PART_SUFFIX)
+        self.progress = {
+            "state": "running",
+            "snapshot": name,
+            "started_at": datetime.utcnow().isoformat(),
+            "files_total": len(stores),
+            "files_done": 0,
+            "current_file": None,
+            "pages_total": 0,
+            "pages_done": 0,
+            "restarts": 0
+        }
+        started = time.perf_counter()
+        try:
+            part_dir.mkdir(parents=True, exist_ok=True)
+            for store in stores:
+                source = Path(store.db_path)
+                self.progress.update(current_file=source.name, pages_total=0, pages_done=0)
+                await store.run_in_executor(self._copy, store, str(part_dir / source.name))
+                self.progress["files_done"] += 1
+            part_dir.rename(self.backup_dir / name)
+            removed = self._rotate()
+        except Exception as e:
+            shutil.rmtree(part_dir, ignore_errors=True)
+            self.progress.update(state="failed", error=str(e), finished_at=datetime.utcnow().isoformat())
+            logger.error(f"Backup {name} failed: {str(e)}")
+            raise
+
+        self.progress.update(
+            state="completed",
+            current_file=None,
+            finished_at=datetime.utcnow().isoformat(),
+            duration_seconds=round(time.perf_counter() - started, 2)
+        )
+        logger.info(f"Backup {name} completed in {self.progress['duration_seconds']}s, "
+                    f"removed {removed} old snapshots")
+        return name
+
+    def _copy(self, store, target_path: str):
+        """Copy one live database file to target_path (runs on the database executor)"""
+        pages_per_step = max(1, settings.backup_pages_per_step)
+        delay = settings.backup_step_delay_ms / 1000
+        restarts = 0
+        last_done = 0
+
+        def on_progress(status: int, remaining: int, total: int):
+            nonlocal restarts, last_done
+            done = total - remaining
+            if done < last_done:
+                restarts += 1
+                self.progress["restarts"] += 1
+                if restarts > BACKUP_MAX_RESTARTS:
+                    raise _BackupRestarted()
+            last_done = done
+            self.progress.update(pages_total=total, pages_done=done)
+            if remaining and delay:
+                # Let writers in between steps
+                time.sleep(delay)
+
+        source = store.pool.open_connection()
+        target = sqlite3.connect(target_path)
+        try:
+            try:
+                source.backup(target, pages=pages_per_step, progress=on_progress)
+            except _BackupRestarted:
+                logger.warning(f"Backup of {store.db_path} kept restarting; copying in one step")
+                source.backup(target, pages=-1)
+            self.progress["pages_done"] = self.progress["pages_total"]
+        finally:
+            target.close()
+            source.close()
+
+    def _rotate(self) -> int:
+        """Delete all but the newest backup_keep snapshots, and partial ones left by a crash"""
+        removed = 0
+        for path in self.backup_dir.iterdir():
+            if path.is_dir() and path.name.endswith(PART_SUFFIX):
+                shutil.rmtree(path, ignore_errors=True)
+        for snapshot in self.list_snapshots()[max(1, settings.backup_keep):]:
+            shutil.rmtree(self.backup_dir / snapshot["name"], ignore_errors=True)
+            removed += 1
+        return removed
+
+    def list_snapshots(self) -> List[Dict[str, Any]]:
+        """Completed snapshots, newest first"""
+        if not self.backup_dir.is_dir():
+            return []
+        snapshots = []
+        for path in self.backup_dir.iterdir():
+            if not path.is_dir() or path.name.endswith(PART_SUFFIX):
+                continue
+            files = [f for f in path.iterdir() if f.is_file()]
+            snapshots.append({
+                "name": path.name,
+                "files": len(files),
+                "size_bytes": sum(f.stat().st_size for f in files),
+                "created_at": datetime.utcfromtimestamp(os.path.getmtime(path)).isoformat()
+            })
+        snapshots.sort(key=lambda s: s["name"], reverse=True)
+        return snapshots
+
+
+# Global backup manager instance
+backup_manager = BackupManager()
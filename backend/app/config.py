@@ -9,6 +9,25 @@ from functools import lru_cache
 class Settings(BaseSettings):
     # Database
     db_file: str = "./data/mindflow.db"
+    db_pool_size: int = 8
+    db_pool_timeout_seconds: float = 30.0
+    db_busy_timeout_ms: int = 5000
+    db_journal_mode: str = "WAL"
+    db_synchronous: str = "NORMAL"
+    db_cache_size_kb: int = 16384
+    db_mmap_size_mb: int = 256
+    # NONE, FULL or INCREMENTAL; existing files switch mode only after a VACUUM
+    db_auto_vacuum: str = "INCREMENTAL"
+    db_write_batch_size: int = 256
+    db_write_max_delay_ms: float = 2.0
+    # 0 keeps everything in db_file; N > 0 splits user data over N shard files
+    db_shard_count: int = 0
+    db_shard_dir: str = "./data/shards"
+    db_shard_pool_size: int = 4
+    # Bodies of at least this many bytes are stored once in content_blobs (0 disables)
+    content_dedup_min_bytes: int = 0
+    # Primary key format for new rows: "uuid4" or "ulid" (time-ordered, 26 chars)
+    id_format: str = "uuid4"
 
     # API Settings
     api_host: str = "0.0.0.0"
@@ -29,6 +48,12 @@ class Settings(BaseSettings):
     nvidia_api_base_url: str = "https://integrate.api.nvidia.com/v1/chat/completions"
     default_model: str = "minimaxai/minimax-m2.1"  # Default to MiniMax M2.1
 
+    # Shared HTTP client for the NVIDIA API (opened and closed with the app)
+    nvidia_http2: bool = True
+    nvidia_max_connections: int = 20
+    nvidia_max_keepalive_connections: int = 10
+    nvidia_keepalive_expiry_seconds: float = 120.0
+
     # Email Settings
     smtp_host: str = "smtp.feishu.cn"
     smtp_port: int = 465
@@ -40,6 +65,44 @@ class Settings(BaseSettings):
     # Task Scheduler
     scheduler_check_interval_minutes: int = 5
 
+    # Conversation archive (0 disables archiving)
+    archive_after_days: int = 90
+    archive_batch_size: int = 200
+
+    # Purge of soft-deleted conversations, documents and tasks
+    purge_interval_minutes: int = 1
+    purge_batch_size: int = 500
+
+    # Online backups (0 disables the scheduled job; snapshots can still be taken via the admin API)
+    backup_dir: str = "./data/backups"
+    backup_interval_hours: int = 24
+    backup_keep: int = 7
+    backup_pages_per_step: int = 1024
+    backup_step_delay_ms: float = 10.0
+
+    # Database maintenance: PRAGMA optimize, incremental vacuum, WAL checkpoint (0 disables)
+    maintenance_interval_hours: int = 24
+    maintenance_vacuum_pages: int = 1000
+
+    # Hashed TF-IDF vectors for related-document and semantic search
+    vector_dimensions: int = 1024
+    vector_cache_users: int = 64
+
+    # MinHash near-duplicate detection (permutations must be a multiple of bands)
+    minhash_permutations: int = 64
+    minhash_bands: int = 16
+    duplicate_threshold: float = 0.8
+
+    # Users whose title and tag prefix lists are kept in memory for autocompletion
+    typeahead_cache_users: int = 256
+
+    # Search and filtered-list result cache (0 entries disables it)
+    search_cache_max_entries: int = 2048
+    search_cache_ttl_seconds: float = 300.0
+
+    # User IDs allowed to call the /admin endpoints (IDs, unlike usernames, cannot be changed)
+    admin_user_ids: List[str] = []
+
     # GitHub OAuth
     github_client_id: str = ""
     github_client_secret: str = ""
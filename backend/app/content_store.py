@@ -0,0 +1,85 @@
+"""
+Content-addressed store for large message and document bodies
+
+When CONTENT_DEDUP_MIN_BYTES > 0, a message or document body at least that
+large is written once to `content_blobs`, keyed by its SHA-256. The owning
+row keeps an empty `content` and points at the blob through
+`content_hash`. Triggers on messages and documents keep
+content_blobs.refcount up to date; collect_garbage deletes blobs that are
+no longer referenced.
+
+Readers resolve the body in SQL with
+    COALESCE((SELECT content FROM content_blobs WHERE hash = x.content_hash), x.content)
+so rows written before dedup was enabled (or below the threshold) read
+back unchanged.
+"""
+import hashlib
+import sqlite3
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from app.config import get_settings
+
+settings = get_settings()
+
+INSERT_BLOB = """
+    INSERT INTO content_blobs (hash, content, size, created_at)
+    VALUES (?, ?, ?, ?)
+    ON CONFLICT(hash) DO NOTHING
+"""
+
+
+def prepare_content(content: str) -> Tuple[str, Optional[str], List[Tuple[str, Sequence]]]:
+    """
+    Decide how to store a body
+
+    Returns:
+        (value for the content column, content_hash or None, statements
+        that must run in the same transaction before the row is written)
+    """
+    min_bytes = settings.content_dedup_min_bytes
+    if min_bytes <= 0:
+        return content, None, []
+    data = content.encode("utf-8")
+    if len(data) < min_bytes:
+        return content, None, []
+    content_hash = hashlib.sha256(data).hexdigest()
+    return "", content_hash, [(INSERT_BLOB, (content_hash, content, len(data), datetime.utcnow()))]
+
+
+def put_content(conn: sqlite3.Connection, content: str) -> Tuple[str, Optional[str]]:
+    """Store the blob if needed and return (content column value, content_hash)"""
+    stored, content_hash, statements = prepare_content(content)
+    for sql, params in statements:
+        conn.execute(sql, params)
+    return stored, content_hash
+
+
+def collect_garbage(conn: sqlite3.Connection) -> int:
+    """Delete unreferenced blobs; returns the number removed"""
+    return conn.execute("""
+        DELETE FROM content_blobs
+        WHERE refcount <= 0
+    """).rowcount
+
+
+def stats(conn: sqlite3.Connection) -> Dict[str, Any]:
+    """
+    Space accounting for one database
+
+    logical_bytes is what the deduplicated bodies would take if every
+    reference stored its own copy; saved_bytes is the difference to the
+    bytes actually stored.
+    """
+    row = conn.execute("""
+        SELECT
+            COUNT(*) AS blobs,
+            COALESCE(SUM(refcount), 0) AS references_count,
+            COALESCE(SUM(CASE WHEN refcount > 0 THEN size ELSE 0 END), 0) AS stored_bytes,
+            COALESCE(SUM(CASE WHEN refcount > 0 THEN size * refcount ELSE 0 END), 0) AS logical_bytes,
+            COALESCE(SUM(CASE WHEN refcount <= 0 THEN size ELSE 0 END), 0) AS garbage_bytes
+        FROM content_blobs
+    """).fetchone()
+    result = dict(row)
+    result["saved_bytes"] = result["logical_bytes"] - result["stored_bytes"]
+    return result
@@ -1,39 +1,435 @@
 """
 Database models for MindFlow
 """
+import asyncio
+import functools
+import os
+import queue
 import sqlite3
-import uuid
+import threading
+import weakref
+import zlib
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from typing import Optional, List, Dict, Any
-from contextlib import contextmanager
+from typing import Optional, List, Dict, Any, Callable, Iterable, Sequence
+from contextlib import contextmanager, asynccontextmanager
 from pathlib import Path
 from app.config import get_settings
+from app.fts import register_functions
+from app.ids import ID_FORMATS, new_id
+from app.write_queue import WriteQueue
+from app.migrations import run_migrations
 
 settings = get_settings()
 
+# Tables whose rows belong to one user and live on that user's shard
+USER_DATA_TABLES = (
+    "conversations", "messages", "conversation_archives", "documents", "document_tags",
+    "document_vectors", "document_minhash", "document_lsh_buckets", "tag_counts", "tasks",
+    "email_notifications"
+)
+
+
+def shard_index(user_id: str, shard_count: int) -> int:
+    """Stable shard bucket for a user"""
+    return zlib.crc32(user_id.encode("utf-8")) % shard_count
+
+
+def shard_path(index: int, shard_count: int) -> str:
+    """
+    File holding one shard bucket
+
+    The shard count is part of the name so a re-split never writes into the
+    files of the layout it is migrating from.
+    """
+    return os.path.join(settings.db_shard_dir, f"shard-{index:03d}-of-{shard_count:03d}.db")
+
+
+class ConnectionPool:
+    """Thread-safe pool of reusable SQLite connections for one database file"""
+
+    def __init__(
+        self,
+        db_path: str,
+        max_size: int = 8,
+        timeout: float = 30.0,
+        busy_timeout_ms: int = 5000,
+        journal_mode: str = "WAL",
+        synchronous: str = "NORMAL",
+        cache_size_kb: int = 16384,
+        mmap_size_mb: int = 256,
+        auto_vacuum: str = "INCREMENTAL"
+    ):
+        self.db_path = db_path
+        self.max_size = max_size
+        self.timeout = timeout
+        self.busy_timeout_ms = busy_timeout_ms
+        self.journal_mode = journal_mode
+        self.synchronous = synchronous
+        self.cache_size_kb = cache_size_kb
+        self.mmap_size_mb = mmap_size_mb
+        self.auto_vacuum = auto_vacuum
+
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        """Forget all connections (used on first use and after a fork)"""
+        # LIFO keeps the most recently used connection (and its page cache) hot
+        self._idle = queue.LifoQueue()
+        self._size = 0
+        self._pid = os.getpid()
+        self._stats = {
+            "created": 0,
+            "reused": 0,
+            "waits": 0,
+            "timeouts": 0,
+            "discarded": 0
+        }
+
+    def open_connection(self) -> sqlite3.Connection:
+        """Open a new connection and apply the tuning pragmas"""
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=self.busy_timeout_ms / 1000,
+            check_same_thread=False
+        )
+        conn.row_factory = sqlite3.Row
+        # The full-text index triggers call fts_tokens()
+        register_functions(conn)
+        # Only takes effect on a new file (before WAL writes the header) or at the next VACUUM
+        conn.execute(f"PRAGMA auto_vacuum = {self.auto_vacuum}")
+        conn.execute(f"PRAGMA journal_mode = {self.journal_mode}")
+        conn.execute(f"PRAGMA busy_timeout = {int(self.busy_timeout_ms)}")
+        conn.execute(f"PRAGMA synchronous = {self.synchronous}")
+        # Negative cache_size is in KiB rather than pages
+        conn.execute(f"PRAGMA cache_size = -{int(self.cache_size_kb)}")
+        conn.execute(f"PRAGMA mmap_size = {int(self.mmap_size_mb) * 1024 * 1024}")
+        conn.execute("PRAGMA temp_store = MEMORY")
+        return conn
+
+    def acquire(self) -> sqlite3.Connection:
+        """
+        Take a connection from the pool, opening one if the pool is not full
+
+        Raises:
+            sqlite3.OperationalError: If no connection frees up within the timeout
+        """
+        with self._lock:
+            # Connections must never cross a fork: each worker builds its own pool
+            if self._pid != os.getpid():
+                self._reset()
+            try:
+                conn = self._idle.get_nowait()
+                self._stats["reused"] += 1
+                return conn
+            except queue.Empty:
+                pass
+            if self._size < self.max_size:
+                self._size += 1
+                create = True
+            else:
+                self._stats["waits"] += 1
+                create = False
+
+        if create:
+            try:
+                conn = self.open_connection()
+            except Exception:
+                with self._lock:
+                    self._size -= 1
+                raise
+            with self._lock:
+                self._stats["created"] += 1
+            return conn
+
+        try:
+            conn = self._idle.get(timeout=self.timeout)
+        except queue.Empty:
+            with self._lock:
+                self._stats["timeouts"] += 1
+            raise sqlite3.OperationalError("Timed out waiting for a database connection")
+        with self._lock:
+            self._stats["reused"] += 1
+        return conn
+
+    def release(self, conn: sqlite3.Connection, discard: bool = False):
+        """Return a connection to the pool, or close it if it is no longer usable"""
+        if self._pid != os.getpid():
+            return
+        if not discard and conn.in_transaction:
+            try:
+                conn.rollback()
+            except sqlite3.Error:
+                discard = True
+        if discard:
+            with self._lock:
+                self._size -= 1
+                self._stats["discarded"] += 1
+            try:
+                conn.close()
+            except sqlite3.Error:
+                pass
+            return
+        self._idle.put(conn)
+
+    def close_all(self):
+        """Close every idle connection"""
+        with self._lock:
+            while True:
+                try:
+                    conn = self._idle.get_nowait()
+                except queue.Empty:
+                    break
+                self._size -= 1
+                conn.close()
+
+    def stats(self) -> Dict[str, Any]:
+        """Return a snapshot of pool usage counters"""
+        with self._lock:
+            idle = self._idle.qsize()
+            return {
+                "db_path": self.db_path,
+                "max_size": self.max_size,
+                "open": self._size,
+                "idle": idle,
+                "in_use": self._size - idle,
+                "journal_mode": self.journal_mode,
+                **self._stats
+            }
+
+
+class AsyncCursor:
+    """Awaitable view of a sqlite3 cursor; fetches run on the database executor"""
+
+    def __init__(self, db: "Database", cursor: sqlite3.Cursor):
+        self._db = db
+        self._cursor = cursor
+
+    @property
+    def rowcount(self) -> int:
+        return self._cursor.rowcount
+
+    @property
+    def lastrowid(self) -> Optional[int]:
+        return self._cursor.lastrowid
+
+    async def fetchone(self) -> Optional[sqlite3.Row]:
+        return await self._db.run_in_executor(self._cursor.fetchone)
+
+    async def fetchall(self) -> List[sqlite3.Row]:
+        return await self._db.run_in_executor(self._cursor.fetchall)
+
+    async def fetchmany(self, size: int) -> List[sqlite3.Row]:
+        return await self._db.run_in_executor(self._cursor.fetchmany, size)
+
+
+class AsyncConnection:
+    """
+    Awaitable wrapper around a pooled sqlite3 connection
+
+    Every call is executed on the database executor so blocking SQLite work
+    never runs on the event loop. The wrapped connection is only ever used
+    by one coroutine at a time.
+    """
+
+    def __init__(self, db: "Database", conn: sqlite3.Connection):
+        self._db = db
+        self._conn = conn
+
+    async def execute(self, sql: str, params: Sequence = ()) -> AsyncCursor:
+        cursor = await self._db.run_in_executor(self._conn.execute, sql, params)
+        return AsyncCursor(self._db, cursor)
+
+    async def executemany(self, sql: str, seq_of_params: Iterable[Sequence]) -> AsyncCursor:
+        cursor = await self._db.run_in_executor(self._conn.executemany, sql, seq_of_params)
+        return AsyncCursor(self._db, cursor)
+
+    async def executescript(self, script: str) -> AsyncCursor:
+        cursor = await self._db.run_in_executor(self._conn.executescript, script)
+        return AsyncCursor(self._db, cursor)
+
+    async def fetchone(self, sql: str, params: Sequence = ()) -> Optional[sqlite3.Row]:
+        """Execute a query and return its first row in a single executor hop"""
+        return await self._db.run_in_executor(
+            lambda: self._conn.execute(sql, params).fetchone()
+        )
+
+    async def fetchall(self, sql: str, params: Sequence = ()) -> List[sqlite3.Row]:
+        """Execute a query and return all rows in a single executor hop"""
+        return await self._db.run_in_executor(
+            lambda: self._conn.execute(sql, params).fetchall()
+        )
+
+    async def run(self, fn: Callable, *args):
+        """Run fn(conn, *args) against the raw connection on the executor"""
+        return await self._db.run_in_executor(fn, self._conn, *args)
+
+    async def commit(self):
+        await self._db.run_in_executor(self._conn.commit)
+
+    async def rollback(self):
+        await self._db.run_in_executor(self._conn.rollback)
+
 
 class Database:
-    def __init__(self, db_path: str = None):
+    """
+    SQLite storage for MindFlow
+
+    With shard_count = 0 everything lives in one file. With shard_count > 0
+    this instance is the global catalog (users and user_settings) and each
+    user's conversations, messages, documents and tasks are stored in one of
+    shard_count bucket files, reached through for_user(). Every file carries
+    the full schema so migrations apply to all of them unchanged.
+    """
+
+    def __init__(self, db_path: str = None, shard_count: int = 0, pool_size: int = None):
+        if settings.id_format not in ID_FORMATS:
+            raise ValueError(f"Unknown ID_FORMAT {settings.id_format!r}; expected one of {ID_FORMATS}")
         self.db_path = db_path or settings.db_file
+        self.shard_count = shard_count
         Path(self.db_path).parent.mkdir(parents=True, exist_ok=True)
+        self.pool = ConnectionPool(
+            self.db_path,
+            max_size=pool_size or settings.db_pool_size,
+            timeout=settings.db_pool_timeout_seconds,
+            busy_timeout_ms=settings.db_busy_timeout_ms,
+            journal_mode=settings.db_journal_mode,
+            synchronous=settings.db_synchronous,
+            cache_size_kb=settings.db_cache_size_kb,
+            mmap_size_mb=settings.db_mmap_size_mb,
+            auto_vacuum=settings.db_auto_vacuum
+        )
+        # Single writer that group-commits hot-path message/conversation writes
+        self.writer = WriteQueue(
+            self.pool.open_connection,
+            max_batch=settings.db_write_batch_size,
+            max_delay_ms=settings.db_write_max_delay_ms
+        )
+        # Dedicated threads for SQLite work issued from async handlers
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.pool.max_size + 2,
+            thread_name_prefix="db"
+        )
+        # Per-event-loop semaphores bounding async connection holders to the pool size
+        self._async_slots = weakref.WeakKeyDictionary()
+        # Shard databases, opened on first use
+        self._shards: Dict[int, "Database"] = {}
+        self._shards_lock = threading.Lock()
         self.init_db()
 
     @contextmanager
     def get_connection(self):
-        """Context manager for database connections"""
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
+        """Context manager for pooled database connections"""
+        conn = self.pool.acquire()
+        discard = False
         try:
             yield conn
             conn.commit()
         except Exception:
-            conn.rollback()
+            discard = not _rollback(conn)
             raise
         finally:
-            conn.close()
+            self.pool.release(conn, discard=discard)
+
+    async def run_in_executor(self, fn: Callable, *args):
+        """Run a blocking callable on the database executor"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(fn, *args))
+
+    def _slots(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        slots = self._async_slots.get(loop)
+        if slots is None:
+            slots = asyncio.Semaphore(self.pool.max_size)
+            self._async_slots[loop] = slots
+        return slots
+
+    @asynccontextmanager
+    async def connection(self):
+        """
+        Async context manager for pooled database connections
+
+        Commits on success and rolls back on error, like get_connection, but
+        acquires, executes and commits on the database executor.
+        """
+        async with self._slots():
+            conn = await self.run_in_executor(self.pool.acquire)
+            discard = False
+            try:
+                yield AsyncConnection(self, conn)
+                await self.run_in_executor(conn.commit)
+            except BaseException:
+                discard = not await self.run_in_executor(_rollback, conn)
+                raise
+            finally:
+                await self.run_in_executor(self.pool.release, conn, discard)
+
+    async def run(self, fn: Callable, *args):
+        """
+        Run fn(conn, *args) inside a single pooled transaction on the executor
+
+        Useful for blocks of several statements that need no awaits in between.
+        """
+        def call():
+            with self.get_connection() as conn:
+                return fn(conn, *args)
+
+        async with self._slots():
+            return await self.run_in_executor(call)
+
+    def for_user(self, user_id: str) -> "Database":
+        """Database holding a user's conversations, messages, documents and tasks"""
+        if not self.shard_count:
+            return self
+        return self.shard(shard_index(user_id, self.shard_count))
+
+    def shard(self, index: int) -> "Database":
+        """Open (once) and return one shard bucket"""
+        with self._shards_lock:
+            shard = self._shards.get(index)
+            if shard is None:
+                shard = Database(
+                    shard_path(index, self.shard_count),
+                    pool_size=settings.db_shard_pool_size
+                )
+                self._shards[index] = shard
+            return shard
+
+    def all_shards(self) -> List["Database"]:
+        """Every database holding user data, for jobs that sweep all users"""
+        if not self.shard_count:
+            return [self]
+        return [self.shard(index) for index in range(self.shard_count)]
+
+    def all_databases(self) -> List["Database"]:
+        """The catalog followed by every shard, for per-file jobs such as backups"""
+        return [self] + [shard for shard in self.all_shards() if shard is not self]
+
+    def pool_stats(self) -> Dict[str, Any]:
+        """Connection pool statistics"""
+        stats = self.pool.stats()
+        if self.shard_count:
+            with self._shards_lock:
+                shards = dict(self._shards)
+            stats["shard_count"] = self.shard_count
+            stats["shards"] = {
+                index: {**shard.pool.stats(), "writer": shard.writer.stats()}
+                for index, shard in sorted(shards.items())
+            }
+        return stats
+
+    def close(self):
+        """Flush queued writes and close pooled connections"""
+        with self._shards_lock:
+            shards = list(self._shards.values())
+        for shard in shards:
+            shard.close()
+        self.writer.stop()
+        self.pool.close_all()
 
     def init_db(self):
-        """Initialize database tables"""
+        """Initialize database tables and apply pending migrations"""
         with self.get_connection() as conn:
             conn.executescript("""
                 CREATE TABLE IF NOT EXISTS users (
@@ -122,17 +518,50 @@ class Database:
                     FOREIGN KEY (user_id) REFERENCES users(user_id)
                 );
 
-                CREATE INDEX IF NOT EXISTS idx_conversations_user_id ON conversations(user_id);
-                CREATE INDEX IF NOT EXISTS idx_messages_conversation_id ON messages(conversation_id);
-                CREATE INDEX IF NOT EXISTS idx_documents_user_id ON documents(user_id);
-                CREATE INDEX IF NOT EXISTS idx_tasks_user_id ON tasks(user_id);
-                CREATE INDEX IF NOT EXISTS idx_tasks_due_date ON tasks(due_date);
             """)
 
+            # Evolve the schema past the base tables
+            run_migrations(conn)
+            self._check_shard_layout(conn)
+
+    def _check_shard_layout(self, conn: sqlite3.Connection):
+        """
+        Refuse to start with a shard count that does not match the data
+
+        The layout is recorded in storage_meta by scripts/split_shards.py;
+        a fresh database adopts the configured count.
+        """
+        row = conn.execute("SELECT value FROM storage_meta WHERE key = 'shard_count'").fetchone()
+        stored = int(row["value"]) if row else 0
+        if stored == self.shard_count:
+            return
+        if row is None and not any(
+            conn.execute(f"SELECT 1 FROM {table} LIMIT 1").fetchone()
+            for table in USER_DATA_TABLES
+        ):
+            conn.execute(
+                "INSERT INTO storage_meta (key, value) VALUES ('shard_count', ?)",
+                (str(self.shard_count),)
+            )
+            return
+        raise RuntimeError(
+            f"{self.db_path} holds data for shard_count={stored} but DB_SHARD_COUNT={self.shard_count}; "
+            f"run scripts/split_shards.py --shards {self.shard_count} first"
+        )
+
     def generate_uuid(self) -> str:
-        """Generate a unique ID"""
-        return str(uuid.uuid4())
+        """Generate a unique ID in the configured ID_FORMAT (UUID4 or ULID)"""
+        return new_id(settings.id_format)
+
+
+def _rollback(conn: sqlite3.Connection) -> bool:
+    """Roll back a failed transaction, returning False if the connection is broken"""
+    try:
+        conn.rollback()
+        return True
+    except sqlite3.Error:
+        return False
 
 
 # Global database instance
-db = Database()
+db = Database(shard_count=settings.db_shard_count)
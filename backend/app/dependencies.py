@@ -6,6 +6,9 @@ from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from typing import Optional
 from app.database import db
 from app.auth import decode_token
+from app.config import get_settings
+
+settings = get_settings()
 
 security = HTTPBearer()
 
@@ -38,12 +41,12 @@ async def get_current_user(
         )
 
     # Fetch user from database
-    with db.get_connection() as conn:
-        cursor = conn.execute(
+    async with db.connection() as conn:
+        cursor = await conn.execute(
             "SELECT user_id, username, email, created_at, avatar_url FROM users WHERE user_id = ?",
             (user_id,)
         )
-        user = cursor.fetchone()
+        user = await cursor.fetchone()
 
         if user is None:
             raise HTTPException(
@@ -55,6 +58,23 @@ async def get_current_user(
     return dict(user)
 
 
+async def get_admin_user(current_user: dict = Depends(get_current_user)) -> dict:
+    """
+    Require the current user's ID to be listed in ADMIN_USER_IDS
+
+    Usernames are not used: users can rename themselves to any free name.
+
+    Raises:
+        HTTPException: If the user is not an administrator
+    """
+    if current_user["user_id"] not in settings.admin_user_ids:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Administrator access required"
+        )
+    return current_user
+
+
 async def get_user_settings(user_id: str) -> dict:
     """
     Get user settings
@@ -65,14 +85,14 @@ async def get_user_settings(user_id: str) -> dict:
     Returns:
         dict: User settings
     """
-    with db.get_connection() as conn:
-        cursor = conn.execute("""
+    async with db.connection() as conn:
+        cursor = await conn.execute("""
             SELECT default_email, reminder_enabled, default_model_id
             FROM user_settings
             WHERE user_id = ?
         """, (user_id,))
 
-        settings_row = cursor.fetchone()
+        settings_row = await cursor.fetchone()
 
         if settings_row:
             return dict(settings_row)
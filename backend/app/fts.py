@@ -0,0 +1,198 @@
+"""
+Helpers for the FTS5 full-text indexes
+
+Chinese text has no spaces between words, so neither word tokenizers nor a
+trigram index suit it: unicode61 turns a whole sentence into one token,
+and trigram cannot match the two-character words most Chinese queries
+consist of. The indexes therefore hold the output of index_text, which
+splits every run of CJK characters into overlapping bigrams plus the
+run's last character, keeps other words as they are, and feeds the result
+to the plain unicode61 tokenizer:
+
+    "用AI整理会议纪要"  ->  "用 AI 整理 理会 会议 议纪 纪要 要"
+
+index_text is registered as the SQL function fts_tokens on every
+connection (register_functions) and called from the index views and
+triggers, so any connection that writes documents, messages,
+conversations or tasks must have it registered; the sqlite3 shell cannot
+write those tables (scripts/sql.py runs ad-hoc SQL with it registered).
+
+Each query term becomes one phrase of the same tokens, whose last token
+is matched as a prefix when it is a Latin word or a single CJK character;
+every occurrence of a character starts a bigram or ends a run, so single
+characters need no separate index.
+
+snippet() and highlight() only see the bigram text, so excerpts and
+highlights are cut from the original text in Python (excerpt, mark) and
+wrapped in match markers that render_highlight turns into <mark> tags
+after HTML-escaping, so stored content can never inject markup.
+"""
+import html
+import math
+import re
+import sqlite3
+from typing import List, Optional, Tuple
+
+# Kana, CJK Extension A, CJK Unified Ideographs, CJK Compatibility Ideographs, Hangul
+CJK_CHARS = "぀-ヿ㐀-䶿一-鿿豈-﫿가-힯"
+# A run of CJK characters, or a word of other letters and digits
+TOKEN_PATTERN = re.compile(f"([{CJK_CHARS}]+)|([^\\W_{CJK_CHARS}]+)")
+
+# Match markers wrapped around hits, replaced by render_highlight
+MATCH_START = "\x02"
+MATCH_END = "\x03"
+SNIPPET_ELLIPSIS = "…"
+SNIPPET_CHARS = 32
+# k1 of FTS5's built-in bm25
+BM25_K1 = 1.2
+
+
+def index_text(text: Optional[str]) -> Optional[str]:
+    """Text as stored in the full-text indexes (SQL function fts_tokens)"""
+    if text is None:
+        return None
+    tokens = []
+    for run, word in TOKEN_PATTERN.findall(text):
+        if run:
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+            tokens.append(run[-1])
+        else:
+            tokens.append(word)
+    return " ".join(tokens)
+
+
+def register_functions(conn: sqlite3.Connection):
+    """Make fts_tokens available to the index views and triggers on this connection"""
+    conn.create_function("fts_tokens", 1, index_text, deterministic=True)
+
+
+def _term_query(term: str) -> Optional[str]:
+    """FTS5 phrase for one search term, or None if it has no indexable characters"""
+    groups = TOKEN_PATTERN.findall(term)
+    if not groups:
+        return None
+    tokens = []
+    for position, (run, word) in enumerate(groups):
+        if run:
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+            # A run followed by more of the term ends there in the text too, so its
+            # trailing character is indexed; a final run may continue in the text
+            if position < len(groups) - 1 or len(run) == 1:
+                tokens.append(run[-1])
+        else:
+            tokens.append(word)
+    # A trailing word or single character is matched as a prefix
+    last_run, _ = groups[-1]
+    return '"' + " ".join(tokens) + '"' + ("*" if len(last_run) < 2 else "")
+
+
+def split_terms(query: str) -> Tuple[List[str], List[str]]:
+    """
+    Split a search query on whitespace
+
+    Returns (terms the index can match, terms without any letter, digit or
+    CJK character, which callers match with LIKE instead).
+    """
+    indexed, short = [], []
+    for term in query.split():
+        (indexed if _term_query(term) else short).append(term)
+    return indexed, short
+
+
+def match_expression(terms: List[str]) -> Optional[str]:
+    """FTS5 MATCH expression requiring every term"""
+    queries = [_term_query(term) for term in terms]
+    return " AND ".join(q for q in queries if q) or None
+
+
+def _varint(data: bytes) -> int:
+    """Leading SQLite varint of a blob (7 bits per byte, high bit set on all but the last)"""
+    value = 0
+    for position, byte in enumerate(data[:9]):
+        if position == 8:
+            return (value << 8) | byte
+        value = (value << 7) | (byte & 0x7F)
+        if byte < 0x80:
+            break
+    return value
+
+
+def bm25_ceiling(conn: sqlite3.Connection, table: str, terms: List[str]) -> float:
+    """
+    Highest bm25 score any row of the index `table` can reach for the terms
+
+    FTS5's bm25 adds, for each term's phrase, idf * f * (k1 + 1) / (f + k1 *
+    length norm), where f is the phrase's hit count weighted by column, so a
+    term never earns more than idf * (k1 + 1) whatever the column weights.
+    idf is computed as FTS5 does: from the index's row count (the first
+    varint of its averages record) and the number of rows holding the
+    phrase, floored at 1e-6.
+    """
+    averages = conn.execute(f"SELECT block FROM {table}_data WHERE id = 1").fetchone()
+    total = _varint(averages[0]) if averages else 0
+    ceiling = 0.0
+    for term in terms:
+        phrase = _term_query(term)
+        if phrase is None:
+            continue
+        hits = conn.execute(f"SELECT count(*) FROM {table} WHERE {table} MATCH ?", (phrase,)).fetchone()[0]
+        idf = math.log((total - hits + 0.5) / (hits + 0.5)) if total else 0.0
+        ceiling += max(idf, 1e-6) * (BM25_K1 + 1)
+    return ceiling
+
+
+def like_pattern(term: str) -> str:
+    return f"%{term}%"
+
+
+def mark(text: Optional[str], terms: List[str]) -> Optional[str]:
+    """Wrap every case-insensitive occurrence of the terms in the match markers"""
+    if not text or not terms:
+        return text
+    pattern = re.compile("|".join(re.escape(term) for term in terms), re.IGNORECASE)
+    return pattern.sub(lambda m: MATCH_START + m.group(0) + MATCH_END, text)
+
+
+def excerpt(text: Optional[str], terms: List[str], width: int = SNIPPET_CHARS) -> Optional[str]:
+    """
+    snippet()-style excerpt of the original text
+
+    Takes about `width` characters around the first occurrence of any term
+    and marks every occurrence, ready for render_highlight.
+    """
+    if not text or not terms:
+        return None
+    pattern = re.compile("|".join(re.escape(term) for term in terms), re.IGNORECASE)
+    first = pattern.search(text)
+    start = max(0, first.start() - width // 4) if first else 0
+    end = start + width
+    body = mark(text[start:end], terms)
+    return (SNIPPET_ELLIPSIS if start > 0 else "") + body + (SNIPPET_ELLIPSIS if end < len(text) else "")
+
+
+def render_highlight(text: Optional[str]) -> Optional[str]:
+    """HTML-escape marked text and turn the match markers into <mark> tags"""
+    if text is None:
+        return None
+    return html.escape(text).replace(MATCH_START, "<mark>").replace(MATCH_END, "</mark>")
+
+
+def fts_tables(conn: sqlite3.Connection) -> List[str]:
+    """Names of the FTS5 tables in a database"""
+    return [row[0] for row in conn.execute("""
+        SELECT name FROM sqlite_master
+        WHERE type = 'table' AND sql LIKE 'CREATE VIRTUAL TABLE%USING fts5%'
+    """)]
+
+
+def rebuild_indexes(conn: sqlite3.Connection) -> List[str]:
+    """
+    Rebuild every FTS5 index from its content
+
+    The indexes refer to rows by rowid, which VACUUM may renumber in tables
+    without an INTEGER PRIMARY KEY, so run this after a full VACUUM.
+    """
+    tables = fts_tables(conn)
+    for table in tables:
+        conn.execute(f"INSERT INTO {table}({table}) VALUES ('rebuild')")
+    return tables
@@ -0,0 +1,91 @@
+"""
+Primary key generation
+
+Two formats are supported, selected with the ID_FORMAT setting:
+
+- "uuid4": random 36-character UUID text (the original format)
+- "ulid": 26-character Crockford base32 ULIDs. The first 10 characters
+  encode the creation time in milliseconds, so keys sort by creation time
+  and new rows land on the right-most B-tree pages instead of random ones.
+
+Both are plain strings, so nothing changes at the API boundary and existing
+UUID keys keep working next to ULIDs.
+"""
+import os
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Optional
+
+# Crockford's base32: no I, L, O or U
+ULID_ALPHABET = "0123456789ABCDEFGHJKMNPQRSTVWXYZ"
+ULID_LENGTH = 26
+ID_FORMATS = ("uuid4", "ulid")
+
+_lock = threading.Lock()
+_last_ms = -1
+_last_random = 0
+
+
+def _encode(value: int, length: int) -> str:
+    chars = []
+    for _ in range(length):
+        chars.append(ULID_ALPHABET[value & 31])
+        value >>= 5
+    return "".join(reversed(chars))
+
+
+def new_ulid(timestamp: Optional[datetime] = None) -> str:
+    """
+    Generate a ULID
+
+    IDs generated in the same millisecond by this process increment the
+    random part, so they stay strictly increasing. An explicit timestamp
+    (used when converting existing rows) always gets fresh randomness.
+    """
+    global _last_ms, _last_random
+    if timestamp is not None:
+        if timestamp.tzinfo is None:
+            timestamp = timestamp.replace(tzinfo=timezone.utc)
+        ms = int(timestamp.timestamp() * 1000)
+        randomness = int.from_bytes(os.urandom(10), "big")
+    else:
+        with _lock:
+            ms = time.time_ns() // 1_000_000
+            if ms <= _last_ms:
+                ms = _last_ms
+                randomness = (_last_random + 1) & ((1 << 80) - 1)
+                if randomness == 0:
+                    # Random part overflowed: borrow the next millisecond
+                    ms += 1
+            else:
+                randomness = int.from_bytes(os.urandom(10), "big")
+            _last_ms, _last_random = ms, randomness
+    return _encode(ms, 10) + _encode(randomness, 16)
+
+
+def ulid_timestamp(value: str) -> datetime:
+    """Creation time encoded in a ULID"""
+    ms = 0
+    for char in value[:10].upper():
+        ms = ms * 32 + ULID_ALPHABET.index(char)
+    return datetime.fromtimestamp(ms / 1000, tz=timezone.utc)
+
+
+def is_ulid(value: str) -> bool:
+    return len(value) == ULID_LENGTH and all(c in ULID_ALPHABET for c in value.upper())
+
+
+def new_id(id_format: str = "uuid4") -> str:
+    """
+    Generate a primary key in the given format
+
+    Raises:
+        ValueError: If the format is unknown
+    """
+    if id_format == "ulid":
+        return new_ulid()
+    if id_format == "uuid4":
+        return str(uuid.uuid4())
+    raise ValueError(f"Unknown ID format {id_format!r}; expected one of {ID_FORMATS}")
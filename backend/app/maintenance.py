@@ -0,0 +1,169 @@
+"""
+Routine database maintenance
+
+run_maintenance performs, for one database file:
+
+    optimize            ANALYZE on a never-analyzed file, PRAGMA optimize afterwards,
+                        so planner statistics follow the data
+    fts_optimize        merge the b-trees of every FTS5 index into one
+    incremental_vacuum  return free pages to the file system in short steps
+                        (needs auto_vacuum=INCREMENTAL, see DB_AUTO_VACUUM)
+    wal_checkpoint      checkpoint and truncate the WAL without waiting on readers
+
+Each task is recorded in the file's maintenance_runs table with its
+duration and the number of bytes it gave back (pages released by the
+vacuum, WAL bytes truncated by the checkpoint; in WAL mode the main file
+itself only shrinks once the checkpoint has run). Maintenance uses its own
+connection so pooled connections keep their settings.
+"""
+import json
+import logging
+import os
+import sqlite3
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, List
+
+from app.config import get_settings
+from app.database import db
+from app.fts import fts_tables
+
+settings = get_settings()
+
+logger = logging.getLogger(__name__)
+
+# Rows sampled per index by ANALYZE / PRAGMA optimize, as recommended by SQLite
+ANALYSIS_LIMIT = 400
+# Pause between incremental vacuum steps so queued writers get the lock
+VACUUM_STEP_PAUSE_SECONDS = 0.01
+MAINTENANCE_HISTORY_DAYS = 30
+
+AUTO_VACUUM_INCREMENTAL = 2
+
+
+def _file_size(path: str) -> int:
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
+
+
+def _optimize(conn: sqlite3.Connection) -> Dict[str, Any]:
+    conn.execute(f"PRAGMA analysis_limit = {ANALYSIS_LIMIT}")
+    analyzed = conn.execute("""
+        SELECT 1 FROM sqlite_master
+        WHERE type = 'table' AND name = 'sqlite_stat1'
+    """).fetchone()
+    if analyzed is None:
+        conn.execute("ANALYZE")
+        return {"mode": "analyze"}
+    conn.execute("PRAGMA optimize")
+    return {"mode": "optimize"}
+
+
+def _fts_optimize(conn: sqlite3.Connection) -> Dict[str, Any]:
+    tables = fts_tables(conn)
+    for table in tables:
+        conn.execute(f"INSERT INTO {table}({table}) VALUES ('optimize')")
+    return {"tables": tables}
+
+
+def _incremental_vacuum(conn: sqlite3.Connection) -> Dict[str, Any]:
+    page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+    free_pages = conn.execute("PRAGMA freelist_count").fetchone()[0]
+    if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != AUTO_VACUUM_INCREMENTAL:
+        # Switching an existing file over needs a full VACUUM (scripts/db_maintenance.py --vacuum)
+        return {"skipped": "auto_vacuum is not INCREMENTAL", "free_bytes": free_pages * page_size}
+
+    steps = 0
+    step_pages = max(1, settings.maintenance_vacuum_pages)
+    while conn.execute("PRAGMA freelist_count").fetchone()[0] > 0:
+        # execute() steps this row-less pragma only once (one page); executescript runs it to the end
+        conn.executescript(f"PRAGMA incremental_vacuum({step_pages})")
+        steps += 1
+        time.sleep(VACUUM_STEP_PAUSE_SECONDS)
+    return {"free_pages": free_pages, "steps": steps, "reclaimed_bytes": free_pages * page_size}
+
+
+def _wal_checkpoint(conn: sqlite3.Connection) -> Dict[str, Any]:
+    wal_path = conn.execute("PRAGMA database_list").fetchone()["file"] + "-wal"
+    wal_size = _file_size(wal_path)
+    # TRUNCATE would hold off new writers while waiting for readers; give up instead
+    conn.execute("PRAGMA busy_timeout = 0")
+    try:
+        busy, log_frames, checkpointed = conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchone()
+    finally:
+        conn.execute(f"PRAGMA busy_timeout = {int(settings.db_busy_timeout_ms)}")
+    return {
+        "busy": bool(busy),
+        "log_frames": log_frames,
+        "checkpointed_frames": checkpointed,
+        "reclaimed_bytes": max(0, wal_size - _file_size(wal_path))
+    }
+
+
+# Run in this order: merging FTS segments frees pages for the vacuum, whose
+# writes the checkpoint then folds back into the main file
+TASKS = [
+    ("optimize", _optimize),
+    ("fts_optimize", _fts_optimize),
+    ("incremental_vacuum", _incremental_vacuum),
+    ("wal_checkpoint", _wal_checkpoint),
+]
+
+
+def run_maintenance(store) -> List[Dict[str, Any]]:
+    """Run every maintenance task on one database file and record the results"""
+    conn = store.pool.open_connection()
+    conn.isolation_level = None
+    results = []
+    try:
+        for task, fn in TASKS:
+            started_at = datetime.utcnow()
+            started = time.perf_counter()
+            try:
+                details = fn(conn)
+            except sqlite3.Error as e:
+                logger.error(f"Maintenance task {task} failed on {store.db_path}: {str(e)}")
+                details = {"error": str(e)}
+            results.append({
+                "task": task,
+                "started_at": started_at,
+                "duration_ms": round((time.perf_counter() - started) * 1000, 2),
+                "reclaimed_bytes": details.pop("reclaimed_bytes", 0),
+                "details": details
+            })
+
+        conn.executemany("""
+            INSERT INTO maintenance_runs (task, started_at, duration_ms, reclaimed_bytes, details)
+            VALUES (?, ?, ?, ?, ?)
+        """, [
+            (r["task"], r["started_at"], r["duration_ms"], r["reclaimed_bytes"], json.dumps(r["details"]))
+            for r in results
+        ])
+        conn.execute("""
+            DELETE FROM maintenance_runs
+            WHERE started_at < ?
+        """, (datetime.utcnow() - timedelta(days=MAINTENANCE_HISTORY_DAYS),))
+    finally:
+        conn.close()
+    return results
+
+
+def recent_runs(conn: sqlite3.Connection, limit: int) -> List[Dict[str, Any]]:
+    """Latest recorded maintenance tasks of one database, newest first"""
+    rows = conn.execute("""
+        SELECT task, started_at, duration_ms, reclaimed_bytes, details
+        FROM maintenance_runs
+        ORDER BY started_at DESC
+        LIMIT ?
+    """, (limit,)).fetchall()
+    return [{**dict(row), "details": json.loads(row["details"] or "{}")} for row in rows]
+
+
+async def maintain_all_databases() -> Dict[str, List[Dict[str, Any]]]:
+    """Maintain the catalog and every shard, one file at a time; results keyed by file"""
+    results = {}
+    for store in db.all_databases():
+        results[os.path.basename(store.db_path)] = await store.run_in_executor(run_maintenance, store)
+    return results
@@ -0,0 +1,591 @@
+"""
+Versioned schema migrations
+
+Database.init_db creates the original (version 0) tables; everything after
+that is a numbered forward migration listed in MIGRATIONS. Each migration
+runs in its own BEGIN IMMEDIATE transaction together with its
+schema_version row, so a migration is either fully applied or not at all
+and concurrent workers starting up at once apply it only once.
+
+A migration step is either a SQL statement or a callable taking the raw
+sqlite3 connection.
+"""
+import sqlite3
+import logging
+from datetime import datetime
+from typing import Callable, List, Tuple, Union
+
+logger = logging.getLogger(__name__)
+
+Step = Union[str, Callable[[sqlite3.Connection], None]]
+
+# Characters of the latest message kept on conversations.last_message_preview
+MESSAGE_PREVIEW_LENGTH = 100
+
+
+def _resolved_content(alias: str) -> str:
+    """SQL expression for a row's body, following content_hash into content_blobs"""
+    return f"COALESCE((SELECT content FROM content_blobs WHERE hash = {alias}.content_hash), {alias}.content)"
+
+
+def _fts_index(table: str, alias: str, columns: List[Tuple[str, str]], update_of: str) -> List[str]:
+    """
+    External-content FTS5 index {table}_fts over fts_tokens() of each
+    (column, SQL expression over `alias`) pair, with the view it reads and the
+    triggers keeping it in step with table; fts_tokens is registered by app.fts
+    """
+    def values(row: str) -> str:
+        return ", ".join(f"fts_tokens({expr.format(row=row)})" for _, expr in columns)
+
+    names = ", ".join(name for name, _ in columns)
+    return [
+        f"""
+        CREATE VIEW IF NOT EXISTS {table}_fts_source AS
+        SELECT {alias}.rowid AS source_rowid, {", ".join(
+            f"fts_tokens({expr.format(row=alias)}) AS {name}" for name, expr in columns
+        )}
+        FROM {table} {alias}
+        """,
+        f"""
+        CREATE VIRTUAL TABLE IF NOT EXISTS {table}_fts USING fts5(
+            {names},
+            content='{table}_fts_source', content_rowid='source_rowid',
+            tokenize='unicode61'
+        )
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_{table}_fts_insert
+        AFTER INSERT ON {table}
+        BEGIN
+            INSERT INTO {table}_fts (rowid, {names})
+            VALUES (NEW.rowid, {values("NEW")});
+        END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_{table}_fts_delete
+        AFTER DELETE ON {table}
+        BEGIN
+            INSERT INTO {table}_fts ({table}_fts, rowid, {names})
+            VALUES ('delete', OLD.rowid, {values("OLD")});
+        END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_{table}_fts_update
+        AFTER UPDATE OF {update_of} ON {table}
+        BEGIN
+            INSERT INTO {table}_fts ({table}_fts, rowid, {names})
+            VALUES ('delete', OLD.rowid, {values("OLD")});
+            INSERT INTO {table}_fts (rowid, {names})
+            VALUES (NEW.rowid, {values("NEW")});
+        END
+        """,
+        f"INSERT INTO {table}_fts ({table}_fts) VALUES ('rebuild')",
+    ]
+
+
+def _drop_fts_index(table: str) -> List[str]:
+    return [
+        f"DROP TRIGGER IF EXISTS trg_{table}_fts_insert",
+        f"DROP TRIGGER IF EXISTS trg_{table}_fts_delete",
+        f"DROP TRIGGER IF EXISTS trg_{table}_fts_update",
+        f"DROP TABLE IF EXISTS {table}_fts",
+        f"DROP VIEW IF EXISTS {table}_fts_source",
+    ]
+
+
+def _blob_refcount_triggers(table: str) -> List[str]:
+    """Triggers keeping content_blobs.refcount in step with table.content_hash"""
+    return [
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_{table}_blob_insert
+        AFTER INSERT ON {table}
+        WHEN NEW.content_hash IS NOT NULL
+        BEGIN
+            UPDATE content_blobs SET refcount = refcount + 1 WHERE hash = NEW.content_hash;
+        END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_{table}_blob_delete
+        AFTER DELETE ON {table}
+        WHEN OLD.content_hash IS NOT NULL
+        BEGIN
+            UPDATE content_blobs SET refcount = refcount - 1 WHERE hash = OLD.content_hash;
+        END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_{table}_blob_update
+        AFTER UPDATE OF content_hash ON {table}
+        WHEN OLD.content_hash IS NOT NEW.content_hash
+        BEGIN
+            UPDATE content_blobs SET refcount = refcount - 1 WHERE hash = OLD.content_hash;
+            UPDATE content_blobs SET refcount = refcount + 1 WHERE hash = NEW.content_hash;
+        END
+        """,
+    ]
+
+
+MIGRATIONS: List[Tuple[int, str, List[Step]]] = [
+    (1, "Add hot-path indexes", [
+        "CREATE INDEX IF NOT EXISTS idx_document_tags_document_id ON document_tags(document_id)",
+        "CREATE INDEX IF NOT EXISTS idx_document_tags_tag_name ON document_tags(tag_name)",
+        "CREATE INDEX IF NOT EXISTS idx_email_notifications_task_created ON email_notifications(task_id, created_at)",
+        "CREATE INDEX IF NOT EXISTS idx_messages_conversation_created ON messages(conversation_id, created_at)",
+        "CREATE INDEX IF NOT EXISTS idx_tasks_user_status_due ON tasks(user_id, status, due_date)",
+        # Both are left prefixes of the composite indexes above
+        "DROP INDEX IF EXISTS idx_messages_conversation_id",
+        "DROP INDEX IF EXISTS idx_tasks_user_id",
+    ]),
+    (2, "Cover list ordering and lookups flagged by the query-plan check", [
+        "CREATE INDEX IF NOT EXISTS idx_conversations_user_updated ON conversations(user_id, updated_at)",
+        "CREATE INDEX IF NOT EXISTS idx_documents_user_updated ON documents(user_id, updated_at)",
+        "CREATE INDEX IF NOT EXISTS idx_documents_user_created ON documents(user_id, created_at)",
+        "CREATE INDEX IF NOT EXISTS idx_tasks_user_due ON tasks(user_id, due_date)",
+        "CREATE INDEX IF NOT EXISTS idx_tasks_status_due ON tasks(status, due_date)",
+        "CREATE INDEX IF NOT EXISTS idx_user_settings_user_id ON user_settings(user_id)",
+        "DROP INDEX IF EXISTS idx_conversations_user_id",
+        "DROP INDEX IF EXISTS idx_documents_user_id",
+        "DROP INDEX IF EXISTS idx_tasks_due_date",
+    ]),
+    (3, "Denormalize message count and last message onto conversations", [
+        "ALTER TABLE conversations ADD COLUMN message_count INTEGER NOT NULL DEFAULT 0",
+        "ALTER TABLE conversations ADD COLUMN last_message_at TIMESTAMP",
+        "ALTER TABLE conversations ADD COLUMN last_message_preview TEXT",
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_messages_count_insert
+        AFTER INSERT ON messages
+        BEGIN
+            UPDATE conversations SET
+                message_count = message_count + 1,
+                last_message_at = CASE
+                    WHEN last_message_at IS NULL OR NEW.created_at >= last_message_at
+                    THEN NEW.created_at ELSE last_message_at END,
+                last_message_preview = CASE
+                    WHEN last_message_at IS NULL OR NEW.created_at >= last_message_at
+                    THEN substr(NEW.content, 1, {MESSAGE_PREVIEW_LENGTH}) ELSE last_message_preview END
+            WHERE conversation_id = NEW.conversation_id;
+        END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_messages_count_delete
+        AFTER DELETE ON messages
+        BEGIN
+            UPDATE conversations SET
+                message_count = message_count - 1,
+                last_message_at = (
+                    SELECT created_at FROM messages
+                    WHERE conversation_id = OLD.conversation_id
+                    ORDER BY created_at DESC LIMIT 1
+                ),
+                last_message_preview = (
+                    SELECT substr(content, 1, {MESSAGE_PREVIEW_LENGTH}) FROM messages
+                    WHERE conversation_id = OLD.conversation_id
+                    ORDER BY created_at DESC LIMIT 1
+                )
+            WHERE conversation_id = OLD.conversation_id;
+        END
+        """,
+        f"""
+        UPDATE conversations SET
+            message_count = (
+                SELECT COUNT(*) FROM messages
+                WHERE conversation_id = conversations.conversation_id
+            ),
+            last_message_at = (
+                SELECT created_at FROM messages
+                WHERE conversation_id = conversations.conversation_id
+                ORDER BY created_at DESC LIMIT 1
+            ),
+            last_message_preview = (
+                SELECT substr(content, 1, {MESSAGE_PREVIEW_LENGTH}) FROM messages
+                WHERE conversation_id = conversations.conversation_id
+                ORDER BY created_at DESC LIMIT 1
+            )
+        """,
+    ]),
+    (4, "Record storage layout", [
+        """
+        CREATE TABLE IF NOT EXISTS storage_meta (
+            key TEXT PRIMARY KEY,
+            value TEXT NOT NULL
+        )
+        """,
+    ]),
+    (5, "Archive tier for idle conversations", [
+        "ALTER TABLE conversations ADD COLUMN archived_at TIMESTAMP",
+        """
+        CREATE TABLE IF NOT EXISTS conversation_archives (
+            conversation_id TEXT PRIMARY KEY,
+            message_count INTEGER NOT NULL,
+            raw_size INTEGER NOT NULL,
+            payload BLOB NOT NULL,
+            archived_at TIMESTAMP NOT NULL,
+            FOREIGN KEY (conversation_id) REFERENCES conversations(conversation_id)
+        )
+        """,
+        # Only hot conversations are archive candidates
+        "CREATE INDEX IF NOT EXISTS idx_conversations_archivable ON conversations(updated_at) WHERE archived_at IS NULL",
+    ]),
+    (6, "Content-addressed store for large bodies", [
+        "ALTER TABLE messages ADD COLUMN content_hash TEXT",
+        "ALTER TABLE documents ADD COLUMN content_hash TEXT",
+        """
+        CREATE TABLE IF NOT EXISTS content_blobs (
+            hash TEXT PRIMARY KEY,
+            content TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            refcount INTEGER NOT NULL DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_content_blobs_garbage ON content_blobs(refcount) WHERE refcount <= 0",
+        *_blob_refcount_triggers("messages"),
+        *_blob_refcount_triggers("documents"),
+        # The last-message preview must come from the blob for deduplicated messages
+        "DROP TRIGGER IF EXISTS trg_messages_count_insert",
+        "DROP TRIGGER IF EXISTS trg_messages_count_delete",
+        f"""
+        CREATE TRIGGER trg_messages_count_insert
+        AFTER INSERT ON messages
+        BEGIN
+            UPDATE conversations SET
+                message_count = message_count + 1,
+                last_message_at = CASE
+                    WHEN last_message_at IS NULL OR NEW.created_at >= last_message_at
+                    THEN NEW.created_at ELSE last_message_at END,
+                last_message_preview = CASE
+                    WHEN last_message_at IS NULL OR NEW.created_at >= last_message_at
+                    THEN substr(COALESCE(
+                        (SELECT content FROM content_blobs WHERE hash = NEW.content_hash), NEW.content
+                    ), 1, {MESSAGE_PREVIEW_LENGTH})
+                    ELSE last_message_preview END
+            WHERE conversation_id = NEW.conversation_id;
+        END
+        """,
+        f"""
+        CREATE TRIGGER trg_messages_count_delete
+        AFTER DELETE ON messages
+        BEGIN
+            UPDATE conversations SET
+                message_count = message_count - 1,
+                last_message_at = (
+                    SELECT created_at FROM messages
+                    WHERE conversation_id = OLD.conversation_id
+                    ORDER BY created_at DESC LIMIT 1
+                ),
+                last_message_preview = (
+                    SELECT substr(COALESCE(
+                        (SELECT content FROM content_blobs b WHERE b.hash = m.content_hash), m.content
+                    ), 1, {MESSAGE_PREVIEW_LENGTH})
+                    FROM messages m
+                    WHERE m.conversation_id = OLD.conversation_id
+                    ORDER BY m.created_at DESC LIMIT 1
+                )
+            WHERE conversation_id = OLD.conversation_id;
+        END
+        """,
+    ]),
+    (7, "Record database maintenance runs", [
+        """
+        CREATE TABLE IF NOT EXISTS maintenance_runs (
+            run_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            task TEXT NOT NULL,
+            started_at TIMESTAMP NOT NULL,
+            duration_ms REAL NOT NULL,
+            reclaimed_bytes INTEGER NOT NULL DEFAULT 0,
+            details TEXT
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_maintenance_runs_started_at ON maintenance_runs(started_at)",
+    ]),
+    (8, "Soft delete for conversations, documents and tasks", [
+        "ALTER TABLE conversations ADD COLUMN deleted_at TIMESTAMP",
+        "ALTER TABLE documents ADD COLUMN deleted_at TIMESTAMP",
+        "ALTER TABLE tasks ADD COLUMN deleted_at TIMESTAMP",
+        # The purger's work queues; live rows are not indexed
+        "CREATE INDEX IF NOT EXISTS idx_conversations_deleted ON conversations(deleted_at) WHERE deleted_at IS NOT NULL",
+        "CREATE INDEX IF NOT EXISTS idx_documents_deleted ON documents(deleted_at) WHERE deleted_at IS NOT NULL",
+        "CREATE INDEX IF NOT EXISTS idx_tasks_deleted ON tasks(deleted_at) WHERE deleted_at IS NOT NULL",
+    ]),
+    (9, "Full-text index over document titles, summaries and bodies", [
+        # External content for the index, with deduplicated bodies resolved
+        f"""
+        CREATE VIEW IF NOT EXISTS documents_fts_source AS
+        SELECT d.rowid AS doc_rowid, d.title, d.summary, {_resolved_content("d")} AS content
+        FROM documents d
+        """,
+        """
+        CREATE VIRTUAL TABLE IF NOT EXISTS documents_fts USING fts5(
+            title, summary, content,
+            content='documents_fts_source', content_rowid='doc_rowid',
+            tokenize='trigram'
+        )
+        """,
+        # Ranking used by ORDER BY rank: bm25 with a title hit counting most, then the summary
+        "INSERT INTO documents_fts (documents_fts, rank) VALUES ('rank', 'bm25(10.0, 5.0, 1.0)')",
+        # Blobs are only garbage-collected later, so OLD.content_hash still resolves here
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_documents_fts_insert
+        AFTER INSERT ON documents
+        BEGIN
+            INSERT INTO documents_fts (rowid, title, summary, content)
+            VALUES (NEW.rowid, NEW.title, NEW.summary, {_resolved_content("NEW")});
+        END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_documents_fts_delete
+        AFTER DELETE ON documents
+        BEGIN
+            INSERT INTO documents_fts (documents_fts, rowid, title, summary, content)
+            VALUES ('delete', OLD.rowid, OLD.title, OLD.summary, {_resolved_content("OLD")});
+        END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_documents_fts_update
+        AFTER UPDATE OF title, summary, content, content_hash ON documents
+        BEGIN
+            INSERT INTO documents_fts (documents_fts, rowid, title, summary, content)
+            VALUES ('delete', OLD.rowid, OLD.title, OLD.summary, {_resolved_content("OLD")});
+            INSERT INTO documents_fts (rowid, title, summary, content)
+            VALUES (NEW.rowid, NEW.title, NEW.summary, {_resolved_content("NEW")});
+        END
+        """,
+        "INSERT INTO documents_fts (documents_fts) VALUES ('rebuild')",
+    ]),
+    (10, "Full-text index over message content", [
+        # Archived messages leave the messages table and with it the index
+        f"""
+        CREATE VIEW IF NOT EXISTS messages_fts_source AS
+        SELECT m.rowid AS message_rowid, {_resolved_content("m")} AS content
+        FROM messages m
+        """,
+        """
+        CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5(
+            content,
+            content='messages_fts_source', content_rowid='message_rowid',
+            tokenize='trigram'
+        )
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_messages_fts_insert
+        AFTER INSERT ON messages
+        BEGIN
+            INSERT INTO messages_fts (rowid, content)
+            VALUES (NEW.rowid, {_resolved_content("NEW")});
+        END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_messages_fts_delete
+        AFTER DELETE ON messages
+        BEGIN
+            INSERT INTO messages_fts (messages_fts, rowid, content)
+            VALUES ('delete', OLD.rowid, {_resolved_content("OLD")});
+        END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_messages_fts_update
+        AFTER UPDATE OF content, content_hash ON messages
+        BEGIN
+            INSERT INTO messages_fts (messages_fts, rowid, content)
+            VALUES ('delete', OLD.rowid, {_resolved_content("OLD")});
+            INSERT INTO messages_fts (rowid, content)
+            VALUES (NEW.rowid, {_resolved_content("NEW")});
+        END
+        """,
+        "INSERT INTO messages_fts (messages_fts) VALUES ('rebuild')",
+    ]),
+    (11, "CJK bigram full-text indexes for documents, messages and conversation titles", [
+        # Trigram missed two-character words; index fts_tokens() output instead
+        *_drop_fts_index("documents"),
+        *_drop_fts_index("messages"),
+        *_fts_index("documents", "d", [
+            ("title", "{row}.title"),
+            ("summary", "{row}.summary"),
+            ("content", _resolved_content("{row}")),
+        ], "title, summary, content, content_hash"),
+        # Ranking used by ORDER BY rank: bm25 with a title hit counting most, then the summary
+        "INSERT INTO documents_fts (documents_fts, rank) VALUES ('rank', 'bm25(10.0, 5.0, 1.0)')",
+        *_fts_index("messages", "m", [
+            ("content", _resolved_content("{row}")),
+        ], "content, content_hash"),
+        *_fts_index("conversations", "c", [
+            ("title", "{row}.title"),
+        ], "title"),
+    ]),
+    (12, "Document vectors for related-document and semantic search", [
+        """
+        CREATE TABLE IF NOT EXISTS document_vectors (
+            document_id TEXT PRIMARY KEY,
+            source_updated_at TIMESTAMP NOT NULL,
+            vector BLOB NOT NULL,
+            FOREIGN KEY (document_id) REFERENCES documents(document_id)
+        )
+        """,
+    ]),
+    (13, "Per-user tag counts for the tag facet", [
+        # Live documents carrying each tag; a tag listed twice on one document counts once
+        """
+        CREATE TABLE IF NOT EXISTS tag_counts (
+            user_id TEXT NOT NULL,
+            tag_name TEXT NOT NULL,
+            document_count INTEGER NOT NULL,
+            PRIMARY KEY (user_id, tag_name)
+        ) WITHOUT ROWID
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_tag_counts_user_count ON tag_counts(user_id, document_count DESC, tag_name)",
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_document_tags_count_insert
+        AFTER INSERT ON document_tags
+        WHEN NOT EXISTS (
+            SELECT 1 FROM document_tags
+            WHERE document_id = NEW.document_id AND tag_name = NEW.tag_name AND tag_id != NEW.tag_id
+        )
+        BEGIN
+            INSERT INTO tag_counts (user_id, tag_name, document_count)
+            SELECT user_id, NEW.tag_name, 1 FROM documents
+            WHERE document_id = NEW.document_id AND deleted_at IS NULL
+            ON CONFLICT(user_id, tag_name) DO UPDATE SET document_count = document_count + 1;
+        END
+        """,
+        # Tags of soft-deleted documents were already uncounted, so the purger changes nothing
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_document_tags_count_delete
+        AFTER DELETE ON document_tags
+        WHEN NOT EXISTS (
+            SELECT 1 FROM document_tags
+            WHERE document_id = OLD.document_id AND tag_name = OLD.tag_name
+        )
+        BEGIN
+            UPDATE tag_counts SET document_count = document_count - 1
+            WHERE tag_name = OLD.tag_name AND user_id = (
+                SELECT user_id FROM documents
+                WHERE document_id = OLD.document_id AND deleted_at IS NULL
+            );
+            DELETE FROM tag_counts
+            WHERE tag_name = OLD.tag_name AND document_count <= 0 AND user_id = (
+                SELECT user_id FROM documents
+                WHERE document_id = OLD.document_id AND deleted_at IS NULL
+            );
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_documents_tag_counts_delete
+        AFTER UPDATE OF deleted_at ON documents
+        WHEN OLD.deleted_at IS NULL AND NEW.deleted_at IS NOT NULL
+        BEGIN
+            UPDATE tag_counts SET document_count = document_count - 1
+            WHERE user_id = NEW.user_id AND tag_name IN (
+                SELECT tag_name FROM document_tags WHERE document_id = NEW.document_id
+            );
+            DELETE FROM tag_counts
+            WHERE user_id = NEW.user_id AND document_count <= 0 AND tag_name IN (
+                SELECT tag_name FROM document_tags WHERE document_id = NEW.document_id
+            );
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_documents_tag_counts_restore
+        AFTER UPDATE OF deleted_at ON documents
+        WHEN OLD.deleted_at IS NOT NULL AND NEW.deleted_at IS NULL
+        BEGIN
+            INSERT INTO tag_counts (user_id, tag_name, document_count)
+            SELECT DISTINCT NEW.user_id, tag_name, 1 FROM document_tags
+            WHERE document_id = NEW.document_id
+            ON CONFLICT(user_id, tag_name) DO UPDATE SET document_count = document_count + 1;
+        END
+        """,
+        """
+        INSERT INTO tag_counts (user_id, tag_name, document_count)
+        SELECT d.user_id, t.tag_name, COUNT(DISTINCT d.document_id)
+        FROM document_tags t
+        JOIN documents d ON d.document_id = t.document_id
+        WHERE d.deleted_at IS NULL
+        GROUP BY d.user_id, t.tag_name
+        ON CONFLICT(user_id, tag_name) DO NOTHING
+        """,
+    ]),
+    (14, "Full-text index for tasks", [
+        *_fts_index("tasks", "t", [
+            ("title", "{row}.title"),
+            ("description", "{row}.description"),
+        ], "title, description"),
+        "INSERT INTO tasks_fts (tasks_fts, rank) VALUES ('rank', 'bm25(5.0, 1.0)')",
+    ]),
+    (15, "MinHash signatures and LSH buckets for near-duplicate documents", [
+        # signature is NULL for documents without any text to compare
+        """
+        CREATE TABLE IF NOT EXISTS document_minhash (
+            document_id TEXT PRIMARY KEY,
+            source_updated_at TIMESTAMP NOT NULL,
+            signature BLOB,
+            FOREIGN KEY (document_id) REFERENCES documents(document_id)
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS document_lsh_buckets (
+            user_id TEXT NOT NULL,
+            bucket INTEGER NOT NULL,
+            document_id TEXT NOT NULL,
+            FOREIGN KEY (document_id) REFERENCES documents(document_id)
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_document_lsh_buckets_user_bucket ON document_lsh_buckets(user_id, bucket, document_id)",
+        "CREATE INDEX IF NOT EXISTS idx_document_lsh_buckets_document ON document_lsh_buckets(document_id)",
+    ]),
+]
+
+
+def get_schema_version(conn: sqlite3.Connection) -> int:
+    """Return the highest applied migration version (0 if none)"""
+    row = conn.execute("SELECT MAX(version) FROM schema_version").fetchone()
+    return row[0] or 0
+
+
+def run_migrations(conn: sqlite3.Connection) -> int:
+    """
+    Apply all pending migrations
+
+    Returns:
+        int: Number of migrations applied
+    """
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            description TEXT NOT NULL,
+            applied_at TIMESTAMP NOT NULL
+        )
+    """)
+    conn.commit()
+
+    # Manage transactions explicitly so DDL and the version row commit together
+    isolation_level = conn.isolation_level
+    conn.isolation_level = None
+    applied = 0
+    try:
+        for version, description, steps in MIGRATIONS:
+            if version <= get_schema_version(conn):
+                continue
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                # Another worker may have applied it while we waited for the lock
+                if version <= get_schema_version(conn):
+                    conn.execute("ROLLBACK")
+                    continue
+                for step in steps:
+                    if callable(step):
+                        step(conn)
+                    else:
+                        conn.execute(step)
+                conn.execute("""
+                    INSERT INTO schema_version (version, description, applied_at)
+                    VALUES (?, ?, ?)
+                """, (version, description, datetime.utcnow()))
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                logger.error(f"Migration {version} ({description}) failed")
+                raise
+            applied += 1
+            logger.info(f"Applied migration {version}: {description}")
+    finally:
+        conn.isolation_level = isolation_level
+    return applied
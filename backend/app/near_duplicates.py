@@ -0,0 +1,262 @@
+"""
+Near-duplicate detection for documents with MinHash and LSH
+
+A document's body is reduced to its set of shingles: every run of
+SHINGLE_TOKENS consecutive fts_tokens() terms (Chinese bigrams and
+lower-cased words, see app/fts.py). Its MinHash signature holds, for each
+of minhash_permutations hash functions, the smallest hash of any shingle;
+the share of positions two signatures agree on estimates the Jaccard
+similarity of the two shingle sets. Signatures are stored as uint32 blobs
+in `document_minhash`, next to the updated_at of the row they were
+computed from.
+
+To find candidates without comparing against every document, each
+signature is cut into minhash_bands bands, and every band is hashed into
+one bucket number stored in `document_lsh_buckets` (indexed by user and
+bucket). Two documents share a bucket with high probability when their
+similarity is well above (1 / bands) ** (1 / rows per band), about 0.5 with
+the defaults, and rarely when it is below, so a lookup reads a few index
+entries per band and only candidates get their signatures compared against
+duplicate_threshold.
+
+Create, update and organize refresh the signature of the document they
+write. Documents written otherwise (workspace import, rows older than
+migration 15) are picked up by backfill_signatures, which the duplicates
+listing runs first.
+
+The functions take a raw sqlite3 connection and are meant to run on the
+database executor, via AsyncConnection.run or Database.run.
+"""
+import json
+import sqlite3
+import zlib
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.config import get_settings
+from app.fts import index_text
+
+settings = get_settings()
+
+PERMUTATIONS = settings.minhash_permutations
+BANDS = settings.minhash_bands
+ROWS_PER_BAND = PERMUTATIONS // BANDS
+# Estimated Jaccard similarity from which two documents count as near-duplicates
+DUPLICATE_THRESHOLD = settings.duplicate_threshold
+# Consecutive terms per shingle
+SHINGLE_TOKENS = 3
+# Shingle hashes processed at once (bounds the temporary shingles x permutations array)
+HASH_CHUNK = 4096
+
+# Universal hashing (a * x + b) mod p with fixed coefficients, so signatures are stable across processes
+MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_generator = np.random.RandomState(20240611)
+_A = _generator.randint(1, 1 << 32, size=PERMUTATIONS, dtype=np.uint64)
+_B = _generator.randint(0, 1 << 32, size=PERMUTATIONS, dtype=np.uint64)
+SIGNATURE_DTYPE = np.uint32
+
+# Documents of a user whose signature is missing, outdated or of another size
+# (parameters: user_id, signature size in bytes)
+STALE_DOCUMENTS = """
+    SELECT d.document_id
+    FROM documents d
+    LEFT JOIN document_minhash m ON m.document_id = d.document_id
+    WHERE d.user_id = ? AND d.deleted_at IS NULL
+      AND (m.document_id IS NULL
+           OR m.source_updated_at IS NOT d.updated_at
+           OR (m.signature IS NOT NULL AND length(m.signature) != ?))
+"""
+
+# Copies updated_at from the row so STALE_DOCUMENTS compares like with like;
+# documents without any shingle get a NULL signature and no buckets
+UPSERT_SIGNATURE = """
+    INSERT INTO document_minhash (document_id, source_updated_at, signature)
+    SELECT document_id, updated_at, ? FROM documents WHERE document_id = ?
+    ON CONFLICT(document_id) DO UPDATE SET
+        source_updated_at = excluded.source_updated_at,
+        signature = excluded.signature
+"""
+
+# Live documents sharing a bucket with a signature, once per shared band
+# (parameters: JSON array of buckets, user_id, document_id to leave out);
+# CROSS JOIN probes the bucket index once per bucket instead of walking the
+# user's documents
+CANDIDATES = """
+    SELECT d.document_id, d.title, m.signature
+    FROM json_each(?) AS probe
+    CROSS JOIN document_lsh_buckets b ON b.user_id = ? AND b.bucket = probe.value
+    CROSS JOIN documents d ON d.document_id = b.document_id
+    CROSS JOIN document_minhash m ON m.document_id = d.document_id
+    WHERE d.deleted_at IS NULL AND d.document_id != ?
+"""
+
+# Pairs of the user's documents sharing at least one bucket (the same pair once per shared band)
+CANDIDATE_PAIRS = """
+    SELECT a.document_id AS first_id, b.document_id AS second_id
+    FROM document_lsh_buckets a
+    JOIN document_lsh_buckets b
+      ON b.user_id = a.user_id AND b.bucket = a.bucket AND b.document_id > a.document_id
+    WHERE a.user_id = ?
+"""
+
+USER_SIGNATURES = """
+    SELECT d.document_id, d.title, d.updated_at, m.signature
+    FROM documents d
+    JOIN document_minhash m ON m.document_id = d.document_id
+    WHERE d.user_id = ? AND d.deleted_at IS NULL AND m.signature IS NOT NULL
+"""
+
+
+def shingle_hashes(text: Optional[str]) -> np.ndarray:
+    """CRC-32 of every distinct shingle of the text"""
+    tokens = (index_text(text) or "").lower().split()
+    if len(tokens) <= SHINGLE_TOKENS:
+        shingles = {" ".join(tokens)} if tokens else set()
+    else:
+        shingles = {" ".join(tokens[i:i + SHINGLE_TOKENS]) for i in range(len(tokens) - SHINGLE_TOKENS + 1)}
+    return np.fromiter((zlib.crc32(s.encode("utf-8")) for s in shingles), dtype=np.uint64, count=len(shingles))
+
+
+def signature(text: Optional[str]) -> Optional[np.ndarray]:
+    """MinHash signature of the text's shingles, or None if it has none"""
+    hashes = shingle_hashes(text)
+    if not len(hashes):
+        return None
+    minimum = np.full(PERMUTATIONS, np.iinfo(SIGNATURE_DTYPE).max, dtype=np.uint64)
+    for start in range(0, len(hashes), HASH_CHUNK):
+        chunk = hashes[start:start + HASH_CHUNK, None]
+        # uint64 products wrap around; still a fine hash family for MinHash
+        permuted = ((chunk * _A + _B) % MERSENNE_PRIME) & np.uint64(0xFFFFFFFF)
+        np.minimum(minimum, permuted.min(axis=0), out=minimum)
+    return minimum.astype(SIGNATURE_DTYPE)
+
+
+def buckets(sig: np.ndarray) -> List[int]:
+    """One bucket number per band: the band index in the high bits, a hash of its rows in the low 32"""
+    return [
+        (band << 32) | zlib.crc32(sig[band * ROWS_PER_BAND:(band + 1) * ROWS_PER_BAND].tobytes())
+        for band in range(BANDS)
+    ]
+
+
+def similarity(first: np.ndarray, second: np.ndarray) -> float:
+    """Estimated Jaccard similarity of two signatures"""
+    return float(np.count_nonzero(first == second)) / len(first)
+
+
+def _from_blob(blob: bytes) -> np.ndarray:
+    return np.frombuffer(blob, dtype=SIGNATURE_DTYPE)
+
+
+def refresh_signature(conn: sqlite3.Connection, user_id: str, document_id: str) -> Optional[np.ndarray]:
+    """Compute and store a user's document signature and buckets; None if it has none or does not exist"""
+    row = conn.execute("""
+        SELECT COALESCE((SELECT content FROM content_blobs WHERE hash = d.content_hash), d.content) AS content
+        FROM documents d
+        WHERE d.document_id = ? AND d.user_id = ? AND d.deleted_at IS NULL
+    """, (document_id, user_id)).fetchone()
+    if row is None:
+        return None
+    sig = signature(row["content"])
+    conn.execute(UPSERT_SIGNATURE, (sig.tobytes() if sig is not None else None, document_id))
+    conn.execute("DELETE FROM document_lsh_buckets WHERE document_id = ?", (document_id,))
+    if sig is not None:
+        conn.executemany("""
+            INSERT INTO document_lsh_buckets (user_id, bucket, document_id)
+            VALUES (?, ?, ?)
+        """, [(user_id, bucket, document_id) for bucket in buckets(sig)])
+    return sig
+
+
+def find_duplicates(
+    conn: sqlite3.Connection,
+    user_id: str,
+    document_id: str,
+    sig: Optional[np.ndarray],
+    threshold: float = DUPLICATE_THRESHOLD
+) -> List[Dict]:
+    """The user's other live documents estimated at least `threshold` similar to a signature, most similar first"""
+    if sig is None:
+        return []
+    rows = conn.execute(CANDIDATES, (json.dumps(buckets(sig)), user_id, document_id)).fetchall()
+    found = []
+    seen = set()
+    for row in rows:
+        if row["document_id"] in seen:
+            continue
+        seen.add(row["document_id"])
+        score = similarity(sig, _from_blob(row["signature"]))
+        if score >= threshold:
+            found.append({"document_id": row["document_id"], "title": row["title"], "similarity": score})
+    found.sort(key=lambda item: item["similarity"], reverse=True)
+    return found
+
+
+def backfill_signatures(conn: sqlite3.Connection, user_id: str) -> int:
+    """Sign the user's documents whose signature is missing or outdated; returns how many"""
+    stale = conn.execute(STALE_DOCUMENTS, (user_id, PERMUTATIONS * np.dtype(SIGNATURE_DTYPE).itemsize)).fetchall()
+    for row in stale:
+        refresh_signature(conn, user_id, row["document_id"])
+    return len(stale)
+
+
+def duplicate_groups(
+    conn: sqlite3.Connection, user_id: str, threshold: float = DUPLICATE_THRESHOLD
+) -> List[List[Dict]]:
+    """
+    The user's live documents grouped into sets of near-duplicates
+
+    Candidate pairs come from the shared buckets; pairs estimated at least
+    `threshold` similar are joined into groups (transitively). Each group
+    lists its newest document first, with every document's similarity to
+    it; groups are ordered by size, then by their newest update.
+    """
+    documents = {row["document_id"]: row for row in conn.execute(USER_SIGNATURES, (user_id,))}
+    signatures = {document_id: _from_blob(row["signature"]) for document_id, row in documents.items()}
+
+    parent: Dict[str, str] = {}
+
+    def root(document_id: str) -> str:
+        while parent.get(document_id, document_id) != document_id:
+            document_id = parent[document_id]
+        return document_id
+
+    checked = set()
+    for first_id, second_id in conn.execute(CANDIDATE_PAIRS, (user_id,)):
+        pair = (first_id, second_id)
+        if pair in checked or first_id not in signatures or second_id not in signatures:
+            continue
+        checked.add(pair)
+        if similarity(signatures[first_id], signatures[second_id]) >= threshold:
+            first_root, second_root = root(first_id), root(second_id)
+            if first_root != second_root:
+                parent[first_root] = second_root
+
+    members: Dict[str, List[str]] = {}
+    for document_id in parent:
+        members.setdefault(root(document_id), []).append(document_id)
+
+    groups = []
+    for ids in members.values():
+        ids = sorted(set(ids) | {root(ids[0])}, key=lambda i: str(documents[i]["updated_at"]), reverse=True)
+        newest = signatures[ids[0]]
+        groups.append([
+            {
+                "document_id": document_id,
+                "title": documents[document_id]["title"],
+                "updated_at": documents[document_id]["updated_at"],
+                "similarity": similarity(newest, signatures[document_id])
+            }
+            for document_id in ids
+        ])
+    groups.sort(key=lambda group: (len(group), str(group[0]["updated_at"])), reverse=True)
+    return groups
+
+
+def duplicate_report(
+    conn: sqlite3.Connection, user_id: str, threshold: float = DUPLICATE_THRESHOLD
+) -> Tuple[int, List[List[Dict]]]:
+    """Backfill missing signatures, then group; returns (documents signed now, groups)"""
+    signed = backfill_signatures(conn, user_id)
+    return signed, duplicate_groups(conn, user_id, threshold)
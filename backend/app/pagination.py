@@ -0,0 +1,60 @@
+"""
+Opaque cursors for keyset pagination
+
+A cursor records the sort key of the last row on a page (the ORDER BY value
+plus the SQLite rowid as a tie-breaker) and the listing it belongs to, so
+the next page can be fetched with an indexed range predicate such as
+`(updated_at, rowid) < (?, ?)` instead of an ever-growing OFFSET.
+"""
+import base64
+import json
+from typing import Any, List, Optional
+
+from fastapi import HTTPException, status
+
+
+def encode_cursor(kind: str, values: List[Any]) -> str:
+    """
+    Encode the sort key of a row as an opaque cursor
+
+    Args:
+        kind: Listing the cursor belongs to, e.g. "documents:updated_at"
+        values: Sort key values of the last row on the page
+    """
+    raw = json.dumps({"k": kind, "v": values}, ensure_ascii=False, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str, kind: str, size: int) -> List[Any]:
+    """
+    Decode a cursor produced by encode_cursor
+
+    Raises:
+        HTTPException: If the cursor is malformed or belongs to another listing
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")).decode("utf-8"))
+        values = data["v"]
+        if data["k"] != kind or not isinstance(values, list) or len(values) != size:
+            raise ValueError("cursor does not match this listing")
+        return values
+    except (ValueError, KeyError, TypeError, UnicodeError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor"
+        )
+
+
+def next_cursor(rows: List[Any], page_size: int, kind: str, *columns: str) -> Optional[str]:
+    """
+    Build the cursor for the page after `rows`
+
+    Expects the query to have fetched page_size + 1 rows; the extra row only
+    signals that another page exists and is removed from `rows` in place.
+    """
+    if len(rows) <= page_size:
+        return None
+    del rows[page_size:]
+    last = rows[-1]
+    return encode_cursor(kind, [last[column] for column in columns])
@@ -0,0 +1,93 @@
+"""
+Background purge of soft-deleted conversations, documents and tasks
+
+Delete endpoints only set deleted_at, which is a single-row write however
+many messages a conversation has. The purger then removes the child rows in
+transactions of at most purge_batch_size rows, pausing between batches so
+the group-commit writer and request handlers get the write lock in
+between, and deletes the parent row in the transaction that removes its
+last children. A message written to a conversation while it is being
+purged is simply picked up by the next batch.
+"""
+import asyncio
+import sqlite3
+from typing import Dict, List, Tuple
+
+# Let other writers in between two purge batches
+PURGE_BATCH_PAUSE_SECONDS = 0.01
+# Deleted parents picked up per table and run; the rest wait for the next run
+PURGE_PARENTS_PER_RUN = 100
+
+# (parent table, key column, [(child table, column referencing the key)])
+PURGE_PLAN = [
+    ("conversations", "conversation_id", [
+        ("messages", "conversation_id"),
+        ("conversation_archives", "conversation_id"),
+    ]),
+    ("documents", "document_id", [
+        ("document_tags", "document_id"),
+        ("document_vectors", "document_id"),
+        ("document_minhash", "document_id"),
+        ("document_lsh_buckets", "document_id"),
+    ]),
+    ("tasks", "task_id", [
+        ("email_notifications", "task_id"),
+    ]),
+]
+
+
+def purge_batch(
+    conn: sqlite3.Connection,
+    table: str,
+    key: str,
+    children: List[Tuple[str, str]],
+    parent_id: str,
+    batch_size: int
+) -> Tuple[int, bool]:
+    """
+    Delete up to batch_size child rows of one soft-deleted parent
+
+    Returns (child rows deleted, whether the parent itself is gone now).
+    """
+    deleted = 0
+    for child, column in children:
+        limit = batch_size - deleted
+        if limit <= 0:
+            return deleted, False
+        count = conn.execute(f"""
+            DELETE FROM {child}
+            WHERE rowid IN (SELECT rowid FROM {child} WHERE {column} = ? LIMIT ?)
+        """, (parent_id, limit)).rowcount
+        deleted += count
+        if count == limit:
+            # There may be more; finish this child table in the next batch
+            return deleted, False
+
+    # Every child table came up short, so nothing references the parent any more
+    conn.execute(f"""
+        DELETE FROM {table}
+        WHERE {key} = ? AND deleted_at IS NOT NULL
+    """, (parent_id,))
+    return deleted, True
+
+
+async def purge_deleted(store, batch_size: int) -> Dict[str, int]:
+    """Purge soft-deleted rows of one database; returns purged parents per table"""
+    purged = {}
+    for table, key, children in PURGE_PLAN:
+        async with store.connection() as conn:
+            rows = await conn.fetchall(f"""
+                SELECT {key} FROM {table}
+                WHERE deleted_at IS NOT NULL
+                ORDER BY deleted_at ASC
+                LIMIT ?
+            """, (PURGE_PARENTS_PER_RUN,))
+
+        purged[table] = 0
+        for row in rows:
+            done = False
+            while not done:
+                _, done = await store.run(purge_batch, table, key, children, row[key], batch_size)
+                await asyncio.sleep(PURGE_BATCH_PAUSE_SECONDS)
+            purged[table] += 1
+    return purged
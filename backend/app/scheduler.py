@@ -5,10 +5,19 @@ from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.interval import IntervalTrigger
 from datetime import datetime
 from typing import List, Dict
+import json
 import logging
 
+from app.archive import archive_idle_conversations
+from app.backup import backup_manager
+from app.config import get_settings
+from app.content_store import collect_garbage
 from app.database import db
 from app.email_service import email_service
+from app.maintenance import maintain_all_databases
+from app.purge import purge_deleted
+
+settings = get_settings()
 
 logger = logging.getLogger(__name__)
 
@@ -25,47 +34,164 @@ class TaskScheduler:
             name="Check due tasks and send reminders",
             replace_existing=True
         )
+        self.scheduler.add_job(
+            self.collect_content_garbage,
+            trigger=IntervalTrigger(hours=24),
+            id="collect_content_garbage",
+            name="Garbage-collect unreferenced content blobs",
+            replace_existing=True
+        )
+        self.scheduler.add_job(
+            self.purge_deleted_rows,
+            trigger=IntervalTrigger(minutes=max(1, settings.purge_interval_minutes)),
+            id="purge_deleted_rows",
+            name="Purge soft-deleted conversations, documents and tasks",
+            replace_existing=True
+        )
+        if settings.archive_after_days > 0:
+            self.scheduler.add_job(
+                self.archive_idle_conversations,
+                trigger=IntervalTrigger(hours=1),
+                id="archive_idle_conversations",
+                name="Move idle conversations to the archive tier",
+                replace_existing=True
+            )
+        if settings.maintenance_interval_hours > 0:
+            self.scheduler.add_job(
+                self.maintain_databases,
+                trigger=IntervalTrigger(hours=settings.maintenance_interval_hours),
+                id="maintain_databases",
+                name="Refresh statistics, vacuum free pages and checkpoint the WAL",
+                replace_existing=True
+            )
+        if settings.backup_interval_hours > 0:
+            self.scheduler.add_job(
+                self.backup_databases,
+                trigger=IntervalTrigger(hours=settings.backup_interval_hours),
+                id="backup_databases",
+                name="Snapshot the databases with the online backup API",
+                replace_existing=True
+            )
 
     async def check_due_tasks(self):
         """Check for due tasks and send reminders"""
         try:
-            with db.get_connection() as conn:
-                # Get tasks that are due and haven't had reminders sent
-                cursor = conn.execute("""
-                    SELECT
-                        t.task_id,
-                        t.title,
-                        t.description,
-                        t.due_date,
-                        t.reminder_email,
-                        t.user_id,
-                        u.email as user_email
-                    FROM tasks t
-                    JOIN users u ON t.user_id = u.user_id
-                    WHERE t.due_date <= ?
-                    AND t.status = 'pending'
-                    AND t.reminder_enabled = 1
-                    AND t.email_sent = 0
-                """, (datetime.utcnow(),))
-
-                due_tasks = cursor.fetchall()
-
-                for task in due_tasks:
-                    await self.send_task_reminder(dict(task))
-
-                # Mark overdue tasks
-                conn.execute("""
-                    UPDATE tasks
-                    SET status = 'overdue'
-                    WHERE due_date < ?
-                    AND status = 'pending'
-                """, (datetime.utcnow(),))
-
-                logger.info(f"Checked {len(due_tasks)} due tasks")
+            checked = 0
+            for store in db.all_shards():
+                checked += await self.check_shard_due_tasks(store)
+
+            logger.info(f"Checked {checked} due tasks")
 
         except Exception as e:
             logger.error(f"Error checking due tasks: {str(e)}")
 
+    async def check_shard_due_tasks(self, store) -> int:
+        """Send reminders for the due tasks stored in one database (shard)"""
+        async with store.connection() as conn:
+            # Get tasks that are due and haven't had reminders sent
+            cursor = await conn.execute("""
+                SELECT
+                    task_id,
+                    title,
+                    description,
+                    due_date,
+                    reminder_email,
+                    user_id
+                FROM tasks
+                WHERE due_date <= ?
+                AND status = 'pending'
+                AND reminder_enabled = 1
+                AND email_sent = 0
+                AND deleted_at IS NULL
+            """, (datetime.utcnow(),))
+
+            due_tasks = [dict(task) for task in await cursor.fetchall()]
+
+        if due_tasks:
+            # Users live in the global catalog, not necessarily next to their tasks
+            async with db.connection() as conn:
+                cursor = await conn.execute("""
+                    SELECT u.user_id, u.email
+                    FROM json_each(?) ids
+                    CROSS JOIN users u ON u.user_id = ids.value
+                """, (json.dumps(sorted({task["user_id"] for task in due_tasks})),))
+                emails = {row["user_id"]: row["email"] for row in await cursor.fetchall()}
+            for task in due_tasks:
+                task["user_email"] = emails.get(task["user_id"])
+
+        # Send reminders without holding a pooled connection during SMTP calls
+        for task in due_tasks:
+            await self.send_task_reminder(task)
+
+        async with store.connection() as conn:
+            # Mark overdue tasks
+            await conn.execute("""
+                UPDATE tasks
+                SET status = 'overdue'
+                WHERE due_date < ?
+                AND status = 'pending'
+            """, (datetime.utcnow(),))
+
+        return len(due_tasks)
+
+    async def archive_idle_conversations(self):
+        """Archive conversations idle for archive_after_days, in every shard"""
+        try:
+            archived = 0
+            for store in db.all_shards():
+                archived += await archive_idle_conversations(
+                    store, settings.archive_after_days, settings.archive_batch_size
+                )
+            if archived:
+                logger.info(f"Archived {archived} idle conversations")
+
+        except Exception as e:
+            logger.error(f"Error archiving conversations: {str(e)}")
+
+    async def purge_deleted_rows(self):
+        """Remove soft-deleted rows and their children in small batches, in every shard"""
+        try:
+            purged = {}
+            for store in db.all_shards():
+                for table, count in (await purge_deleted(store, settings.purge_batch_size)).items():
+                    purged[table] = purged.get(table, 0) + count
+            if any(purged.values()):
+                logger.info(f"Purged deleted rows: {purged}")
+
+        except Exception as e:
+            logger.error(f"Error purging deleted rows: {str(e)}")
+
+    async def collect_content_garbage(self):
+        """Delete content blobs no message or document references, in every shard"""
+        try:
+            removed = 0
+            for store in db.all_shards():
+                removed += await store.run(collect_garbage)
+            if removed:
+                logger.info(f"Removed {removed} unreferenced content blobs")
+
+        except Exception as e:
+            logger.error(f"Error collecting content blobs: {str(e)}")
+
+    async def maintain_databases(self):
+        """Run PRAGMA optimize, incremental vacuum and a WAL checkpoint on every database"""
+        try:
+            results = await maintain_all_databases()
+            reclaimed = sum(r["reclaimed_bytes"] for runs in results.values() for r in runs)
+            logger.info(f"Maintained {len(results)} databases, reclaimed {reclaimed} bytes")
+
+        except Exception as e:
+            logger.error(f"Error maintaining databases: {str(e)}")
+
+    async def backup_databases(self):
+        """Take a rotating online snapshot of the catalog and every shard"""
+        try:
+            if await backup_manager.run() is None:
+                logger.info("Skipped scheduled backup: a backup is already running")
+
+        except Exception as e:
+            logger.error(f"Error backing up databases: {str(e)}")
+
     async def send_task_reminder(self, task: Dict):
         """Send email reminder for a task"""
         try:
@@ -92,10 +218,10 @@ class TaskScheduler:
             )
 
             # Update task and record notification
-            with db.get_connection() as conn:
+            async with db.for_user(task["user_id"]).connection() as conn:
                 if success:
                     # Mark email as sent
-                    conn.execute("""
+                    await conn.execute("""
                         UPDATE tasks
                         SET email_sent = 1
                         WHERE task_id = ?
@@ -103,7 +229,7 @@ class TaskScheduler:
 
                     # Record notification
                     notification_id = db.generate_uuid()
-                    conn.execute("""
+                    await conn.execute("""
                         INSERT INTO email_notifications
                         (notification_id, task_id, recipient_email, status, sent_at)
                         VALUES (?, ?, ?, 'sent', ?)
@@ -113,7 +239,7 @@ class TaskScheduler:
                 else:
                     # Record failed notification
                     notification_id = db.generate_uuid()
-                    conn.execute("""
+                    await conn.execute("""
                         INSERT INTO email_notifications
                         (notification_id, task_id, recipient_email, status, error_message)
                         VALUES (?, ?, ?, 'failed', 'Failed to send email')
@@ -77,6 +77,8 @@ class ConversationResponse(BaseModel):
     created_at: datetime
     updated_at: datetime
     message_count: Optional[int] = 0
+    last_message_at: Optional[datetime] = None
+    last_message_preview: Optional[str] = None
 
 
 class ConversationDetail(ConversationResponse):
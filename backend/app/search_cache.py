@@ -0,0 +1,103 @@
+"""
+In-process cache for search and filtered-list results
+
+Entries are keyed by (user_id, data version, endpoint and normalized
+parameters). Every write to a user's documents bumps their version with
+invalidate(), which makes all their cached results unreachable at once
+without scanning the cache; the orphaned entries age out through the LRU
+order or their TTL.
+
+Callers take the key with key() *before* running the query and store the
+result under that key, so a write that commits while the query runs can
+never leave pre-write results behind under the new version. The cache is
+only used from the event loop and needs no locking.
+"""
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+from app.config import get_settings
+
+settings = get_settings()
+
+
+def normalize_query(text: Optional[str]) -> Optional[str]:
+    """Searches are case-insensitive and split on whitespace, so these spellings share an entry"""
+    if text is None:
+        return None
+    return " ".join(text.split()).lower()
+
+
+class SearchCache:
+    """LRU + TTL result cache with per-user version counters"""
+
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[Tuple, Tuple[float, Any]]" = OrderedDict()
+        self._versions: Dict[str, int] = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0 and self.ttl_seconds > 0
+
+    def key(self, user_id: str, *params: Hashable) -> Tuple:
+        return (user_id, self._versions.get(user_id, 0)) + params
+
+    def get(self, key: Tuple) -> Optional[Any]:
+        """Cached value for key, or None"""
+        if not self.enabled:
+            return None
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            self.expirations += 1
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key: Tuple, value: Any):
+        if not self.enabled:
+            return
+        self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, user_id: str):
+        """Make every cached result of the user stale (call after the write has committed)"""
+        self._versions[user_id] = self._versions.get(user_id, 0) + 1
+        self.invalidations += 1
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else None,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations,
+        }
+
+
+search_cache = SearchCache(
+    max_entries=settings.search_cache_max_entries,
+    ttl_seconds=settings.search_cache_ttl_seconds
+)
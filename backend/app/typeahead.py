@@ -0,0 +1,266 @@
+"""
+In-memory prefix index for autocompletion of titles and tags
+
+Each user's document titles, conversation titles and tag names are kept in
+three sorted lists of (key, id) pairs, where key is the lower-cased text
+with whitespace collapsed. A title is listed once for every word it
+contains (up to MAX_WORD_STARTS), keyed from that word to the end, so
+"Weekly planning notes" is found by "wee", "plan" and "notes". A lookup is
+one bisect to the first key >= the prefix followed by a walk over the keys
+that start with it, so it costs O(log n + limit) however many titles the
+user has, and never touches the database.
+
+A user's lists are loaded on their first lookup. Create, update and delete
+of documents and conversations (and generated conversation titles) update
+them in place; bulk writes (workspace import) drop them so the next lookup
+reloads. At most typeahead_cache_users users are kept in memory (least
+recently used are dropped). Everything except the load runs on the event
+loop, so no locking is needed.
+"""
+import asyncio
+import re
+import sqlite3
+from bisect import bisect_left, insort
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from app.config import get_settings
+from app.database import db
+
+settings = get_settings()
+
+KINDS = ("documents", "conversations", "tags")
+# Word starts of a title that are indexed (bounds the entries per title)
+MAX_WORD_STARTS = 8
+WORD_PATTERN = re.compile(r"\w+")
+
+USER_DOCUMENTS = """
+    SELECT document_id, title FROM documents
+    WHERE user_id = ? AND deleted_at IS NULL
+"""
+USER_DOCUMENT_TAGS = """
+    SELECT t.document_id, t.tag_name
+    FROM documents d
+    JOIN document_tags t ON t.document_id = d.document_id
+    WHERE d.user_id = ? AND d.deleted_at IS NULL
+"""
+USER_CONVERSATIONS = """
+    SELECT conversation_id, title FROM conversations
+    WHERE user_id = ? AND deleted_at IS NULL
+"""
+
+
+def normalize(text: str) -> str:
+    return " ".join(text.split()).lower()
+
+
+def prefix_key(query: str) -> str:
+    """Lookup key of what the user has typed; a trailing space only matches whole words"""
+    key = normalize(query)
+    return key + " " if key and query[-1:].isspace() else key
+
+
+def _title_keys(title: Optional[str]) -> List[str]:
+    """Keys a title is listed under: the title from each of its first words on"""
+    if not title:
+        return []
+    key = normalize(title)
+    starts = [m.start() for m in WORD_PATTERN.finditer(key)][:MAX_WORD_STARTS]
+    if not starts or starts[0] != 0:
+        starts.insert(0, 0)
+    return [key[start:] for start in starts]
+
+
+def _remove(entries: List[Tuple[str, str]], entry: Tuple[str, str]):
+    i = bisect_left(entries, entry)
+    if i < len(entries) and entries[i] == entry:
+        del entries[i]
+
+
+class UserTypeahead:
+    """One user's sorted key lists, plus what is needed to undo an entry on update"""
+
+    def __init__(self):
+        self.entries: Dict[str, List[Tuple[str, str]]] = {kind: [] for kind in KINDS}
+        self.titles: Dict[str, Dict[str, str]] = {"documents": {}, "conversations": {}}
+        self.document_tags: Dict[str, Tuple[str, ...]] = {}
+        self.tag_counts: Dict[str, int] = {}
+
+    @classmethod
+    def build(
+        cls,
+        documents: Iterable[Tuple[str, str]],
+        document_tags: Iterable[Tuple[str, str]],
+        conversations: Iterable[Tuple[str, str]]
+    ) -> "UserTypeahead":
+        """Build from (id, title) and (document_id, tag) rows, sorting each list once"""
+        index = cls()
+        for kind, rows in (("documents", documents), ("conversations", conversations)):
+            titles = index.titles[kind]
+            entries = index.entries[kind]
+            for item_id, title in rows:
+                titles[item_id] = title
+                entries.extend((key, item_id) for key in _title_keys(title))
+            entries.sort()
+        # A tag repeated on one document counts once, as in tag_counts
+        tags: Dict[str, Dict[str, None]] = {}
+        for document_id, tag in document_tags:
+            tags.setdefault(document_id, {})[tag] = None
+        for document_id, names in tags.items():
+            index.document_tags[document_id] = tuple(names)
+            for tag in names:
+                index.tag_counts[tag] = index.tag_counts.get(tag, 0) + 1
+        index.entries["tags"] = sorted((normalize(tag), tag) for tag in index.tag_counts)
+        return index
+
+    def __len__(self) -> int:
+        return sum(len(entries) for entries in self.entries.values())
+
+    def put_title(self, kind: str, item_id: str, title: str):
+        entries = self.entries[kind]
+        old = self.titles[kind].get(item_id)
+        if old == title:
+            return
+        for key in _title_keys(old):
+            _remove(entries, (key, item_id))
+        for key in _title_keys(title):
+            insort(entries, (key, item_id))
+        self.titles[kind][item_id] = title
+
+    def discard_title(self, kind: str, item_id: str):
+        old = self.titles[kind].pop(item_id, None)
+        for key in _title_keys(old):
+            _remove(self.entries[kind], (key, item_id))
+
+    def _count_tag(self, tag: str, delta: int):
+        count = self.tag_counts.get(tag, 0) + delta
+        if count > 0:
+            if tag not in self.tag_counts:
+                insort(self.entries["tags"], (normalize(tag), tag))
+            self.tag_counts[tag] = count
+        elif tag in self.tag_counts:
+            del self.tag_counts[tag]
+            _remove(self.entries["tags"], (normalize(tag), tag))
+
+    def put_tags(self, document_id: str, tags: Optional[Iterable[str]]):
+        """Replace a document's tags (None removes them)"""
+        for tag in self.document_tags.pop(document_id, ()):
+            self._count_tag(tag, -1)
+        if tags:
+            self.document_tags[document_id] = tuple(dict.fromkeys(tags))
+            for tag in self.document_tags[document_id]:
+                self._count_tag(tag, 1)
+
+    def complete(self, kind: str, prefix: str, limit: int) -> List[Dict[str, Any]]:
+        """Up to `limit` distinct items whose key starts with prefix, in key order"""
+        entries = self.entries[kind]
+        found: List[str] = []
+        i = bisect_left(entries, (prefix,))
+        while i < len(entries) and len(found) < limit and entries[i][0].startswith(prefix):
+            if entries[i][1] not in found:
+                found.append(entries[i][1])
+            i += 1
+        if kind == "tags":
+            return [{"name": tag, "count": self.tag_counts[tag]} for tag in found]
+        return [{"id": item_id, "title": self.titles[kind][item_id]} for item_id in found]
+
+
+def load_typeahead(conn: sqlite3.Connection, user_id: str) -> UserTypeahead:
+    return UserTypeahead.build(
+        conn.execute(USER_DOCUMENTS, (user_id,)).fetchall(),
+        conn.execute(USER_DOCUMENT_TAGS, (user_id,)).fetchall(),
+        conn.execute(USER_CONVERSATIONS, (user_id,)).fetchall()
+    )
+
+
+class TypeaheadIndex:
+    """Per-user UserTypeahead, loaded on first use and kept up to date by the write endpoints"""
+
+    def __init__(self, max_users: int):
+        self.max_users = max_users
+        self._users: "OrderedDict[str, UserTypeahead]" = OrderedDict()
+        self._loading: Dict[str, asyncio.Lock] = {}
+        # Updates that arrive while a user is being loaded, replayed on the loaded lists
+        # (None for drop); every update is idempotent, so replaying one the load already saw is harmless
+        self._pending: Dict[str, List[Optional[Tuple[str, tuple]]]] = {}
+        self.loads = 0
+
+    async def _user(self, user_id: str) -> UserTypeahead:
+        index = self._users.get(user_id)
+        if index is None:
+            lock = self._loading.setdefault(user_id, asyncio.Lock())
+            async with lock:
+                index = self._users.get(user_id)
+                if index is None:
+                    self._pending.setdefault(user_id, [])
+                    try:
+                        index = await db.for_user(user_id).run(load_typeahead, user_id)
+                        self.loads += 1
+                        dropped = False
+                        for update in self._pending.get(user_id, []):
+                            if update is None:
+                                dropped = True
+                            else:
+                                method, args = update
+                                getattr(index, method)(*args)
+                        # A bulk write raced the load: answer this lookup, reload for the next
+                        if not dropped:
+                            self._users[user_id] = index
+                    finally:
+                        self._pending.pop(user_id, None)
+                        self._loading.pop(user_id, None)
+                    while len(self._users) > self.max_users:
+                        self._users.popitem(last=False)
+        if user_id in self._users:
+            self._users.move_to_end(user_id)
+        return index
+
+    def _apply(self, user_id: str, method: str, *args):
+        if user_id in self._pending:
+            self._pending[user_id].append((method, args))
+        index = self._users.get(user_id)
+        if index is not None:
+            getattr(index, method)(*args)
+
+    def put_document(self, user_id: str, document_id: str, title: Optional[str], tags: Optional[List[str]]):
+        """Record a document's title and tags; None leaves that part unchanged"""
+        if title is not None:
+            self._apply(user_id, "put_title", "documents", document_id, title)
+        if tags is not None:
+            self._apply(user_id, "put_tags", document_id, tags)
+
+    def discard_document(self, user_id: str, document_id: str):
+        self._apply(user_id, "discard_title", "documents", document_id)
+        self._apply(user_id, "put_tags", document_id, None)
+
+    def put_conversation(self, user_id: str, conversation_id: str, title: str):
+        self._apply(user_id, "put_title", "conversations", conversation_id, title)
+
+    def discard_conversation(self, user_id: str, conversation_id: str):
+        self._apply(user_id, "discard_title", "conversations", conversation_id)
+
+    def drop(self, user_id: str):
+        """Forget a user's lists after bulk writes; the next lookup reloads them"""
+        if user_id in self._pending:
+            self._pending[user_id].append(None)
+        self._users.pop(user_id, None)
+
+    async def complete(
+        self, user_id: str, query: str, kinds: Iterable[str], limit: int
+    ) -> Dict[str, List[Dict[str, Any]]]:
+        """Completions of what the user has typed, per kind"""
+        prefix = prefix_key(query)
+        if not prefix:
+            return {kind: [] for kind in kinds}
+        index = await self._user(user_id)
+        return {kind: index.complete(kind, prefix, limit) for kind in kinds}
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "users": len(self._users),
+            "entries": sum(len(index) for index in self._users.values()),
+            "loads": self.loads,
+        }
+
+
+typeahead_index = TypeaheadIndex(max_users=settings.typeahead_cache_users)
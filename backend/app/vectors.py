@@ -0,0 +1,312 @@
+"""
+Local vector index for related-document and semantic search
+
+Every document is embedded on the CPU as a hashed TF-IDF vector: the
+fts_tokens() terms of its title, summary and body (Chinese bigrams and
+lower-cased words, see app/fts.py) are hashed into vector_dimensions signed
+buckets, title terms counting three times and summary terms twice, and the
+counts are damped with log1p. The raw vectors are stored as float16 blobs in
+`document_vectors`, next to the updated_at of the row they were computed
+from.
+
+Queries never touch the text. The first search of a user loads all their
+vectors into one float32 matrix (re-embedding documents whose vector is
+missing or older than the row, e.g. after a workspace import). IDF weights
+are derived from that matrix's non-zero counts, and the weighted,
+L2-normalised copy is cached until the next write, so a top-k cosine query
+is a single matrix-vector product. Create, update, delete and organize
+update the cached matrix in place. At most vector_cache_users users are kept
+in memory (least recently used are dropped).
+
+The functions taking a raw sqlite3 connection are meant to run on the
+database executor, via AsyncConnection.run or Database.run.
+"""
+import asyncio
+import sqlite3
+import threading
+import zlib
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.config import get_settings
+from app.database import db
+from app.fts import index_text
+
+settings = get_settings()
+
+DIMENSIONS = settings.vector_dimensions
+# Stored precision; the in-memory matrix is float32
+STORED_DTYPE = np.float16
+# Repeat counts of title and summary terms relative to body terms
+TITLE_WEIGHT = 3.0
+SUMMARY_WEIGHT = 2.0
+# Rows added to the in-memory matrix when it is full (at least)
+MIN_CAPACITY = 16
+
+# Documents of a user whose stored vector is missing, outdated or of another size
+# (parameters: user_id, vector size in bytes)
+STALE_DOCUMENTS = """
+    SELECT d.document_id
+    FROM documents d
+    LEFT JOIN document_vectors v ON v.document_id = d.document_id
+    WHERE d.user_id = ? AND d.deleted_at IS NULL
+      AND (v.document_id IS NULL
+           OR v.source_updated_at IS NOT d.updated_at
+           OR length(v.vector) != ?)
+"""
+
+USER_VECTORS = """
+    SELECT v.document_id, v.vector
+    FROM documents d
+    JOIN document_vectors v ON v.document_id = d.document_id
+    WHERE d.user_id = ? AND d.deleted_at IS NULL
+"""
+
+# Copies updated_at from the row so STALE_DOCUMENTS compares like with like
+UPSERT_VECTOR = """
+    INSERT INTO document_vectors (document_id, source_updated_at, vector)
+    SELECT document_id, updated_at, ? FROM documents WHERE document_id = ?
+    ON CONFLICT(document_id) DO UPDATE SET
+        source_updated_at = excluded.source_updated_at,
+        vector = excluded.vector
+"""
+
+
+@lru_cache(maxsize=1 << 16)
+def _feature(token: str) -> Tuple[int, float]:
+    """Bucket and sign of a term (CRC-32, so stable across processes)"""
+    h = zlib.crc32(token.encode("utf-8"))
+    return h % DIMENSIONS, -1.0 if h & 0x80000000 else 1.0
+
+
+def embed(texts: Sequence[Tuple[Optional[str], float]]) -> np.ndarray:
+    """Hashed, log-damped term counts of (text, weight) pairs as a float32 vector"""
+    buckets, weights = [], []
+    for text, weight in texts:
+        if not text:
+            continue
+        for token in index_text(text).lower().split():
+            bucket, sign = _feature(token)
+            buckets.append(bucket)
+            weights.append(sign * weight)
+    counts = np.bincount(
+        np.asarray(buckets, dtype=np.intp), weights=np.asarray(weights, dtype=np.float64),
+        minlength=DIMENSIONS
+    )
+    return (np.sign(counts) * np.log1p(np.abs(counts))).astype(np.float32)
+
+
+def document_vector(title: Optional[str], summary: Optional[str], content: Optional[str]) -> np.ndarray:
+    return embed([(title, TITLE_WEIGHT), (summary, SUMMARY_WEIGHT), (content, 1.0)])
+
+
+def query_vector(text: str) -> np.ndarray:
+    return embed([(text, 1.0)])
+
+
+def refresh_vector(conn: sqlite3.Connection, user_id: str, document_id: str) -> Optional[np.ndarray]:
+    """Embed a user's document and store its vector; None if there is no such (live) document"""
+    row = conn.execute("""
+        SELECT
+            d.title, d.summary,
+            COALESCE((SELECT content FROM content_blobs WHERE hash = d.content_hash), d.content) AS content
+        FROM documents d
+        WHERE d.document_id = ? AND d.user_id = ? AND d.deleted_at IS NULL
+    """, (document_id, user_id)).fetchone()
+    if row is None:
+        return None
+    vector = document_vector(row["title"], row["summary"], row["content"])
+    conn.execute(UPSERT_VECTOR, (vector.astype(STORED_DTYPE).tobytes(), document_id))
+    return vector
+
+
+def load_vectors(conn: sqlite3.Connection, user_id: str) -> Tuple[List[str], np.ndarray]:
+    """Document ids and vector matrix of a user, embedding stale documents first"""
+    stale = conn.execute(STALE_DOCUMENTS, (user_id, DIMENSIONS * np.dtype(STORED_DTYPE).itemsize)).fetchall()
+    for row in stale:
+        refresh_vector(conn, user_id, row["document_id"])
+
+    rows = conn.execute(USER_VECTORS, (user_id,)).fetchall()
+    matrix = np.frombuffer(b"".join(row["vector"] for row in rows), dtype=STORED_DTYPE)
+    return [row["document_id"] for row in rows], matrix.reshape(len(rows), DIMENSIONS).astype(np.float32)
+
+
+class UserVectors:
+    """One user's vectors as a growable matrix, with a cached TF-IDF weighted copy"""
+
+    def __init__(self, ids: List[str], matrix: np.ndarray):
+        self.ids = ids
+        self.positions = {document_id: i for i, document_id in enumerate(ids)}
+        self._matrix = matrix
+        self._weighted = None
+        self._idf = None
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @property
+    def nbytes(self) -> int:
+        return self._matrix.nbytes + (self._weighted.nbytes if self._weighted is not None else 0)
+
+    def put(self, document_id: str, vector: np.ndarray):
+        with self._lock:
+            position = self.positions.get(document_id)
+            if position is None:
+                position = len(self.ids)
+                if position == self._matrix.shape[0]:
+                    grown = np.zeros((max(MIN_CAPACITY, position * 2), DIMENSIONS), dtype=np.float32)
+                    grown[:position] = self._matrix
+                    self._matrix = grown
+                self.ids.append(document_id)
+                self.positions[document_id] = position
+            self._matrix[position] = vector
+            self._weighted = None
+
+    def discard(self, document_id: str):
+        with self._lock:
+            position = self.positions.pop(document_id, None)
+            if position is None:
+                return
+            # Move the last row into the gap
+            last = len(self.ids) - 1
+            if position != last:
+                moved = self.ids[last]
+                self._matrix[position] = self._matrix[last]
+                self.ids[position] = moved
+                self.positions[moved] = position
+            self.ids.pop()
+            self._weighted = None
+
+    def _prepare(self) -> np.ndarray:
+        """TF-IDF weighted, L2-normalised rows (rebuilt after writes)"""
+        if self._weighted is None:
+            count = len(self.ids)
+            counts = self._matrix[:count]
+            document_frequency = np.count_nonzero(counts, axis=0)
+            self._idf = (np.log((1 + count) / (1 + document_frequency)) + 1).astype(np.float32)
+            weighted = counts * self._idf
+            norms = np.linalg.norm(weighted, axis=1, keepdims=True)
+            norms[norms == 0] = 1
+            self._weighted = weighted / norms
+        return self._weighted
+
+    def _top(self, scores: np.ndarray, limit: int) -> List[Tuple[str, float]]:
+        k = min(limit, len(scores))
+        if k <= 0:
+            return []
+        best = np.argpartition(-scores, k - 1)[:k]
+        best = best[np.argsort(-scores[best])]
+        return [(self.ids[i], float(scores[i])) for i in best if scores[i] > 0]
+
+    def search(self, vector: np.ndarray, limit: int) -> List[Tuple[str, float]]:
+        with self._lock:
+            weighted = self._prepare()
+            query = vector * self._idf
+            norm = np.linalg.norm(query)
+            if norm == 0:
+                return []
+            return self._top(weighted @ (query / norm), limit)
+
+    def related(self, document_id: str, limit: int) -> Optional[List[Tuple[str, float]]]:
+        with self._lock:
+            position = self.positions.get(document_id)
+            if position is None:
+                return None
+            weighted = self._prepare()
+            scores = weighted @ weighted[position]
+            scores[position] = -np.inf
+            return self._top(scores, limit)
+
+
+class VectorIndex:
+    """Per-user UserVectors, loaded on first use and kept up to date by the write endpoints"""
+
+    def __init__(self, max_users: int):
+        self.max_users = max_users
+        self._users: "OrderedDict[str, UserVectors]" = OrderedDict()
+        self._loading: Dict[str, asyncio.Lock] = {}
+        # Writes that arrive while a user's vectors are being loaded ((None, None) for drop)
+        self._pending: Dict[str, List[Tuple[Optional[str], Optional[np.ndarray]]]] = {}
+
+    async def _vectors(self, user_id: str) -> UserVectors:
+        vectors = self._users.get(user_id)
+        if vectors is None:
+            lock = self._loading.setdefault(user_id, asyncio.Lock())
+            async with lock:
+                vectors = self._users.get(user_id)
+                if vectors is None:
+                    self._pending.setdefault(user_id, [])
+                    try:
+                        ids, matrix = await db.for_user(user_id).run(load_vectors, user_id)
+                        vectors = UserVectors(ids, matrix)
+                        dropped = False
+                        for document_id, vector in self._pending.get(user_id, []):
+                            if document_id is None:
+                                dropped = True
+                            elif vector is None:
+                                vectors.discard(document_id)
+                            else:
+                                vectors.put(document_id, vector)
+                        # A bulk write raced the load: answer this query, reload for the next
+                        if not dropped:
+                            self._users[user_id] = vectors
+                    finally:
+                        self._pending.pop(user_id, None)
+                        self._loading.pop(user_id, None)
+                    while len(self._users) > self.max_users:
+                        self._users.popitem(last=False)
+        if user_id in self._users:
+            self._users.move_to_end(user_id)
+        return vectors
+
+    def put(self, user_id: str, document_id: str, vector: Optional[np.ndarray]):
+        """Record a document's new vector (None removes it) if the user is loaded or loading"""
+        if user_id in self._pending:
+            self._pending[user_id].append((document_id, vector))
+        vectors = self._users.get(user_id)
+        if vectors is None:
+            return
+        if vector is None:
+            vectors.discard(document_id)
+        else:
+            vectors.put(document_id, vector)
+
+    def discard(self, user_id: str, document_id: str):
+        self.put(user_id, document_id, None)
+
+    def drop(self, user_id: str):
+        """Forget a user's matrix after bulk writes; the next query reloads (and backfills) it"""
+        if user_id in self._pending:
+            self._pending[user_id].append((None, None))
+        self._users.pop(user_id, None)
+
+    async def search(self, user_id: str, text: str, limit: int) -> List[Tuple[str, float]]:
+        """(document_id, cosine similarity) of the documents closest to a free-text query"""
+        vectors = await self._vectors(user_id)
+        vector = await db.run_in_executor(query_vector, text)
+        return await db.run_in_executor(vectors.search, vector, limit)
+
+    async def related(self, user_id: str, document_id: str, limit: int) -> Optional[List[Tuple[str, float]]]:
+        """Documents most similar to one of the user's documents; None if it does not exist"""
+        vectors = await self._vectors(user_id)
+        if document_id not in vectors.positions:
+            # Written by a path that does not update the index (e.g. workspace import)
+            vector = await db.for_user(user_id).run(refresh_vector, user_id, document_id)
+            if vector is None:
+                return None
+            vectors.put(document_id, vector)
+        return await db.run_in_executor(vectors.related, document_id, limit)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "users": len(self._users),
+            "documents": sum(len(vectors) for vectors in self._users.values()),
+            "bytes": sum(vectors.nbytes for vectors in self._users.values()),
+        }
+
+
+vector_index = VectorIndex(max_users=settings.vector_cache_users)
@@ -0,0 +1,197 @@
+"""
+Single-writer group-commit queue for SQLite
+"""
+import asyncio
+import logging
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+Statement = Tuple[str, Sequence]
+
+_STOP = object()
+
+
+class WriteOp:
+    """A group of statements that must commit atomically"""
+
+    __slots__ = ("statements", "future", "wait")
+
+    def __init__(self, statements: List[Statement], wait: bool):
+        self.statements = statements
+        self.future: Future = Future()
+        self.wait = wait
+
+
+class WriteQueue:
+    """
+    Funnel writes from many requests through one writer thread
+
+    The writer drains whatever is queued (up to max_batch operations, waiting
+    at most max_delay_ms for more to arrive) and applies it in a single
+    BEGIN IMMEDIATE ... COMMIT. Each operation runs inside its own savepoint,
+    so a failing operation is rolled back on its own without affecting the
+    rest of the group. Futures resolve only after the group has committed.
+    """
+
+    def __init__(
+        self,
+        connect: Callable[[], sqlite3.Connection],
+        max_batch: int = 256,
+        max_delay_ms: float = 2.0
+    ):
+        self._connect = connect
+        self.max_batch = max_batch
+        self.max_delay = max_delay_ms / 1000
+        self._queue: "queue.Queue" = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._stats = {
+            "ops": 0,
+            "failed_ops": 0,
+            "batches": 0,
+            "max_batch_size": 0,
+            "commit_seconds": 0.0
+        }
+
+    def start(self):
+        """Start the writer thread if it is not already running"""
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name="db-writer", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """Flush queued writes and stop the writer thread"""
+        with self._lock:
+            thread = self._thread
+            self._thread = None
+        if thread and thread.is_alive():
+            self._queue.put(_STOP)
+            thread.join()
+
+    def submit(self, statements: List[Statement], wait: bool = True) -> Future:
+        """
+        Queue statements for the writer thread
+
+        Args:
+            statements: (sql, params) pairs applied atomically, in order
+            wait: Whether a caller will wait on the result; failures of
+                  fire-and-forget operations are logged instead
+
+        Returns:
+            Future: Resolves to the per-statement rowcounts once committed
+        """
+        op = WriteOp(list(statements), wait)
+        self.start()
+        self._queue.put(op)
+        return op.future
+
+    async def execute(self, statements: List[Statement], wait: bool = True) -> Optional[List[int]]:
+        """
+        Queue statements from async code
+
+        With wait=True the call returns once the group containing these
+        statements has committed, and re-raises any error they caused.
+        With wait=False it returns immediately after queueing.
+        """
+        future = self.submit(statements, wait=wait)
+        if not wait:
+            return None
+        return await asyncio.wrap_future(future)
+
+    def stats(self) -> Dict[str, Any]:
+        """Return group-commit counters"""
+        stats = dict(self._stats)
+        stats["pending"] = self._queue.qsize()
+        stats["avg_batch_size"] = round(stats["ops"] / stats["batches"], 2) if stats["batches"] else 0.0
+        stats["running"] = bool(self._thread and self._thread.is_alive())
+        return stats
+
+    def _collect(self, first: WriteOp) -> Tuple[List[WriteOp], bool]:
+        """Gather a batch starting with `first`; returns (batch, stop_requested)"""
+        batch = [first]
+        deadline = time.monotonic() + self.max_delay
+        while len(batch) < self.max_batch:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+            if item is _STOP:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    def _run(self):
+        conn = self._connect()
+        # The writer manages transactions explicitly
+        conn.isolation_level = None
+        try:
+            stopping = False
+            while not stopping:
+                item = self._queue.get()
+                if item is _STOP:
+                    break
+                batch, stopping = self._collect(item)
+                self._commit(conn, batch)
+            # Drain anything queued behind the stop marker
+            leftover = []
+            while True:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is not _STOP:
+                    leftover.append(item)
+            if leftover:
+                self._commit(conn, leftover)
+        finally:
+            conn.close()
+
+    def _commit(self, conn: sqlite3.Connection, batch: List[WriteOp]):
+        started = time.perf_counter()
+        outcomes: List[Tuple[WriteOp, Any, Optional[BaseException]]] = []
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            for op in batch:
+                conn.execute("SAVEPOINT write_op")
+                try:
+                    rowcounts = [conn.execute(sql, params).rowcount for sql, params in op.statements]
+                    conn.execute("RELEASE write_op")
+                    outcomes.append((op, rowcounts, None))
+                except Exception as e:
+                    conn.execute("ROLLBACK TO write_op")
+                    conn.execute("RELEASE write_op")
+                    outcomes.append((op, None, e))
+            conn.execute("COMMIT")
+        except Exception as e:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            logger.error(f"Group commit of {len(batch)} writes failed: {str(e)}")
+            outcomes = [(op, None, e) for op in batch]
+
+        self._stats["batches"] += 1
+        self._stats["ops"] += len(batch)
+        self._stats["max_batch_size"] = max(self._stats["max_batch_size"], len(batch))
+        self._stats["commit_seconds"] += time.perf_counter() - started
+
+        for op, result, error in outcomes:
+            if error is None:
+                op.future.set_result(result)
+                continue
+            self._stats["failed_ops"] += 1
+            if not op.wait:
+                logger.error(f"Queued write failed: {str(error)}")
+            op.future.set_exception(error)
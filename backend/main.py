@@ -10,6 +10,7 @@ import logging
 from app.config import get_settings
 from app.database import db
 from app.scheduler import task_scheduler
+from app.ai_service import nvidia_service
 
 # Configure logging
 logging.basicConfig(
@@ -32,6 +33,10 @@ async def lifespan(app: FastAPI):
     db.init_db()
     logger.info("Database initialized")
 
+    # Open the shared NVIDIA API client
+    await nvidia_service.start()
+    logger.info("NVIDIA API client opened")
+
     # Start task scheduler
     task_scheduler.start()
     logger.info("Task scheduler started")
@@ -43,6 +48,12 @@ async def lifespan(app: FastAPI):
     task_scheduler.stop()
     logger.info("Task scheduler stopped")
 
+    await nvidia_service.close()
+    logger.info("NVIDIA API client closed")
+
+    db.close()
+    logger.info("Database connections closed")
+
 
 # Create FastAPI app
 app = FastAPI(
@@ -84,7 +95,10 @@ async def health_check():
     return {
         "status": "healthy",
         "service": "MindFlow API",
-        "version": "1.0.0"
+        "version": "1.0.0",
+        "database": db.pool_stats(),
+        "writer": db.writer.stats(),
+        "ai_client": nvidia_service.pool_stats()
     }
 
 
@@ -102,7 +116,7 @@ async def root():
 
 
 # Import and register routers
-from app.api import auth, conversations, messages, organize, documents, tasks, users, emails, ai, github_auth
+from app.api import auth, conversations, messages, organize, documents, tasks, users, emails, ai, github_auth, workspace, admin, search, autocomplete
 
 # Register routers with API v1 prefix
 api_prefix = settings.api_v1_prefix
@@ -117,6 +131,10 @@ app.include_router(tasks.router, prefix=api_prefix, tags=["Tasks"])
 app.include_router(users.router, prefix=api_prefix, tags=["Users"])
 app.include_router(emails.router, prefix=api_prefix, tags=["Email Notifications"])
 app.include_router(ai.router, prefix=api_prefix, tags=["AI Configuration"])
+app.include_router(workspace.router, prefix=api_prefix, tags=["Workspace"])
+app.include_router(search.router, prefix=api_prefix, tags=["Search"])
+app.include_router(autocomplete.router, prefix=api_prefix, tags=["Autocomplete"])
+app.include_router(admin.router, prefix=api_prefix, tags=["Admin"])
 
 
 if __name__ == "__main__":
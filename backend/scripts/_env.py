@@ -0,0 +1,24 @@
+"""
+Shared setup for the maintenance and benchmark scripts
+
+Importing this module puts the backend on sys.path and fills in the
+settings that have no default, so scripts can import `app.*` without a
+.env file.
+"""
+import os
+import sys
+import tempfile
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+for key in ("SECRET_KEY", "NVIDIA_API_KEY", "SMTP_USERNAME", "SMTP_PASSWORD"):
+    os.environ.setdefault(key, "unused")
+os.environ.setdefault("EMAIL_FROM", "unused@example.com")
+
+
+def use_temp_database(prefix: str = "mindflow-") -> str:
+    """Point DB_FILE at a fresh temporary database and return its path"""
+    path = os.path.join(tempfile.mkdtemp(prefix=prefix), "mindflow.db")
+    os.environ["DB_FILE"] = path
+    return path
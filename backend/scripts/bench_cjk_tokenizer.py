@@ -0,0 +1,155 @@
+"""
+Benchmark full-text indexing of Chinese text
+
+Generates a synthetic Chinese corpus (Zipf-distributed words of one to four
+characters, punctuation and a few English words) and compares:
+
+    like       no index, LIKE '%term%' on every row
+    unicode61  FTS5 over the raw text; a run of Chinese is one token
+    trigram    FTS5 trigram tokenizer; no matches below three characters
+    bigram     FTS5 over fts_tokens() output, as used by the backend
+
+For each it reports build time, index size (FTS shadow tables, from
+dbstat) and, per query length, the mean latency of a ranked top-20 query
+and the recall against LIKE.
+
+Usage (from the backend directory):
+    python scripts/bench_cjk_tokenizer.py [--docs 20000] [--queries 50]
+"""
+import argparse
+import os
+import random
+import sqlite3
+import tempfile
+import time
+
+import _env  # noqa: F401
+
+from app.fts import match_expression, register_functions  # noqa: E402
+
+COMMON_CHARS = (
+    "的一是不了人我在有他这中大来上国个到说们为子和你地出道也时年得就那要下以生会自着去之过家学对可她里后小么"
+    "心多天而能好都然没日于起还发成事只作当想看文无开手十用主行方又如前所本见经头面公同三已老从动两长知民样现"
+    "分将外但身些与高意进把法此实回二理美点月明其种声全工己话儿者向情部正名定女问力机给等几很业最间新什打便位"
+    "因重被走电四第门相次东政海口使教西再平真听世气信北少关并内加化由却代军产入先山五太水万市眼体别处总才场师"
+    "书比住员九笑性通目华报立马命张活难神数件安表原车白应路期叫死常提感金何更反合放做系计或司利受光王果亲界及"
+    "今京务制解各任至清物台象记边共风战干接它许八特觉望直服毛林题建南度统色字请交爱让认算论百吃义科怎元社术结"
+)
+ENGLISH_WORDS = ["AI", "Python", "API", "SQLite", "GPU", "Docker", "OKR", "KPI"]
+PUNCTUATION = "，。、；：？！"
+
+VARIANTS = ["like", "unicode61", "trigram", "bigram"]
+
+
+def make_vocabulary(size: int, rng: random.Random) -> list:
+    words = set()
+    while len(words) < size:
+        length = rng.choices((1, 2, 3, 4), weights=(15, 60, 15, 10))[0]
+        words.add("".join(rng.choice(COMMON_CHARS) for _ in range(length)))
+    return sorted(words)
+
+
+def make_corpus(docs: int, vocabulary: list, rng: random.Random) -> list:
+    weights = [1 / (rank + 1) for rank in range(len(vocabulary))]
+    corpus = []
+    for _ in range(docs):
+        parts = []
+        for word in rng.choices(vocabulary, weights=weights, k=rng.randint(40, 400)):
+            parts.append(word)
+            roll = rng.random()
+            if roll < 0.08:
+                parts.append(rng.choice(PUNCTUATION))
+            elif roll < 0.1:
+                parts.append(f" {rng.choice(ENGLISH_WORDS)} ")
+        corpus.append("".join(parts))
+    return corpus
+
+
+def build(conn: sqlite3.Connection, variant: str, corpus: list) -> float:
+    started = time.perf_counter()
+    conn.execute("CREATE TABLE docs (body TEXT)")
+    conn.executemany("INSERT INTO docs (body) VALUES (?)", [(body,) for body in corpus])
+    if variant == "unicode61":
+        conn.execute("CREATE VIRTUAL TABLE docs_fts USING fts5(body, content='docs', tokenize='unicode61')")
+    elif variant == "trigram":
+        conn.execute("CREATE VIRTUAL TABLE docs_fts USING fts5(body, content='docs', tokenize='trigram')")
+    elif variant == "bigram":
+        conn.execute("CREATE VIEW docs_source AS SELECT rowid, fts_tokens(body) AS body FROM docs")
+        conn.execute("CREATE VIRTUAL TABLE docs_fts USING fts5(body, content='docs_source', tokenize='unicode61')")
+    if variant != "like":
+        conn.execute("INSERT INTO docs_fts (docs_fts) VALUES ('rebuild')")
+        conn.execute("INSERT INTO docs_fts (docs_fts) VALUES ('optimize')")
+    conn.commit()
+    return time.perf_counter() - started
+
+
+def index_bytes(conn: sqlite3.Connection) -> int:
+    row = conn.execute("SELECT SUM(pgsize) FROM dbstat WHERE name LIKE 'docs_fts%'").fetchone()
+    return row[0] or 0
+
+
+def search(conn: sqlite3.Connection, variant: str, term: str, limit: int = None) -> list:
+    if variant == "like":
+        sql = "SELECT rowid FROM docs WHERE body LIKE ?"
+        params = [f"%{term}%"]
+    else:
+        # unicode61 and trigram see the raw term; bigram gets the backend's query expression
+        expression = match_expression([term]) if variant == "bigram" else '"' + term + '"'
+        sql = "SELECT rowid FROM docs_fts WHERE docs_fts MATCH ? ORDER BY rank"
+        params = [expression]
+    if limit:
+        sql += " LIMIT ?"
+        params.append(limit)
+    return [row[0] for row in conn.execute(sql, params)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--docs", type=int, default=20000, help="documents in the corpus")
+    parser.add_argument("--vocabulary", type=int, default=5000, help="distinct words")
+    parser.add_argument("--queries", type=int, default=50, help="queries per term length")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    vocabulary = make_vocabulary(args.vocabulary, rng)
+    corpus = make_corpus(args.docs, vocabulary, rng)
+    corpus_bytes = sum(len(body.encode("utf-8")) for body in corpus)
+    print(f"corpus: {args.docs} documents, {corpus_bytes / 1e6:.1f} MB of text\n")
+
+    queries = {length: rng.sample([w for w in vocabulary if len(w) == length], args.queries)
+               for length in (1, 2, 3, 4)}
+    workdir = tempfile.mkdtemp(prefix="mindflow-cjk-")
+    connections = {}
+    truth = {}
+
+    print(f"{'variant':<11}{'build s':>9}{'index MB':>10}" +
+          "".join(f"{f'{n} char ms':>12}{'recall':>8}" for n in queries))
+    for variant in VARIANTS:
+        conn = sqlite3.connect(os.path.join(workdir, f"{variant}.db"))
+        register_functions(conn)
+        build_seconds = build(conn, variant, corpus)
+        connections[variant] = conn
+
+        cells = []
+        for length, terms in queries.items():
+            elapsed = 0.0
+            recall = []
+            for term in terms:
+                started = time.perf_counter()
+                search(conn, variant, term, limit=20)
+                elapsed += time.perf_counter() - started
+                hits = set(search(conn, variant, term))
+                if variant == "like":
+                    truth[term] = hits
+                expected = truth[term]
+                recall.append(len(hits & expected) / len(expected) if expected else 1.0)
+            cells.append(f"{elapsed / len(terms) * 1000:>12.2f}{sum(recall) / len(recall):>8.2f}")
+        print(f"{variant:<11}{build_seconds:>9.1f}{index_bytes(conn) / 1e6:>10.1f}" + "".join(cells))
+
+    for conn in connections.values():
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+"""
+Benchmark event-loop lag under mixed chat and list traffic
+
+Simulates SSE chat streams (coroutines emitting a chunk every few
+milliseconds) while list requests hammer SQLite, once with blocking
+db.get_connection() calls made directly on the event loop (the old router
+behaviour) and once through the async db.connection() layer. The lag of
+each chat tick is how late it fired; any blocking query delays every
+live stream.
+
+Usage (from the backend directory):
+    python scripts/bench_event_loop_lag.py [--conversations 2000] [--messages 20]
+"""
+import argparse
+import asyncio
+import statistics
+import time
+import uuid
+from datetime import datetime, timedelta
+
+import _env
+
+_env.use_temp_database("mindflow-bench-")
+
+from app.database import Database  # noqa: E402
+
+LIST_QUERY = """
+    SELECT
+        c.*,
+        (SELECT COUNT(*) FROM messages WHERE conversation_id = c.conversation_id) as message_count
+    FROM conversations c
+    WHERE c.user_id = ?
+    ORDER BY c.updated_at DESC
+    LIMIT ? OFFSET ?
+"""
+
+
+def seed(database: Database, conversations: int, messages: int) -> str:
+    """Create one heavy user and return its user_id"""
+    user_id = str(uuid.uuid4())
+    base = datetime.utcnow() - timedelta(days=365)
+    with database.get_connection() as conn:
+        conn.execute("""
+            INSERT INTO users (user_id, username, email, password_hash)
+            VALUES (?, 'bench', 'bench@example.com', '')
+        """, (user_id,))
+        conv_rows = []
+        msg_rows = []
+        for i in range(conversations):
+            conversation_id = str(uuid.uuid4())
+            created = base + timedelta(minutes=i)
+            conv_rows.append((conversation_id, user_id, f"对话 {i}", created, created))
+            for j in range(messages):
+                msg_rows.append((
+                    str(uuid.uuid4()), conversation_id,
+                    "user" if j % 2 == 0 else "assistant",
+                    f"消息内容 {i}-{j} " * 20,
+                    created + timedelta(seconds=j)
+                ))
+        conn.executemany("""
+            INSERT INTO conversations (conversation_id, user_id, title, created_at, updated_at)
+            VALUES (?, ?, ?, ?, ?)
+        """, conv_rows)
+        conn.executemany("""
+            INSERT INTO messages (message_id, conversation_id, role, content, created_at)
+            VALUES (?, ?, ?, ?, ?)
+        """, msg_rows)
+    return user_id
+
+
+async def chat_stream(stop: asyncio.Event, interval: float, lags: list):
+    """Emit a chunk every `interval` seconds and record how late each tick was"""
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        expected = loop.time() + interval
+        await asyncio.sleep(interval)
+        lags.append(max(0.0, loop.time() - expected) * 1000)
+
+
+async def list_blocking(database: Database, user_id: str, page: int):
+    with database.get_connection() as conn:
+        conn.execute(LIST_QUERY, (user_id, 100, page * 100)).fetchall()
+
+
+async def list_async(database: Database, user_id: str, page: int):
+    async with database.connection() as conn:
+        await conn.fetchall(LIST_QUERY, (user_id, 100, page * 100))
+
+
+async def run_mode(database, user_id, list_fn, streams, clients, duration, pages):
+    stop = asyncio.Event()
+    lags = []
+    completed = 0
+
+    async def list_client(offset: int):
+        nonlocal completed
+        page = offset
+        while not stop.is_set():
+            await list_fn(database, user_id, page % pages)
+            completed += 1
+            page += 1
+            # Yield so a fully blocking client cannot monopolise the loop forever
+            await asyncio.sleep(0)
+
+    tasks = [asyncio.create_task(chat_stream(stop, 0.005, lags)) for _ in range(streams)]
+    tasks += [asyncio.create_task(list_client(i)) for i in range(clients)]
+    await asyncio.sleep(duration)
+    stop.set()
+    await asyncio.gather(*tasks)
+
+    lags.sort()
+    return {
+        "ticks": len(lags),
+        "p50": statistics.median(lags) if lags else 0.0,
+        "p99": lags[int(len(lags) * 0.99) - 1] if lags else 0.0,
+        "max": lags[-1] if lags else 0.0,
+        "list_rps": completed / duration
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--conversations", type=int, default=2000)
+    parser.add_argument("--messages", type=int, default=20)
+    parser.add_argument("--streams", type=int, default=50, help="concurrent simulated chat streams")
+    parser.add_argument("--clients", type=int, default=8, help="concurrent list clients")
+    parser.add_argument("--duration", type=float, default=5.0, help="seconds per mode")
+    args = parser.parse_args()
+
+    database = Database()
+    started = time.perf_counter()
+    user_id = seed(database, args.conversations, args.messages)
+    print(f"Seeded {args.conversations} conversations x {args.messages} messages "
+          f"in {time.perf_counter() - started:.1f}s ({database.db_path})")
+
+    pages = max(1, args.conversations // 100)
+    print(f"{'mode':<10}{'ticks':>8}{'p50 ms':>10}{'p99 ms':>10}{'max ms':>10}{'list/s':>10}")
+    for name, fn in (("blocking", list_blocking), ("async", list_async)):
+        result = asyncio.run(run_mode(
+            database, user_id, fn, args.streams, args.clients, args.duration, pages
+        ))
+        print(f"{name:<10}{result['ticks']:>8}{result['p50']:>10.2f}{result['p99']:>10.2f}"
+              f"{result['max']:>10.2f}{result['list_rps']:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+Benchmark message insert throughput: per-request transactions vs group commit
+
+Runs N concurrent "chat" coroutines that each insert a message and bump
+conversations.updated_at, first with one pooled transaction per write
+(the old path) and then through the single-writer WriteQueue, waiting
+for each commit in both cases.
+
+Usage (from the backend directory):
+    python scripts/bench_group_commit.py [--writers 200] [--seconds 5]
+"""
+import argparse
+import asyncio
+import time
+import uuid
+from datetime import datetime
+
+import _env
+
+_env.use_temp_database("mindflow-bench-")
+
+from app.database import Database  # noqa: E402
+
+INSERT_MESSAGE = """
+    INSERT INTO messages (message_id, conversation_id, role, content, created_at)
+    VALUES (?, ?, 'user', ?, ?)
+"""
+BUMP_CONVERSATION = """
+    UPDATE conversations
+    SET updated_at = ?
+    WHERE conversation_id = ?
+"""
+
+
+def seed(database: Database, writers: int) -> list:
+    user_id = str(uuid.uuid4())
+    conversation_ids = [str(uuid.uuid4()) for _ in range(writers)]
+    with database.get_connection() as conn:
+        conn.execute("""
+            INSERT INTO users (user_id, username, email, password_hash)
+            VALUES (?, 'bench', 'bench@example.com', '')
+        """, (user_id,))
+        conn.executemany("""
+            INSERT INTO conversations (conversation_id, user_id, title)
+            VALUES (?, ?, 'bench')
+        """, [(cid, user_id) for cid in conversation_ids])
+    return conversation_ids
+
+
+async def write_pooled(database: Database, conversation_id: str):
+    now = datetime.utcnow()
+    async with database.connection() as conn:
+        await conn.execute(INSERT_MESSAGE, (str(uuid.uuid4()), conversation_id, "你好" * 50, now))
+        await conn.execute(BUMP_CONVERSATION, (now, conversation_id))
+
+
+async def write_grouped(database: Database, conversation_id: str):
+    now = datetime.utcnow()
+    await database.writer.execute([
+        (INSERT_MESSAGE, (str(uuid.uuid4()), conversation_id, "你好" * 50, now)),
+        (BUMP_CONVERSATION, (now, conversation_id))
+    ])
+
+
+async def run_mode(database, write_fn, conversation_ids, seconds):
+    deadline = time.perf_counter() + seconds
+    done = 0
+    errors = 0
+
+    async def writer(conversation_id):
+        nonlocal done, errors
+        while time.perf_counter() < deadline:
+            try:
+                await write_fn(database, conversation_id)
+                done += 1
+            except Exception:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(writer(cid) for cid in conversation_ids))
+    return done / (time.perf_counter() - started), errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--writers", type=int, default=200, help="concurrent chats")
+    parser.add_argument("--seconds", type=float, default=5.0, help="seconds per mode")
+    args = parser.parse_args()
+
+    database = Database()
+    conversation_ids = seed(database, args.writers)
+
+    print(f"{'mode':<10}{'writes/s':>12}{'errors':>8}")
+    for name, fn in (("pooled", write_pooled), ("grouped", write_grouped)):
+        rate, errors = asyncio.run(run_mode(database, fn, conversation_ids, args.seconds))
+        print(f"{name:<10}{rate:>12.0f}{errors:>8}")
+    print(f"writer stats: {database.writer.stats()}")
+    database.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,292 @@
+"""
+Query-plan regression check for the SQL issued by the routers
+
+Extracts every SQL statement from the modules in MODULES by walking their
+AST, runs EXPLAIN QUERY PLAN for each against a freshly migrated and seeded
+database, and fails when a statement falls back to a full table SCAN or a
+USE TEMP B-TREE sort that is not explicitly allowed in ALLOWED.
+
+Statements are string literals (or f-strings) that start with SELECT,
+INSERT, UPDATE, DELETE or WITH. Names interpolated into f-strings are
+resolved from assignments in the same function (applying every `+=`, so
+all optional filters are switched on), from module-level constants and
+from the default of a FastAPI Query() parameter. Statements whose text
+cannot be resolved statically are reported as skipped.
+
+Usage (from the backend directory):
+    python scripts/check_query_plans.py [-v] [extra_module.py ...]
+
+Exits with status 1 if any statement regresses.
+"""
+import argparse
+import ast
+import os
+import re
+import sqlite3
+import sys
+import uuid
+from datetime import datetime, timedelta
+
+import _env
+
+_env.use_temp_database("mindflow-plans-")
+
+from app.database import Database  # noqa: E402
+
+MODULES = [
+    "app/api/conversations.py",
+    "app/api/messages.py",
+    "app/api/documents.py",
+    "app/api/tasks.py",
+    "app/api/emails.py",
+    "app/api/workspace.py",
+    "app/api/search.py",
+    "app/scheduler.py",
+    "app/archive.py",
+    "app/content_store.py",
+    "app/vectors.py",
+    "app/typeahead.py",
+    "app/near_duplicates.py",
+]
+
+# (module, function, plan detail substring) -> why the plan is acceptable
+ALLOWED = {
+    ("content_store.py", "stats", "SCAN content_blobs"): "space accounting reads every blob by design",
+    ("conversations.py", "search_conversations", "USE TEMP B-TREE"):
+        "conversations are ranked by aggregating their matching messages",
+    ("documents.py", "get_tag_facets", "USE TEMP B-TREE"):
+        "tags matching a prefix are read by name, then sorted by count",
+}
+
+SQL_START = re.compile(r"^\s*(SELECT|INSERT|UPDATE|DELETE|WITH)\b", re.IGNORECASE)
+QUOTED = re.compile(r"'(?:[^']|'')*'")
+
+
+class Unresolvable(Exception):
+    pass
+
+
+class SqlExtractor:
+    """Collect SQL statements from one module"""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, encoding="utf-8") as f:
+            self.tree = ast.parse(f.read(), filename=path)
+        self.module_constants = {}
+        for node in self.tree.body:
+            if isinstance(node, ast.Assign) and len(node.targets) == 1 \
+                    and isinstance(node.targets[0], ast.Name):
+                self.module_constants[node.targets[0].id] = node.value
+
+    def statements(self):
+        """Yield (function, lineno, sql or None, reason) for each statement"""
+        for func in ast.walk(self.tree):
+            if not isinstance(func, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                continue
+            seen = set()
+            body = func.body
+            if body and isinstance(body[0], ast.Expr) and isinstance(body[0].value, ast.Constant):
+                seen.add(id(body[0].value))  # docstring
+            for node in ast.walk(func):
+                if not isinstance(node, (ast.Constant, ast.JoinedStr)) or id(node) in seen:
+                    continue
+                if isinstance(node, ast.JoinedStr):
+                    # Don't also report the literal fragments inside the f-string
+                    seen.update(id(v) for v in ast.walk(node))
+                head = self._head(node)
+                if head is None or not SQL_START.match(head):
+                    continue
+                try:
+                    yield func.name, node.lineno, self.resolve(node, func), None
+                except Unresolvable as e:
+                    yield func.name, node.lineno, None, str(e)
+        # Module-level SQL constants
+        for name, value in self.module_constants.items():
+            head = self._head(value)
+            if head is not None and SQL_START.match(head):
+                try:
+                    yield name, value.lineno, self.resolve(value, None), None
+                except Unresolvable as e:
+                    yield name, value.lineno, None, str(e)
+
+    @staticmethod
+    def _head(node):
+        if isinstance(node, ast.Constant) and isinstance(node.value, str):
+            return node.value
+        if isinstance(node, ast.JoinedStr) and node.values:
+            first = node.values[0]
+            if isinstance(first, ast.Constant) and isinstance(first.value, str):
+                return first.value
+        return None
+
+    def resolve(self, node, func, depth: int = 0) -> str:
+        if depth > 10:
+            raise Unresolvable("interpolation nested too deeply")
+        if isinstance(node, ast.Constant):
+            if isinstance(node.value, str):
+                return node.value
+            raise Unresolvable(f"non-string constant {node.value!r}")
+        if isinstance(node, ast.JoinedStr):
+            parts = []
+            for value in node.values:
+                if isinstance(value, ast.FormattedValue):
+                    parts.append(self.resolve(value.value, func, depth + 1))
+                else:
+                    parts.append(self.resolve(value, func, depth + 1))
+            return "".join(parts)
+        if isinstance(node, ast.IfExp):
+            # Take the branch used when the optional filter is present
+            return self.resolve(node.body, func, depth + 1)
+        if isinstance(node, ast.Name):
+            return self._resolve_name(node.id, func, depth)
+        raise Unresolvable(f"cannot resolve {ast.unparse(node)!r}")
+
+    def _resolve_name(self, name: str, func, depth: int) -> str:
+        if func is not None:
+            value = None
+            for node in ast.walk(func):
+                if isinstance(node, ast.Assign) and value is None and any(
+                    isinstance(t, ast.Name) and t.id == name for t in node.targets
+                ):
+                    value = self.resolve(node.value, func, depth + 1)
+                elif isinstance(node, ast.AugAssign) and isinstance(node.target, ast.Name) \
+                        and node.target.id == name and value is not None:
+                    value += self.resolve(node.value, func, depth + 1)
+            if value is not None:
+                return value
+            # FastAPI parameter with a Query("default", ...) default
+            args = func.args
+            defaults = dict(zip([a.arg for a in args.args][-len(args.defaults):], args.defaults)) \
+                if args.defaults else {}
+            default = defaults.get(name)
+            if isinstance(default, ast.Call) and default.args:
+                return self.resolve(default.args[0], func, depth + 1)
+            if default is not None:
+                return self.resolve(default, func, depth + 1)
+        if name in self.module_constants:
+            return self.resolve(self.module_constants[name], None, depth + 1)
+        raise Unresolvable(f"cannot resolve name {name!r}")
+
+
+def seed(database: Database):
+    """Populate every table with a realistic spread of rows, then ANALYZE"""
+    now = datetime.utcnow()
+    with database.get_connection() as conn:
+        for u in range(50):
+            user_id = str(uuid.uuid4())
+            conn.execute("""
+                INSERT INTO users (user_id, username, email, password_hash)
+                VALUES (?, ?, ?, '')
+            """, (user_id, f"user{u}", f"user{u}@example.com"))
+            conn.execute("""
+                INSERT INTO user_settings (setting_id, user_id, default_email)
+                VALUES (?, ?, ?)
+            """, (str(uuid.uuid4()), user_id, f"user{u}@example.com"))
+            for c in range(20):
+                conversation_id = str(uuid.uuid4())
+                created = now - timedelta(days=c)
+                conn.execute("""
+                    INSERT INTO conversations (conversation_id, user_id, title, created_at, updated_at)
+                    VALUES (?, ?, ?, ?, ?)
+                """, (conversation_id, user_id, f"对话 {c}", created, created))
+                conn.executemany("""
+                    INSERT INTO messages (message_id, conversation_id, role, content, created_at)
+                    VALUES (?, ?, ?, ?, ?)
+                """, [
+                    (str(uuid.uuid4()), conversation_id, "user" if m % 2 == 0 else "assistant",
+                     f"消息 {m}", created + timedelta(seconds=m))
+                    for m in range(10)
+                ])
+            for d in range(10):
+                document_id = str(uuid.uuid4())
+                conn.execute("""
+                    INSERT INTO documents (document_id, user_id, title, content, summary, created_at, updated_at)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                """, (document_id, user_id, f"文档 {d}", "内容 " * 50, "摘要", now, now))
+                conn.executemany("""
+                    INSERT INTO document_tags (tag_id, document_id, tag_name)
+                    VALUES (?, ?, ?)
+                """, [(str(uuid.uuid4()), document_id, f"标签{(d + t) % 15}") for t in range(3)])
+            for t in range(10):
+                task_id = str(uuid.uuid4())
+                conn.execute("""
+                    INSERT INTO tasks (task_id, user_id, title, due_date, status)
+                    VALUES (?, ?, ?, ?, ?)
+                """, (task_id, user_id, f"任务 {t}", now + timedelta(days=t - 5),
+                      ("pending", "completed", "overdue")[t % 3]))
+                conn.executemany("""
+                    INSERT INTO email_notifications (notification_id, task_id, recipient_email, status, created_at)
+                    VALUES (?, ?, ?, 'sent', ?)
+                """, [(str(uuid.uuid4()), task_id, "x@example.com", now - timedelta(hours=n)) for n in range(2)])
+        conn.execute("ANALYZE")
+
+
+def placeholders(sql: str) -> int:
+    return QUOTED.sub("", sql).count("?")
+
+
+def regressions(plan):
+    """Plan details that indicate a full scan or a temp B-tree sort"""
+    bad = []
+    for row in plan:
+        detail = row["detail"]
+        if detail.startswith("SCAN ") and "VIRTUAL TABLE" not in detail \
+                and detail != "SCAN CONSTANT ROW" and not detail.startswith("SCAN (subquery"):
+            bad.append(detail)
+        elif "USE TEMP B-TREE" in detail:
+            bad.append(detail)
+    return bad
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("modules", nargs="*", help="extra modules to check")
+    parser.add_argument("-v", "--verbose", action="store_true", help="print every plan")
+    args = parser.parse_args()
+
+    database = Database()
+    seed(database)
+
+    failures = skipped = checked = 0
+    with database.get_connection() as conn:
+        for path in MODULES + args.modules:
+            module = os.path.basename(path)
+            for func, lineno, sql, reason in SqlExtractor(os.path.join(_env.BACKEND_DIR, path)).statements():
+                where = f"{path}:{lineno} {func}"
+                if sql is None:
+                    skipped += 1
+                    print(f"SKIP {where}: {reason}")
+                    continue
+                try:
+                    plan = conn.execute(f"EXPLAIN QUERY PLAN {sql}", [None] * placeholders(sql)).fetchall()
+                except sqlite3.Error as e:
+                    failures += 1
+                    print(f"FAIL {where}: {e}\n    {' '.join(sql.split())}")
+                    continue
+                checked += 1
+                bad = []
+                for detail in regressions(plan):
+                    allowed = next((why for (m, f, part), why in ALLOWED.items()
+                                    if m == module and f == func and part in detail), None)
+                    if allowed is None:
+                        bad.append(detail)
+                    elif args.verbose:
+                        print(f"  allowed in {where}: {detail} ({allowed})")
+                if bad:
+                    failures += 1
+                    print(f"FAIL {where}")
+                    print(f"    {' '.join(sql.split())}")
+                    for row in plan:
+                        print(f"    {'!' if row['detail'] in bad else ' '} {row['detail']}")
+                elif args.verbose:
+                    print(f"OK   {where}")
+                    for row in plan:
+                        print(f"      {row['detail']}")
+
+    print(f"\n{checked} statements checked, {failures} failed, {skipped} skipped")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+"""
+Convert existing UUID4 primary keys to time-ordered ULIDs
+
+Rewrites every 36-character UUID key (and all columns referencing it) in
+the catalog and every shard to a 26-character ULID whose timestamp is the
+row's created_at, so old rows get the same ordering and B-tree locality as
+rows created with ID_FORMAT=ulid. Keys that are already ULIDs are left
+alone, so the script can be re-run safely.
+
+user_id is not converted: it is embedded in issued JWTs, in GitHub account
+links and in the shard placement of each user's data.
+
+Stop the backend first and set ID_FORMAT=ulid before starting it again.
+
+Usage (from the backend directory):
+    python scripts/compact_ids.py [--dry-run] [--vacuum]
+"""
+import argparse
+import sqlite3
+import time
+from datetime import datetime
+
+import _env  # noqa: F401
+
+from app.database import db  # noqa: E402
+from app.fts import rebuild_indexes, register_functions  # noqa: E402
+from app.ids import new_ulid  # noqa: E402
+
+# (table, key column, creation-time expression, [(referencing table, column)])
+ENTITIES = [
+    ("conversations", "conversation_id", "created_at", [
+        ("messages", "conversation_id"),
+        ("conversation_archives", "conversation_id"),
+        ("documents", "source_conversation_id"),
+    ]),
+    ("messages", "message_id", "created_at", []),
+    ("documents", "document_id", "created_at", [
+        ("document_tags", "document_id"),
+        ("document_vectors", "document_id"),
+        ("document_minhash", "document_id"),
+        ("document_lsh_buckets", "document_id"),
+        ("tasks", "source_document_id"),
+    ]),
+    ("document_tags", "tag_id",
+     "(SELECT created_at FROM documents d WHERE d.document_id = document_tags.document_id)", []),
+    ("tasks", "task_id", "created_at", [
+        ("email_notifications", "task_id"),
+    ]),
+    ("email_notifications", "notification_id", "created_at", []),
+    ("user_settings", "setting_id",
+     "(SELECT created_at FROM users u WHERE u.user_id = user_settings.user_id)", []),
+]
+
+UUID_LENGTH = 36
+
+
+def parse_timestamp(value) -> datetime:
+    if isinstance(value, str):
+        try:
+            return datetime.fromisoformat(value)
+        except ValueError:
+            pass
+    return datetime.utcnow()
+
+
+def index_bytes(conn: sqlite3.Connection) -> int:
+    """Bytes used by indexes (including PK indexes), or the whole file without dbstat"""
+    try:
+        return conn.execute("""
+            SELECT COALESCE(SUM(pgsize), 0) FROM dbstat
+            WHERE name IN (SELECT name FROM sqlite_master WHERE type = 'index')
+        """).fetchone()[0]
+    except sqlite3.OperationalError:
+        page_count = conn.execute("PRAGMA page_count").fetchone()[0]
+        return page_count * conn.execute("PRAGMA page_size").fetchone()[0]
+
+
+def convert(path: str, dry_run: bool) -> dict:
+    """Convert one database file; returns converted key counts per table"""
+    conn = sqlite3.connect(path, isolation_level=None)
+    register_functions(conn)
+    counts = {}
+    try:
+        conn.execute("CREATE TEMP TABLE id_map (old TEXT PRIMARY KEY, new TEXT NOT NULL)")
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for table, key, created, references in ENTITIES:
+                rows = conn.execute(f"""
+                    SELECT {key}, {created} FROM {table}
+                    WHERE length({key}) = {UUID_LENGTH}
+                    ORDER BY 2, rowid
+                """).fetchall()
+                counts[table] = len(rows)
+                if dry_run or not rows:
+                    continue
+                conn.execute("DELETE FROM temp.id_map")
+                conn.executemany(
+                    "INSERT INTO temp.id_map (old, new) VALUES (?, ?)",
+                    [(old, new_ulid(parse_timestamp(created_at))) for old, created_at in rows]
+                )
+                for target_table, column in [(table, key)] + references:
+                    conn.execute(f"""
+                        UPDATE {target_table}
+                        SET {column} = (SELECT new FROM temp.id_map WHERE old = {target_table}.{column})
+                        WHERE {column} IN (SELECT old FROM temp.id_map)
+                    """)
+            conn.execute("ROLLBACK" if dry_run else "COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+    finally:
+        conn.close()
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dry-run", action="store_true", help="only count the keys that would change")
+    parser.add_argument("--vacuum", action="store_true", help="VACUUM afterwards to rebuild and shrink the indexes")
+    args = parser.parse_args()
+
+    paths = [db.db_path] + [shard.db_path for shard in db.all_shards() if shard is not db]
+    db.close()
+
+    started = time.perf_counter()
+    for path in paths:
+        conn = sqlite3.connect(path)
+        register_functions(conn)
+        before = index_bytes(conn)
+        conn.close()
+
+        counts = convert(path, args.dry_run)
+
+        conn = sqlite3.connect(path)
+        register_functions(conn)
+        if args.vacuum and not args.dry_run:
+            conn.execute("VACUUM")
+            rebuild_indexes(conn)
+            conn.commit()
+        after = index_bytes(conn)
+        conn.close()
+        print(f"{path}: " + ", ".join(f"{table}={count}" for table, count in counts.items() if count)
+              + f" | index bytes {before} -> {after}")
+
+    print(f"\nDone in {time.perf_counter() - started:.1f}s"
+          + (" (dry run)" if args.dry_run else "; set ID_FORMAT=ulid before starting the backend."))
+
+
+if __name__ == "__main__":
+    main()
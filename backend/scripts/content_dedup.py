@@ -0,0 +1,84 @@
+"""
+Inspect and maintain the content-addressed body store
+
+    stats     space saved by deduplication, per database file (default)
+    backfill  move existing large message/document bodies into content_blobs
+    gc        delete blobs that nothing references any more
+
+Backfill uses CONTENT_DEDUP_MIN_BYTES unless --min-bytes is given and is
+safe to run while the backend is up (it works in short batches).
+
+Usage (from the backend directory):
+    python scripts/content_dedup.py [stats]
+    python scripts/content_dedup.py backfill --min-bytes 1024
+    python scripts/content_dedup.py gc
+"""
+import argparse
+import time
+
+import _env  # noqa: F401
+
+from app import content_store  # noqa: E402
+from app.database import db  # noqa: E402
+
+BATCH_SIZE = 500
+
+
+def backfill_batch(conn, table: str, min_bytes: int) -> int:
+    rows = conn.execute(f"""
+        SELECT rowid, content FROM {table}
+        WHERE content_hash IS NULL AND length(CAST(content AS BLOB)) >= ?
+        LIMIT ?
+    """, (min_bytes, BATCH_SIZE)).fetchall()
+    for row in rows:
+        stored, content_hash = content_store.put_content(conn, row["content"])
+        conn.execute(
+            f"UPDATE {table} SET content = ?, content_hash = ? WHERE rowid = ?",
+            (stored, content_hash, row["rowid"])
+        )
+    return len(rows)
+
+
+def print_stats(path: str, stats: dict):
+    logical = stats["logical_bytes"]
+    ratio = f"{stats['saved_bytes'] / logical:.0%}" if logical else "-"
+    print(f"{path}: {stats['blobs']} blobs, {stats['references_count']} references, "
+          f"stored {stats['stored_bytes']} B for {logical} B logical, saved {stats['saved_bytes']} B ({ratio}), "
+          f"garbage {stats['garbage_bytes']} B")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", nargs="?", default="stats", choices=("stats", "backfill", "gc"))
+    parser.add_argument("--min-bytes", type=int, help="threshold for backfill (default: CONTENT_DEDUP_MIN_BYTES)")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    for store in db.all_shards():
+        if args.command == "backfill":
+            min_bytes = args.min_bytes or content_store.settings.content_dedup_min_bytes
+            if min_bytes <= 0:
+                parser.error("set CONTENT_DEDUP_MIN_BYTES or pass --min-bytes")
+            content_store.settings.content_dedup_min_bytes = min_bytes
+            moved = 0
+            for table in ("messages", "documents"):
+                while True:
+                    with store.get_connection() as conn:
+                        count = backfill_batch(conn, table, min_bytes)
+                    moved += count
+                    if count < BATCH_SIZE:
+                        break
+            print(f"{store.db_path}: moved {moved} bodies")
+        elif args.command == "gc":
+            with store.get_connection() as conn:
+                print(f"{store.db_path}: removed {content_store.collect_garbage(conn)} blobs")
+
+        with store.get_connection() as conn:
+            print_stats(store.db_path, content_store.stats(conn))
+
+    db.close()
+    print(f"\nDone in {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""
+Run database maintenance by hand
+
+Runs the same tasks as the scheduled maintenance job (PRAGMA optimize,
+FTS merge, incremental vacuum, WAL checkpoint) on the catalog and every
+shard and prints what each one did.
+
+--vacuum first rebuilds every file with a full VACUUM. That is the only way
+to switch a database created before DB_AUTO_VACUUM existed to incremental
+auto-vacuum, and it needs exclusive access: stop the backend first. The
+full-text indexes are rebuilt afterwards.
+
+Usage (from the backend directory):
+    python scripts/db_maintenance.py [--vacuum]
+"""
+import argparse
+import os
+import time
+
+import _env  # noqa: F401
+
+from app.database import db  # noqa: E402
+from app.fts import rebuild_indexes  # noqa: E402
+from app.maintenance import run_maintenance  # noqa: E402
+
+
+def full_vacuum(store) -> int:
+    """VACUUM one file with the configured auto_vacuum mode; returns bytes reclaimed"""
+    before = os.path.getsize(store.db_path)
+    conn = store.pool.open_connection()
+    conn.isolation_level = None
+    try:
+        conn.execute("VACUUM")
+        rebuild_indexes(conn)
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    finally:
+        conn.close()
+    return before - os.path.getsize(store.db_path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--vacuum", action="store_true",
+                        help="rebuild each file with VACUUM first (backend must be stopped)")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    for store in db.all_databases():
+        print(store.db_path)
+        if args.vacuum:
+            print(f"  vacuum              reclaimed {full_vacuum(store)} B")
+        for result in run_maintenance(store):
+            print(f"  {result['task']:<19} {result['duration_ms']:>9.1f} ms  "
+                  f"reclaimed {result['reclaimed_bytes']} B  {result['details']}")
+
+    db.close()
+    print(f"\nDone in {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
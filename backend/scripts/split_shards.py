@@ -0,0 +1,203 @@
+"""
+Split (or re-split, or merge back) user data across shard files
+
+Reads the current layout from the catalog's storage_meta table, copies each
+user's conversations, messages, conversation archives, documents, document
+tags, tasks and email notifications into the database that owns the user
+under the target layout,
+deletes the moved rows from their old location and records the new shard
+count. Users and user settings always stay in the catalog (DB_FILE).
+
+Stop the backend first; then set DB_SHARD_COUNT to the new value before
+starting it again.
+
+Usage (from the backend directory):
+    python scripts/split_shards.py --shards 16        # split DB_FILE into 16 shards
+    python scripts/split_shards.py --shards 0         # merge shards back into DB_FILE
+    python scripts/split_shards.py --shards 16 --dry-run
+"""
+import argparse
+import os
+import sqlite3
+import sys
+import time
+from collections import defaultdict
+
+import _env  # noqa: F401
+
+from app.config import get_settings  # noqa: E402
+from app.fts import rebuild_indexes, register_functions  # noqa: E402
+
+# (table, rows owned by the users in temp.moving_users), children before
+# parents so the message-count triggers see each message exactly once
+COPY_ORDER = [
+    # Copied as is: the tag count triggers find no live document in the target yet
+    ("tag_counts", "user_id IN (SELECT user_id FROM temp.moving_users)"),
+    ("messages", """conversation_id IN (
+        SELECT conversation_id FROM {db}.conversations
+        WHERE user_id IN (SELECT user_id FROM temp.moving_users))"""),
+    ("conversation_archives", """conversation_id IN (
+        SELECT conversation_id FROM {db}.conversations
+        WHERE user_id IN (SELECT user_id FROM temp.moving_users))"""),
+    ("conversations", "user_id IN (SELECT user_id FROM temp.moving_users)"),
+    ("document_tags", """document_id IN (
+        SELECT document_id FROM {db}.documents
+        WHERE user_id IN (SELECT user_id FROM temp.moving_users))"""),
+    ("document_vectors", """document_id IN (
+        SELECT document_id FROM {db}.documents
+        WHERE user_id IN (SELECT user_id FROM temp.moving_users))"""),
+    ("document_minhash", """document_id IN (
+        SELECT document_id FROM {db}.documents
+        WHERE user_id IN (SELECT user_id FROM temp.moving_users))"""),
+    ("document_lsh_buckets", "user_id IN (SELECT user_id FROM temp.moving_users)"),
+    ("documents", "user_id IN (SELECT user_id FROM temp.moving_users)"),
+    ("email_notifications", """task_id IN (
+        SELECT task_id FROM {db}.tasks
+        WHERE user_id IN (SELECT user_id FROM temp.moving_users))"""),
+    ("tasks", "user_id IN (SELECT user_id FROM temp.moving_users)"),
+]
+
+
+# Blobs referenced by the moving users' rows. They are copied with refcount 0
+# (the insert triggers count the references in the target) and never deleted
+# from the source, where other users may share them; GC reclaims them there.
+MOVING_BLOBS = """hash IN (
+    SELECT content_hash FROM src.messages WHERE conversation_id IN (
+        SELECT conversation_id FROM src.conversations
+        WHERE user_id IN (SELECT user_id FROM temp.moving_users))
+    UNION
+    SELECT content_hash FROM src.documents
+    WHERE user_id IN (SELECT user_id FROM temp.moving_users))"""
+
+
+def stored_shard_count(path: str) -> int:
+    conn = sqlite3.connect(path)
+    register_functions(conn)
+    try:
+        row = conn.execute("SELECT value FROM storage_meta WHERE key = 'shard_count'").fetchone()
+    except sqlite3.OperationalError:
+        row = None
+    finally:
+        conn.close()
+    return int(row[0]) if row else 0
+
+
+def move_users(source: str, target: str, user_ids: list, dry_run: bool) -> dict:
+    """Copy the users' rows from source into target, then delete them from source"""
+    conn = sqlite3.connect(target, isolation_level=None)
+    # The full-text index triggers on both files call fts_tokens()
+    register_functions(conn)
+    counts = {}
+    try:
+        conn.execute("ATTACH DATABASE ? AS src", (source,))
+        conn.execute("CREATE TEMP TABLE moving_users (user_id TEXT PRIMARY KEY)")
+        conn.executemany("INSERT INTO temp.moving_users VALUES (?)", [(u,) for u in user_ids])
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            counts["content_blobs"] = conn.execute(
+                f"SELECT COUNT(*) FROM src.content_blobs WHERE {MOVING_BLOBS}"
+            ).fetchone()[0]
+            if not dry_run:
+                conn.execute(f"""
+                    INSERT OR IGNORE INTO main.content_blobs (hash, content, size, refcount, created_at)
+                    SELECT hash, content, size, 0, created_at FROM src.content_blobs
+                    WHERE {MOVING_BLOBS}
+                """)
+            for table, where in COPY_ORDER:
+                counts[table] = conn.execute(
+                    f"SELECT COUNT(*) FROM src.{table} WHERE {where.format(db='src')}"
+                ).fetchone()[0]
+                if not dry_run:
+                    conn.execute(
+                        f"INSERT OR IGNORE INTO main.{table} "
+                        f"SELECT * FROM src.{table} WHERE {where.format(db='src')}"
+                    )
+            if not dry_run:
+                # Same order: children are found through parents that still exist
+                for table, where in COPY_ORDER:
+                    conn.execute(f"DELETE FROM src.{table} WHERE {where.format(db='src')}")
+            conn.execute("ROLLBACK" if dry_run else "COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("DETACH DATABASE src")
+    finally:
+        conn.close()
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--shards", type=int, required=True, help="target shard count (0 = single file)")
+    parser.add_argument("--dry-run", action="store_true", help="only report what would move")
+    parser.add_argument("--vacuum", action="store_true", help="VACUUM the source files afterwards")
+    args = parser.parse_args()
+    if args.shards < 0:
+        parser.error("--shards must be >= 0")
+
+    settings = get_settings()
+    current = stored_shard_count(settings.db_file) if os.path.exists(settings.db_file) else 0
+    if current == args.shards:
+        print(f"{settings.db_file} already uses shard_count={current}")
+        return
+
+    # The global db must open with the layout on disk, not the configured one
+    settings.db_shard_count = current
+    from app.database import Database, db as catalog, shard_index, shard_path
+
+    def owner(user_id: str, shards: int) -> str:
+        return shard_path(shard_index(user_id, shards), shards) if shards else settings.db_file
+
+    # Opening migrates the catalog; make sure every shard file exists and is migrated too
+    for shards in (current, args.shards):
+        if shards:
+            for index in range(shards):
+                Database(shard_path(index, shards), pool_size=1).close()
+
+    with catalog.get_connection() as conn:
+        user_ids = [row["user_id"] for row in conn.execute("SELECT user_id FROM users")]
+
+    moves = defaultdict(list)
+    for user_id in user_ids:
+        source = owner(user_id, current)
+        target = owner(user_id, args.shards)
+        moves[(source, target)].append(user_id)
+
+    started = time.perf_counter()
+    totals = defaultdict(int)
+    for (source, target), users in sorted(moves.items()):
+        counts = move_users(source, target, users, args.dry_run)
+        for table, count in counts.items():
+            totals[table] += count
+        print(f"{source} -> {target}: {len(users)} users, "
+              + ", ".join(f"{table}={count}" for table, count in counts.items()))
+
+    if args.dry_run:
+        print(f"\nDry run: would move {dict(totals)}")
+        catalog.close()
+        return
+
+    with catalog.get_connection() as conn:
+        conn.execute("""
+            INSERT INTO storage_meta (key, value) VALUES ('shard_count', ?)
+            ON CONFLICT(key) DO UPDATE SET value = excluded.value
+        """, (str(args.shards),))
+    catalog.close()
+
+    if args.vacuum:
+        for source in sorted({source for source, _ in moves}):
+            conn = sqlite3.connect(source)
+            register_functions(conn)
+            conn.execute("VACUUM")
+            rebuild_indexes(conn)
+            conn.commit()
+            conn.close()
+
+    print(f"\nMoved {dict(totals)} for {len(user_ids)} users in {time.perf_counter() - started:.1f}s")
+    print(f"Set DB_SHARD_COUNT={args.shards} before starting the backend.")
+    if current:
+        print(f"The shard-*-of-{current:03d}.db files in {settings.db_shard_dir} are now empty and can be removed.")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,73 @@
+"""
+Run SQL against a MindFlow database file with fts_tokens() registered
+
+The full-text index triggers call the Python function fts_tokens(), so the
+sqlite3 command-line shell (or any connection that has not run
+app.fts.register_functions) fails as soon as it inserts, updates or
+deletes documents, messages, conversations or tasks. Use this script for
+ad-hoc fixes instead, e.g. on a restored backup.
+
+Statements come from the arguments, or from stdin if there are none; each
+argument may hold several statements. Rows returned by a statement are
+printed tab-separated. Everything runs in one transaction, committed at the end
+unless --dry-run is given.
+
+Usage (from the backend directory):
+    python scripts/sql.py data/mindflow.db "UPDATE tasks SET status = 'completed' WHERE task_id = '...'"
+    python scripts/sql.py data/shards/shard-003-of-016.db --dry-run < fix.sql
+"""
+import argparse
+import sqlite3
+import sys
+
+import _env  # noqa: F401
+
+from app.fts import register_functions  # noqa: E402
+
+
+def statements(script: str):
+    """Split a script into complete statements (semicolons inside strings and trigger bodies are kept)"""
+    statement = ""
+    for piece in script.split(";"):
+        statement += piece + ";"
+        if sqlite3.complete_statement(statement):
+            if statement.strip(" \t\r\n;"):
+                yield statement
+            statement = ""
+    if statement.strip(" \t\r\n;"):
+        yield statement.rstrip(";")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("database", help="path of the catalog or shard file")
+    parser.add_argument("sql", nargs="*", help="statements to run (default: read stdin)")
+    parser.add_argument("--dry-run", action="store_true", help="roll back instead of committing")
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(args.database, isolation_level=None)
+    register_functions(conn)
+    conn.execute("PRAGMA busy_timeout = 5000")
+    cursor = conn.cursor()
+    try:
+        cursor.execute("BEGIN IMMEDIATE")
+        for script in args.sql or [sys.stdin.read()]:
+            for statement in statements(script):
+                cursor.execute(statement)
+                if cursor.description:
+                    print("\t".join(column[0] for column in cursor.description))
+                    for row in cursor:
+                        print("\t".join("" if value is None else str(value) for value in row))
+                elif cursor.rowcount >= 0:
+                    print(f"{cursor.rowcount} row(s)", file=sys.stderr)
+        cursor.execute("ROLLBACK" if args.dry_run else "COMMIT")
+    except sqlite3.Error as e:
+        if conn.in_transaction:
+            conn.execute("ROLLBACK")
+        sys.exit(f"error: {e}")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()